@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 import logging
 import sys
+import uuid
 import FastAPI_HelpFunction as FAI 
 
 
@@ -32,6 +33,7 @@ def initialize_stages():
     - QA_Stage: tracks whether user information gathering is complete.
     - messages: stores the chat history as a list of message dicts.
     - user_details: holds relevent extracted user information in a key–value dict.
+    - session_id: identifies the conversation so the server can keep its assistant thread.
     """
     
     if "QA_Stage" not in st.session_state:
@@ -43,6 +45,9 @@ def initialize_stages():
     if "userdetailes" not in st.session_state:
         st.session_state.userdetailes = {}
         
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        
     logger.info(f"Successfully initialize")  
         
 # ─── Streamlit - User Information Gathering UI ──────────────────────────────────────────────────
@@ -101,49 +106,50 @@ def UserInformationCollection_UI():
             st.markdown(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-
-                response_data = FAI.call_fastapi_chatCollectData(
-                    prompt, 
-                    st.session_state.messages,
-                )
+            
+            # Tokens are rendered as soon as the assistant produces them
+            response_data = {}
+            st.write_stream(FAI.stream_fastapi_chatCollectData(
+                prompt, 
+                st.session_state.messages,
+                response_data,
+                st.session_state.session_id,
+            ))
+            
+            if response_data.get("done"):
+                assistant_response = response_data["response"]
+                MovetoQA = response_data["collection_complete"]
                 
-                if response_data:
-                    assistant_response = response_data["response"]
-                    MovetoQA = response_data["collection_complete"]
+                if not MovetoQA: 
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": assistant_response
+                    })
+                    
+                    logger.info(f"Successfully answer user prompt")  
+
                     
-                    if not MovetoQA: 
-                        st.markdown(assistant_response)
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": assistant_response
-                        })
-                        
-                        logger.info(f"Successfully answer user prompt")  
-
-                        
-                    else:
-                        st.markdown("All information was collected succsusfully! when you ready to move forward to the QA phase send me a READY massage")
-
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": assistant_response
-                        })
-                        
-                        st.session_state.userdetailes = response_data["Personal_Information"]
-                        st.session_state.QA_Stage = True
-                        MovetoQA = False
-                        
-                        logger.info(f"Successfully answer user prompt")  
-                
                 else:
-                    error_msg = "Sorry, I couldn't process your request. Please try again."
-                    st.error(error_msg)
-                    logger.error(f"Error calling API: {str(error_msg)}")
+                    # The streamed reply already tells the user the collection is complete
                     st.session_state.messages.append({
                         "role": "assistant",
-                        "content": error_msg
+                        "content": assistant_response
                     })
+                    
+                    st.session_state.userdetailes = response_data["Personal_Information"]
+                    st.session_state.QA_Stage = True
+                    MovetoQA = False
+                    
+                    logger.info(f"Successfully answer user prompt")  
+            
+            else:
+                error_msg = "Sorry, I couldn't process your request. Please try again."
+                st.error(error_msg)
+                logger.error(f"Error calling API: {str(response_data.get('error', error_msg))}")
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": error_msg
+                })
 
 
 
@@ -195,33 +201,33 @@ def QA_UI():
             st.markdown(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):    
-             
-                response_data = FAI.QAaking(
-                    prompt, 
-                    st.session_state.userdetailes["user_hmo"],
-                    st.session_state.userdetailes["user_tier"],
-                    st.session_state.messages,
-                )
+            
+            # Tokens are rendered as soon as the model produces them
+            response_data = {}
+            assistant_response = st.write_stream(FAI.stream_QAaking(
+                prompt, 
+                st.session_state.userdetailes["user_hmo"],
+                st.session_state.userdetailes["user_tier"],
+                st.session_state.messages,
+                response_data,
+            ))
+            
+            if response_data.get("done"):
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": assistant_response
+                })
                 
-                if response_data:
-                    assistant_response = response_data["response"]
-                    st.markdown(assistant_response)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": assistant_response
-                    })
-                    
-                    logger.info(f"Successfully answer user prompt")      
-                    
-                else:
-                    error_msg = "Sorry, I couldn't process your request. Please try again."
-                    st.error(error_msg)
-                    logger.error(f"Error calling API: {str(error_msg)}")
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg
-                    })
+                logger.info(f"Successfully answer user prompt")      
+                
+            else:
+                error_msg = "Sorry, I couldn't process your request. Please try again."
+                st.error(error_msg)
+                logger.error(f"Error calling API: {str(response_data.get('error', error_msg))}")
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": error_msg
+                })
                                 
 
 if __name__ == '__main__':
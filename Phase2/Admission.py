@@ -0,0 +1,149 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Dict
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+CHAT_POOL_SIZE = int(os.getenv("CHAT_POOL_SIZE", "50"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "100"))
+CHAT_PER_CLIENT_LIMIT = int(os.getenv("CHAT_PER_CLIENT_LIMIT", "2"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ─── Admission control ──────────────────────────────────────────────────
+
+class AdmissionController:
+    """
+    Bounded admission in front of the chat worker pool.
+
+    At most `max_concurrency` requests run at once and at most `max_queue`
+    wait for a slot. A request is rejected immediately when the queue is
+    full or its client already has `per_client_limit` requests in flight,
+    and after `queue_timeout` seconds of waiting. Overload therefore turns
+    into fast 503 responses with a Retry-After hint instead of timeouts.
+    """
+
+    def __init__(self, max_concurrency: int = CHAT_POOL_SIZE, max_queue: int = CHAT_QUEUE_SIZE,
+                 per_client_limit: int = CHAT_PER_CLIENT_LIMIT, queue_timeout: float = CHAT_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_client_limit = per_client_limit
+        self.queue_timeout = queue_timeout
+
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.per_client: Dict[str, int] = {}
+        self.waiting = 0
+        self.in_flight = 0
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "client_limit": 0, "queue_timeout": 0}
+        self.queue_waits = deque(maxlen=1000)
+        self.service_times = deque(maxlen=1000)
+        self.started: Dict[int, float] = {}
+        self.tickets = itertools.count()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from recent service times"""
+        if not self.service_times:
+            return 1
+        mean_service = sum(self.service_times) / len(self.service_times)
+        backlog = (self.waiting + self.in_flight) / max(self.max_concurrency, 1)
+        return max(1, int(round(mean_service * backlog)))
+
+    async def acquire(self, client_id: str) -> int:
+        """
+        Wait for a slot for this client.
+
+        Returns:
+            int: A ticket to pass to `release`.
+
+        Raises:
+            AdmissionRejected: if the request must not be queued.
+        """
+        if self.per_client.get(client_id, 0) >= self.per_client_limit:
+            self.rejected["client_limit"] += 1
+            raise AdmissionRejected("Too many concurrent requests for this client", self.retry_after())
+
+        queued_at = time.perf_counter()
+
+        if not self.slots.locked():
+            # A free slot is taken without suspending, so the counters stay exact
+            await self.slots.acquire()
+            self.per_client[client_id] = self.per_client.get(client_id, 0) + 1
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejected("Server is overloaded", self.retry_after())
+
+            self.per_client[client_id] = self.per_client.get(client_id, 0) + 1
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._leave_client(client_id)
+                self.rejected["queue_timeout"] += 1
+                raise AdmissionRejected("Timed out waiting for a free worker", self.retry_after())
+            except BaseException:
+                self._leave_client(client_id)
+                raise
+            finally:
+                self.waiting -= 1
+
+        now = time.perf_counter()
+        self.queue_waits.append(now - queued_at)
+        self.admitted += 1
+        self.in_flight += 1
+        ticket = next(self.tickets)
+        self.started[ticket] = now
+        return ticket
+
+    def release(self, client_id: str, ticket: int):
+        """Free the slot taken by `acquire`; releasing the same ticket again is a no-op"""
+        started = self.started.pop(ticket, None)
+        if started is None:
+            return
+        self.service_times.append(time.perf_counter() - started)
+        self.in_flight -= 1
+        self._leave_client(client_id)
+        self.slots.release()
+
+    def _leave_client(self, client_id: str):
+        remaining = self.per_client.get(client_id, 0) - 1
+        if remaining > 0:
+            self.per_client[client_id] = remaining
+        else:
+            self.per_client.pop(client_id, None)
+
+    def stats(self) -> Dict:
+        waits = np.array(self.queue_waits) if self.queue_waits else np.zeros(1)
+        return {
+            "pool_size": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "per_client_limit": self.per_client_limit,
+            "in_flight": self.in_flight,
+            "queued": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "queue_wait_seconds": {
+                "p50": float(np.percentile(waits, 50)),
+                "p95": float(np.percentile(waits, 95)),
+                "max": float(waits.max()),
+            },
+        }
@@ -0,0 +1,97 @@
+"""
+Recall@10 vs latency of the approximate vector indexes against exact search.
+
+The corpus is synthetic: unit vectors drawn around one topic center per 50
+rows (embeddings of real pages cluster by topic), and queries are
+perturbed corpus rows. For each size the script reports:
+
+    - exact search (Retrieval.VectorIndex)
+    - the NumPy IVF index for several nprobe values
+    - the faiss HNSW index, if faiss is installed
+
+with build time, median query latency and recall@10 (overlap with the exact
+top 10). It then trains the IVF index on 80% of the rows and rebuilds it on
+all of them with the trained centroids, as a reload does while a partition
+has at most doubled, and reports the rebuild time and recall.
+
+Usage:
+    python Benchmark_ANN.py [--sizes 20000 100000] [--dim 384] [--queries 200]
+"""
+import time
+import argparse
+import numpy as np
+
+from EmbeddingIndex import normalize_rows
+from Retrieval import VectorIndex, IVFIndex, HNSWIndex, TOP_K, load_faiss
+
+
+def make_corpus(size: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((max(size // 50, 1), dim), dtype=np.float32)
+    noise = rng.standard_normal((size, dim), dtype=np.float32)
+    return normalize_rows(centers[rng.integers(0, len(centers), size)] + noise)
+
+
+def evaluate(index, queries: np.ndarray, truth: list) -> tuple:
+    """(median latency in ms, mean recall@10)"""
+    timings, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        indices, _ = index.search(query, TOP_K)
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(indices.tolist()) & expected) / TOP_K)
+    return float(np.median(timings)), float(np.mean(recalls))
+
+
+def timed_build(build) -> tuple:
+    start = time.perf_counter()
+    index = build()
+    return index, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    faiss_available = load_faiss() is not None
+
+    print(f"{'docs':>8} {'index':>14} {'build s':>8} {'query ms':>9} {'recall@10':>10}")
+    for size in args.sizes:
+        corpus = make_corpus(size, args.dim, rng)
+        # A query is a corpus row moved by a random vector of length 0.5
+        noise = normalize_rows(rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+        queries = normalize_rows(corpus[rng.integers(0, size, args.queries)] + 0.5 * noise)
+
+        exact, seconds = timed_build(lambda: VectorIndex(corpus, normalized=True))
+        truth = [set(exact.search(query, TOP_K)[0].tolist()) for query in queries]
+        latency, recall = evaluate(exact, queries, truth)
+        print(f"{size:>8} {'exact':>14} {seconds:>8.2f} {latency:>9.3f} {recall:>10.3f}")
+
+        ivf, seconds = timed_build(lambda: IVFIndex(corpus, normalized=True))
+        for nprobe in args.nprobe:
+            ivf.nprobe = min(nprobe, len(ivf.centroids))
+            latency, recall = evaluate(ivf, queries, truth)
+            print(f"{size:>8} {f'ivf nprobe={nprobe}':>14} {seconds:>8.2f} {latency:>9.3f} {recall:>10.3f}")
+
+        if faiss_available:
+            hnsw, seconds = timed_build(lambda: HNSWIndex(corpus, normalized=True))
+            latency, recall = evaluate(hnsw, queries, truth)
+            print(f"{size:>8} {'hnsw':>14} {seconds:>8.2f} {latency:>9.3f} {recall:>10.3f}")
+
+        # Reload: the centroids trained on 80% of the rows are reused for all of them
+        previous = IVFIndex(corpus[:int(size * 0.8)], normalized=True)
+        reused, seconds = timed_build(lambda: IVFIndex(corpus, normalized=True, centroids=previous.centroids,
+                                                       trained_rows=previous.trained_rows))
+        latency, recall = evaluate(reused, queries, truth)
+        print(f"{size:>8} {'ivf reused':>14} {seconds:>8.2f} {latency:>9.3f} {recall:>10.3f}")
+
+    if not faiss_available:
+        print("\nfaiss is not installed, HNSW skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Memory and lookup latency of the benefits store against the raw parsed JSON.
+
+The parsed data is scaled up by copying every service page, with numbered
+titles and treatment names (the same HMOs, tiers and benefit texts), then:
+
+    - memory: traced allocations of the parsed JSON (json.loads) and of the
+      BenefitsStore built from it once the JSON has been released
+    - lookup: (HMO, treatment, tier) lookups with BenefitsStore.lookup against
+      the nested scan of the raw dictionaries the store replaces
+    - grounding: BenefitsStore.ground on questions naming a treatment and on
+      questions naming none
+
+Every store lookup is checked against the scan; a mismatch makes the script
+exit with status 1.
+
+Usage:
+    python Benchmark_BenefitsStore.py [--copies 50] [--lookups 20000]
+"""
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Dict, List
+
+from BenefitsStore import BenefitsStore, TIERS, hmo_parser
+
+
+def numbered(name: str, copy: int) -> str:
+    return name if copy == 0 else f"{name} {copy}"
+
+
+def scale(data: Dict, copies: int) -> Dict:
+    """Parsed data with every service page copied `copies` times under numbered names"""
+    benefits = {}
+    for hmo, services in data["benefits"].items():
+        benefits[hmo] = {}
+        for copy in range(copies):
+            for service, service_data in services.items():
+                treatments = {numbered(t, copy): v for t, v in service_data.get("treatments", {}).items()}
+                benefits[hmo][numbered(service, copy)] = dict(service_data, treatments=treatments,
+                                                              title=numbered(service_data.get("title", service), copy))
+    return dict(data, benefits=benefits)
+
+
+def scan_lookup(data: Dict, hmo_name: str, treatment: str, tier: str) -> List[str]:
+    """Full texts of a treatment for one HMO and tier, by scanning the raw data"""
+    hmo_name = hmo_parser.normalize_hmo_name(hmo_name)
+    tier = hmo_parser.normalize_tier(tier)
+    texts = []
+    for hmo, services in data["benefits"].items():
+        if hmo_parser.normalize_hmo_name(hmo) != hmo_name:
+            continue
+        for service_data in services.values():
+            treatment_data = service_data.get("treatments", {}).get(treatment)
+            if treatment_data and tier in treatment_data:
+                texts.append(treatment_data[tier].get("full_text", ""))
+    return texts
+
+
+def traced(build) -> tuple:
+    """(result, bytes still allocated by `build` once it returns)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(calls: list) -> float:
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for f in calls:
+        f()
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def main():
+    parser_args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_args.add_argument("--copies", type=int, default=50)
+    parser_args.add_argument("--lookups", type=int, default=20000)
+    args = parser_args.parse_args()
+
+    with open("parsed_hmo_data.json", "r", encoding="utf-8") as f:
+        raw = json.dumps(scale(json.load(f), args.copies), ensure_ascii=False)
+
+    data, json_bytes = traced(lambda: json.loads(raw))
+    store = BenefitsStore(data)
+    _, store_bytes = traced(lambda: BenefitsStore(json.loads(raw)))
+    print(f"{len(store)} rows, {store.stats()['strings']} strings, {len(raw) / 1e6:.1f} MB of JSON")
+    print(f"memory: parsed JSON {json_bytes / 1e6:.1f} MB, benefits store {store_bytes / 1e6:.1f} MB "
+          f"({json_bytes / store_bytes:.1f}x smaller)")
+
+    random.seed(0)
+    treatments = [store.strings[code] for code in store.by_treatment]
+    hmos = list(data["benefits"])
+    keys = [(random.choice(hmos), random.choice(treatments), random.choice(TIERS)) for _ in range(args.lookups)]
+
+    mismatches = sum(1 for key in keys[:1000]
+                     if sorted(r["full_text"] for r in store.lookup(*key)) != sorted(scan_lookup(data, *key)))
+
+    scan_keys = keys[:max(1, args.lookups // 100)]
+    scan_us = timed([lambda k=k: scan_lookup(data, *k) for k in scan_keys])
+    store_us = timed([lambda k=k: store.lookup(*k) for k in keys])
+    print(f"lookup: scan {scan_us:.1f} us, store {store_us:.1f} us ({scan_us / store_us:.0f}x faster), "
+          f"{mismatches} mismatches in 1000")
+
+    named = [f"מה ההטבה שלי על {random.choice(treatments)}?" for _ in range(1000)]
+    unnamed = [f"שאלה כללית מספר {i} על השירותים" for i in range(1000)]
+    for label, questions in (("naming a treatment", named), ("naming none", unnamed)):
+        us = timed([lambda q=q: store.ground(q, "מכבי", "זהב") for q in questions])
+        grounded = sum(1 for q in questions if store.ground(q, "מכבי", "זהב"))
+        print(f"grounding, {label:>18}: {us:.1f} us, {grounded}/{len(questions)} grounded")
+
+    if mismatches:
+        print("Benefits store lookups differ from the raw data")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
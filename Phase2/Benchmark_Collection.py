@@ -0,0 +1,97 @@
+"""
+Assistant runs and latency of a full onboarding dialog, with and without the
+local collection fast path, against the fake server.
+
+Starts FakeOpenAI.py, points FastAPI.py at it, and plays scripted dialogs
+through /chatCollectUserData the way the UI does (the client-side history is
+sent on every turn). Each dialog is played with LOCAL_COLLECTION off (every
+turn is an assistant run) and on (bare, valid answers are handled locally).
+The ambiguous dialog shows that an unclear answer falls back to the assistant.
+The fake assistant completes a dialog with a Submit_UserInfo call when the
+user confirms, so both modes reach completion.
+
+Usage:
+    python Benchmark_Collection.py
+"""
+import os
+import sys
+import time
+import uuid
+import warnings
+import tempfile
+import subprocess
+
+from LoadTest_Ask import wait_until_up
+
+
+FAKE_PORT = 8100
+
+DIALOGS = {
+    "english": ["Hi", "Israel Israeli", "123456789", "male", "34", "Maccabi", "987654321", "Gold", "yes"],
+    "hebrew": ["שלום", "ישראל ישראלי", "123456789", "זכר", "34", "מכבי", "987654321", "זהב", "כן"],
+    "ambiguous": ["Hi", "Israel Israeli", "123456789", "I'd rather not say", "34", "Maccabi",
+                  "987654321", "Gold", "yes"],
+}
+
+
+def play(http, messages: list) -> dict:
+    """Send the dialog turn by turn, keeping the history like the UI"""
+    history = []
+    session_id = uuid.uuid4().hex
+    completed = False
+
+    start = time.perf_counter()
+    for message in messages:
+        history.append({"role": "user", "content": message})
+        response = http.post("/chatCollectUserData",
+                             json={"message": message, "history": history, "session_id": session_id})
+        response.raise_for_status()
+        data = response.json()
+        history.append({"role": "assistant", "content": data["response"]})
+        completed = bool(data["collection_complete"])
+
+    return {"seconds": time.perf_counter() - start, "completed": completed}
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.environ.update(OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+                      OpenAiAzureKey="fake",
+                      BackLogPATH=os.path.join(tempfile.gettempdir(), "benchmark_chatbot.log"))
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=dict(os.environ), stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+
+        import logging
+        from fastapi.testclient import TestClient
+        import FastAPI as api
+        api.init_services()
+        logging.getLogger().setLevel(logging.WARNING)
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+        # Without the lifespan: index loading is not needed for the collection dialog
+        http = TestClient(api.app)
+
+        print(f"{'dialog':>10} {'local path':>10} {'turns':>5} {'runs':>5} {'seconds':>8} {'completed':>9}")
+        for name, messages in DIALOGS.items():
+            for enabled in (False, True):
+                api.LOCAL_COLLECTION = enabled
+                before = api.collector.stats()
+                result = play(http, messages)
+                local_turns = api.collector.stats()["local_turns"] - before["local_turns"]
+                runs = len(messages) - local_turns
+                print(f"{name:>10} {'on' if enabled else 'off':>10} {len(messages):>5} {runs:>5} "
+                      f"{result['seconds']:>8.2f} {str(result['completed']):>9}")
+
+        completion = http.get("/metrics").json()["collection_completion"]
+        print(f"\ncompleted dialogs: {completion['completed']}, "
+              f"turns to complete: {completion['turns_to_complete']}")
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
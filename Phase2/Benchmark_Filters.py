@@ -0,0 +1,123 @@
+"""
+Cost and correctness of the retrieval metadata filters (HMO, tier, doc type).
+
+The documents of the local index are copied --copies times with random
+vectors. For each filter the script reports the rows scored by the vector
+search and the median latency of the vector and BM25 searches, next to an
+unpartitioned exact search over the whole matrix.
+
+It also checks, on the real index, that:
+
+    - every result passes its filters (HMO, tier and doc type)
+    - the English and Hebrew spellings of an HMO and tier ("Maccabi",
+      "gold" / "מכבי", "זהב") return the same results
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python Benchmark_Filters.py [--copies 100] [--repeats 50]
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from typing import Dict, List, Optional
+
+from EmbeddingIndex import EMBEDDING_INDEX_DIR, load_index, normalize_rows
+from Retrieval import VectorIndex, PartitionedIndex, TOP_K, normalize_hmo, normalize_tier
+from LexicalIndex import LexicalIndex
+
+
+QUERY = "מה ההנחה שלי לשיאצו?"
+
+FILTERS = [
+    ("hmo", {"hmo_name": "מכבי"}),
+    ("hmo+tier", {"hmo_name": "מכבי", "tier": "זהב"}),
+    ("hmo+tier+benefit", {"hmo_name": "מכבי", "tier": "זהב", "doc_types": ["benefit"]}),
+    ("description", {"hmo_name": "מכבי", "tier": "זהב", "doc_types": ["description"]}),
+]
+
+ALIASES = [
+    ({"hmo_name": "Maccabi", "tier": "gold"}, {"hmo_name": "מכבי", "tier": "זהב"}),
+    ({"hmo_name": "Clalit", "tier": "Silver"}, {"hmo_name": "כללית", "tier": "כסף"}),
+    ({"hmo_name": "meuhedet", "tier": "BRONZE"}, {"hmo_name": "מאוחדת", "tier": "ארד"}),
+]
+
+
+def median_us(call, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(timings))
+
+
+def passes(doc: Dict, hmo_name: str, tier: Optional[str] = None, doc_types: Optional[List[str]] = None) -> bool:
+    if doc_types and doc["type"] not in doc_types:
+        return False
+    if doc["type"] != "benefit":
+        return True
+    return normalize_hmo(doc["hmo"]) == normalize_hmo(hmo_name) and \
+        (tier is None or normalize_tier(doc["tier"]) == normalize_tier(tier))
+
+
+def filter_errors(documents: List[Dict], vector_index: PartitionedIndex, lexical_index: LexicalIndex,
+                  query_embedding: np.ndarray) -> List[str]:
+    errors = []
+    for name, filters in FILTERS:
+        for kind, indices in (("vector", vector_index.search(query_embedding, k=TOP_K, **filters)[0]),
+                              ("lexical", lexical_index.search(QUERY, k=TOP_K, **filters)[0])):
+            if not len(indices) and kind == "vector":
+                errors.append(f"{kind} {name}: no results")
+            errors += [f"{kind} {name}: document {i} ({documents[i]['type']}, {documents[i].get('hmo')}, "
+                       f"{documents[i].get('tier')}) does not pass the filters"
+                       for i in indices if not passes(documents[i], **filters)]
+
+    for alias, hebrew in ALIASES:
+        for kind, search in (("vector", lambda f: vector_index.search(query_embedding, k=TOP_K, **f)[0]),
+                             ("lexical", lambda f: lexical_index.search(QUERY, k=TOP_K, **f)[0])):
+            if search(alias).tolist() != search(hebrew).tolist():
+                errors.append(f"{kind}: {alias} and {hebrew} return different results")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    vectors, documents, _ = load_index(EMBEDDING_INDEX_DIR)
+    rng = np.random.default_rng(0)
+    query_embedding = rng.standard_normal(vectors.shape[1], dtype=np.float32)
+
+    errors = filter_errors(documents, PartitionedIndex(vectors, documents, normalized=True),
+                           LexicalIndex(documents), query_embedding)
+
+    scaled_documents = [doc for doc in documents for _ in range(args.copies)]
+    scaled_vectors = normalize_rows(rng.standard_normal((len(scaled_documents), vectors.shape[1]), dtype=np.float32))
+    whole = VectorIndex(scaled_vectors, normalized=True)
+    vector_index = PartitionedIndex(scaled_vectors, scaled_documents, normalized=True)
+    lexical_index = LexicalIndex(scaled_documents)
+
+    print(f"{len(scaled_documents)} documents ({len(documents)} x{args.copies}), "
+          f"{len(vector_index.partitions)} partitions")
+    print(f"{'filter':>18} {'rows scored':>12} {'vector us':>10} {'lexical us':>11}")
+    whole_us = median_us(lambda: whole.search(query_embedding, TOP_K), args.repeats)
+    print(f"{'none (whole)':>18} {len(whole):>12} {whole_us:>10.1f} {'':>11}")
+    for name, filters in FILTERS:
+        rows = sum(len(vector_index.partitions[key][0]) for key in vector_index.matching_partitions(**filters))
+        vector_us = median_us(lambda: vector_index.search(query_embedding, k=TOP_K, **filters), args.repeats)
+        lexical_us = median_us(lambda: lexical_index.search(QUERY, k=TOP_K, **filters), args.repeats)
+        print(f"{name:>18} {rows:>12} {vector_us:>10.1f} {lexical_us:>11.1f}")
+
+    for error in errors:
+        print(f"FAILED: {error}")
+    if errors:
+        sys.exit(1)
+    print("\nall results pass their filters, English and Hebrew aliases agree")
+
+
+if __name__ == "__main__":
+    main()
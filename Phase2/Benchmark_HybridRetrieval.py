@@ -0,0 +1,142 @@
+"""
+Retrieval quality and latency of vector, lexical (BM25) and hybrid search.
+
+Quality is measured on the hand-labeled questions in retrieval_queries.json.
+Each question lists the treatments (or service titles) it is about; a
+retrieved document is relevant if it is about one of them. For every mode
+the script reports, over all questions:
+
+    - hit@1      the best document is relevant
+    - recall@10  share of the relevant documents (at most 10) in the top 10
+    - MRR        mean reciprocal rank of the first relevant document
+
+Queries are embedded and filtered the way /ask does it: only the question
+is embedded, and the user's HMO and tier are retrieval filters.
+If the index was built with the fake embedding model (FakeOpenAI.py), the
+query vectors come from the same deterministic function. Those vectors carry
+no meaning, so the vector scores are only a floor there. Otherwise the
+configured Azure OpenAI deployment is called.
+
+Latency covers the search step only (no embedding call), on the real index
+and on a corpus of the same documents copied --copies times with random
+vectors.
+
+Usage:
+    python Benchmark_HybridRetrieval.py [--copies 100] [--repeats 20]
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from typing import Dict, List
+
+from EmbeddingIndex import EMBEDDING_INDEX_DIR, load_index, normalize_rows
+from Retrieval import PartitionedIndex, TOP_K, reciprocal_rank_fusion
+from LexicalIndex import LexicalIndex
+
+
+MODES = ["vector", "lexical", "hybrid"]
+
+
+def embed_queries(texts: List[str], model: str) -> np.ndarray:
+    if model == "fake-embedding":
+        from FakeOpenAI import fake_embedding
+        return np.array([fake_embedding(text) for text in texts], dtype=np.float32)
+
+    from dotenv import load_dotenv
+    from openai import AzureOpenAI
+    load_dotenv()
+    client = AzureOpenAI(azure_endpoint=os.getenv("OpenAiAzureEndPoint"), api_key=os.getenv("OpenAiAzureKey"),
+                         api_version="2024-05-01-preview")
+    response = client.embeddings.create(input=texts, model=os.getenv("EMBEDDING_MODEL", model))
+    return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)],
+                    dtype=np.float32)
+
+
+def search(mode: str, vector_index: PartitionedIndex, lexical_index: LexicalIndex,
+           question: Dict, query_embedding) -> np.ndarray:
+    """Same retrieval as /ask in the given mode"""
+    filters = {"hmo_name": question["hmo_name"], "tier": question["tier"]}
+    if mode == "lexical":
+        return lexical_index.search(question["prompt"], k=TOP_K, **filters)[0]
+    vector_indices = vector_index.search(query_embedding, k=TOP_K, **filters)[0]
+    if mode == "vector":
+        return vector_indices
+    lexical_indices = lexical_index.search(question["prompt"], k=TOP_K, **filters)[0]
+    return reciprocal_rank_fusion([vector_indices, lexical_indices], TOP_K)[0]
+
+
+def is_relevant(doc: Dict, question: Dict) -> bool:
+    return doc.get("treatment", doc.get("title")) in question["relevant"]
+
+
+def quality(documents: List[Dict], vector_index: PartitionedIndex, lexical_index: LexicalIndex,
+            questions: List[Dict], query_embeddings: np.ndarray) -> Dict[str, Dict[str, float]]:
+    visible = lexical_index.mask
+    results = {}
+    for mode in MODES:
+        hits, recalls, reciprocal_ranks = [], [], []
+        for question, query_embedding in zip(questions, query_embeddings):
+            relevant = [is_relevant(doc, question) for doc in documents]
+            total = int(np.sum(np.asarray(relevant) & visible(question["hmo_name"], question["tier"])))
+            flags = [relevant[i] for i in search(mode, vector_index, lexical_index, question, query_embedding)]
+
+            hits.append(bool(flags) and flags[0])
+            recalls.append(sum(flags) / min(total, TOP_K) if total else 0.0)
+            reciprocal_ranks.append(1 / (flags.index(True) + 1) if True in flags else 0.0)
+        results[mode] = {"hit@1": np.mean(hits), "recall@10": np.mean(recalls), "MRR": np.mean(reciprocal_ranks)}
+    return results
+
+
+def latency_us(vector_index: PartitionedIndex, lexical_index: LexicalIndex, questions: List[Dict],
+               query_embeddings: np.ndarray, repeats: int) -> Dict[str, float]:
+    timings = {}
+    for mode in MODES:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for question, query_embedding in zip(questions, query_embeddings):
+                search(mode, vector_index, lexical_index, question, query_embedding)
+        timings[mode] = (time.perf_counter() - start) / (repeats * len(questions)) * 1e6
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with open("retrieval_queries.json", "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    vectors, documents, manifest = load_index(EMBEDDING_INDEX_DIR)
+    model = manifest.get("model", "")
+    query_embeddings = embed_queries([q["prompt"] for q in questions], model)
+
+    vector_index = PartitionedIndex(vectors, documents, normalized=True)
+    lexical_index = LexicalIndex(documents)
+
+    print(f"{len(questions)} labeled questions, {len(documents)} documents, embedding model {model!r}")
+    if model == "fake-embedding":
+        print("note: fake embeddings carry no meaning, vector scores are a floor")
+    print(f"{'mode':>8} {'hit@1':>7} {'recall@10':>10} {'MRR':>6}")
+    for mode, scores in quality(documents, vector_index, lexical_index, questions, query_embeddings).items():
+        print(f"{mode:>8} {scores['hit@1']:>7.2f} {scores['recall@10']:>10.2f} {scores['MRR']:>6.2f}")
+    print()
+
+    rng = np.random.default_rng(0)
+    scaled_documents = [doc for doc in documents for _ in range(args.copies)]
+    scaled_vectors = normalize_rows(rng.standard_normal((len(scaled_documents), vectors.shape[1]), dtype=np.float32))
+    corpora = [("real index", len(documents), vector_index, lexical_index),
+               (f"x{args.copies}", len(scaled_documents), PartitionedIndex(scaled_vectors, scaled_documents, True),
+                LexicalIndex(scaled_documents))]
+
+    print(f"{'corpus':>10} {'docs':>7} " + " ".join(f"{mode + ' us':>11}" for mode in MODES))
+    for name, size, corpus_vector_index, corpus_lexical_index in corpora:
+        timings = latency_us(corpus_vector_index, corpus_lexical_index, questions, query_embeddings, args.repeats)
+        print(f"{name:>10} {size:>7} " + " ".join(f"{timings[mode]:>11.1f}" for mode in MODES))
+
+
+if __name__ == "__main__":
+    main()
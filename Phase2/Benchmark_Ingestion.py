@@ -0,0 +1,179 @@
+"""
+Full vs incremental HTML ingestion on a synthetic corpus.
+
+The raw HTML pages are not part of the repository, so pages are generated
+from parsed_hmo_data.json: one template per service page (title, intro
+paragraphs, treatment list, benefits table and contact lines), copied with
+numbered titles to reach the requested corpus size.
+
+The benchmark first times a full `parse_all_files` run with each parser
+backend (html.parser, and lxml if installed), serially and over a process
+pool, and checks that every combination gives the same data as the serial
+html.parser run. It then times a cold incremental run (no manifest yet) and
+incremental runs after no change, one edited page, one touched page and one
+deleted page. After every incremental run the output is compared with a full
+parse of the same folder.
+
+Usage:
+    python Benchmark_Ingestion.py [--pages 2000] [--workers 4]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from html import escape
+from typing import Dict, List
+
+from ParseHTML import HMOHTMLParser, builder_registry
+
+
+TIERS = ["זהב", "כסף", "ארד"]
+HMOS = ["מכבי", "מאוחדת", "כללית"]
+
+
+def page_templates(data: Dict) -> List[Dict]:
+    """One template per service page of the parsed data"""
+    templates = []
+    for metadata in data["metadata"]:
+        title = metadata["title"]
+        treatments = {}
+        contacts = {}
+        for hmo in HMOS:
+            service = data["benefits"].get(hmo, {}).get(title, {})
+            for treatment, treatment_data in service.get("treatments", {}).items():
+                treatments.setdefault(treatment, {})[hmo] = treatment_data
+                if hmo in treatment_data.get("contacts", {}):
+                    contacts.setdefault(hmo, treatment_data["contacts"][hmo]["raw_contact_line"])
+
+        templates.append({
+            "filename": metadata["filename"],
+            "title": title,
+            "description": metadata["description"],
+            "treatments": treatments,
+            "descriptions": {t: data["descriptions"][t] for t in treatments if t in data["descriptions"]},
+            "contacts": contacts,
+        })
+    return templates
+
+
+def render_page(template: Dict, copy: int = 0) -> str:
+    """HTML page in the layout the parser expects"""
+    title = template["title"] if copy == 0 else f"{template['title']} {copy}"
+
+    items = "\n".join(f"<li><strong>{escape(name)}</strong>: {escape(desc)}</li>"
+                    for name, desc in template["descriptions"].items())
+
+    rows = []
+    for treatment, by_hmo in template["treatments"].items():
+        cells = []
+        for hmo in HMOS:
+            tiers = by_hmo.get(hmo, {})
+            cells.append("<td>" + "<br>\n".join(f"<strong>{tier}:</strong> {escape(tiers[tier]['full_text'])}"
+                                              for tier in TIERS if tier in tiers) + "</td>")
+        rows.append(f"<tr>\n<td>{escape(treatment)}</td>\n" + "\n".join(cells) + "\n</tr>")
+
+    contacts = "\n".join(f"<li>{hmo}: {escape(line)}</li>" for hmo, line in template["contacts"].items())
+
+    return f"""<!DOCTYPE html>
+<html lang="he" dir="rtl">
+<head><meta charset="utf-8"><title>{escape(title)}</title></head>
+<body>
+<h2>{escape(title)}</h2>
+<p>{escape(template['description'])}</p>
+<ul>
+{items}
+</ul>
+<table>
+<tr><th>שם השירות</th>{''.join(f'<th>{hmo}</th>' for hmo in HMOS)}</tr>
+{chr(10).join(rows)}
+</table>
+<h3>מספרי טלפון</h3>
+<ul>
+{contacts}
+</ul>
+</body>
+</html>
+"""
+
+
+def write_corpus(folder: str, templates: List[Dict], pages: int):
+    """Write `pages` pages, cycling over the templates with numbered copies"""
+    os.makedirs(folder, exist_ok=True)
+    for i in range(pages):
+        template = templates[i % len(templates)]
+        copy = i // len(templates)
+        stem = os.path.splitext(template["filename"])[0]
+        with open(os.path.join(folder, f"{stem}_{copy:05d}.html"), "w", encoding="utf-8") as f:
+            f.write(render_page(template, copy))
+
+
+def same_as_full_parse(parser: HMOHTMLParser, folder: str, output_file: str) -> bool:
+    with open(output_file, "r", encoding="utf-8") as f:
+        incremental = json.load(f)
+    full = json.loads(json.dumps(parser.parse_all_files(folder), ensure_ascii=False))
+    return incremental == full
+
+
+def main():
+    parser_args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_args.add_argument("--pages", type=int, default=2000)
+    parser_args.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser_args.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "parsed_hmo_data.json"), "r", encoding="utf-8") as f:
+        templates = page_templates(json.load(f))
+
+    workdir = tempfile.mkdtemp()
+    folder = os.path.join(workdir, "pages")
+    output_file = os.path.join(workdir, "parsed_hmo_data.json")
+    write_corpus(folder, templates, args.pages)
+    files = sorted(os.listdir(folder))
+
+    parser = HMOHTMLParser("html.parser")
+    try:
+        backends = ["html.parser"] + (["lxml"] if builder_registry.lookup("lxml") else [])
+        reference = None
+        print(f"full parse of {len(files)} pages ({os.cpu_count()} CPUs)")
+        for backend in backends:
+            for workers in sorted({1, args.workers}):
+                start = time.perf_counter()
+                data = HMOHTMLParser(backend).parse_all_files(folder, workers=workers)
+                seconds = time.perf_counter() - start
+                reference = reference or data
+                print(f"{backend:>12} {workers:>3} workers: {seconds:>8.3f}s  "
+                      f"{len(files) / seconds:>6.0f} pages/s  same data: {data == reference}")
+        print()
+
+        def edit_page():
+            path = os.path.join(folder, files[0])
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html.replace("הנחה", "הנחה מיוחדת", 1))
+
+        def touch_page():
+            os.utime(os.path.join(folder, files[1]))
+
+        def delete_page():
+            os.remove(os.path.join(folder, files[2]))
+
+        steps = [("incremental, cold", None), ("incremental, no change", None),
+                 ("one page edited", edit_page), ("one page touched", touch_page),
+                 ("one page deleted", delete_page)]
+
+        for name, change in steps:
+            if change:
+                change()
+            result = parser.parse_incremental(folder, output_file)
+            print(f"{name:>22}: {result['seconds']:>8.3f}s  parsed {len(result['parsed'])}, "
+                  f"removed {len(result['removed'])}, written {result['written']}, "
+                  f"same as full parse: {same_as_full_parse(parser, folder, output_file)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
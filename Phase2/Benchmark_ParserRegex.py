@@ -0,0 +1,247 @@
+"""
+Golden-output check and per-function timing of the HMOHTMLParser regex extraction.
+
+The previous implementations of parse_tier_benefits,
+extract_hmo_contact_in_context and parse_contact_line are kept below
+verbatim as the reference. Inputs are the table cells, page texts and contact
+lines of the synthetic pages (see Benchmark_Ingestion.py), the strings stored
+in parsed_hmo_data.json, and edge cases (overlapping phone patterns, several
+extensions, latin and upper-case HMO names).
+
+Checks, each of which makes the script exit with status 1 on a mismatch:
+    - every function returns exactly what the reference returns on every input
+    - the synthetic pages parse back to the benefits and metadata of
+      parsed_hmo_data.json
+
+Usage:
+    python Benchmark_ParserRegex.py [--repeats 20]
+"""
+import re
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+from bs4 import BeautifulSoup
+
+from ParseHTML import HMOHTMLParser
+from Benchmark_Ingestion import page_templates, render_page
+
+
+HMO_PATTERNS = {
+    "מכבי": [r'מכבי', r'maccabi'],
+    "מאוחדת": [r'מאוחדת', r'meuhedet'],
+    "כללית": [r'כללית', r'clalit']
+}
+
+EXTRA_CELLS = [
+    "זהב:\n70% הנחה, עד 20 טיפולים בשנה\nכסף:\n\n50% הנחה\nעד 12 טיפולים\nארד:",
+    "הקדמה\nזהב: טקסט באותה שורה\nעד 5 טיפולים ו-10% הנחה\nזהב:\nחינם",
+    "כסף:\n120% הנחה 30% הנחה עד 3 טיפולים עד 4 טיפולים",
+    "",
+]
+
+EXTRA_TEXTS = [
+    "שירות לקוחות\nMACCABI: *3555* שלוחה 2\nמכבי - ללא טלפון\nClalit call 03-9766111 ext. 4",
+    "Meuhedet\n\n: 1-222-3833 תוסף 5\nכללית: İ 2700*",
+    "אין כאן מספרי טלפון למכבי או לכללית",
+]
+
+EXTRA_LINES = [
+    "*3555* או 1-700-50-53-53 שלוחה 10 שלוחת 3 שלוחה 4",
+    "12345* 1-800-1234 1-800-12-34-56 08-1234567 ext 7 ext.8 תוסף 9",
+    "אין טלפון",
+    "*1234*5678* 02-1234567-03-7654321",
+]
+
+
+# ─── Reference implementations (before the precompiled patterns) ──────────────────────────────────────────────────
+
+class ReferenceParser(HMOHTMLParser):
+
+    def parse_tier_benefits(self, cell_content: str) -> Dict:
+        tier_benefits = {}
+        lines = cell_content.split('\n')
+
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            if not line:
+                i += 1
+                continue
+
+            tier_match = re.search(r'(זהב|כסף|ארד):', line)
+            if tier_match:
+                tier = tier_match.group(1)
+
+                benefits_text = ""
+                j = i + 1
+
+                while j < len(lines):
+                    next_line = lines[j].strip()
+                    if not next_line:
+                        j += 1
+                        continue
+
+                    if re.search(r'(זהב|כסף|ארד):', next_line):
+                        break
+
+                    benefits_text += next_line + " "
+                    j += 1
+
+                benefits_text = benefits_text.strip()
+
+                if benefits_text:
+                    discount_match = re.search(r'(\d+)%\s*הנחה', benefits_text)
+                    limit_match = re.search(r'עד\s*(\d+)\s*טיפולים', benefits_text)
+
+                    tier_benefits[tier] = {
+                        "discount": discount_match.group(1) + "%" if discount_match else "",
+                        "annual_limit": limit_match.group(1) if limit_match else "",
+                        "full_text": benefits_text
+                    }
+
+                i = j
+            else:
+                i += 1
+
+        return tier_benefits
+
+    def extract_hmo_contact_in_context(self, text_content: str, hmo_patterns: List[str], service_category: str) -> Dict:
+        contact_data = {}
+
+        for pattern in hmo_patterns:
+            hmo_pattern = rf'{pattern}[^:]*:?\s*([^\n]*(?:\*?\d{{4}}\*?|1-\d{{3}}-\d{{2}}-\d{{2}}-\d{{2}}|1-\d{{3}}-\d{{4}}|0\d-\d{{7}})[^\n]*)'
+
+            matches = re.findall(hmo_pattern, text_content, re.IGNORECASE | re.MULTILINE)
+
+            if matches:
+                contact_line = matches[0].strip()
+
+                parsed_contact = self.parse_contact_line(contact_line, service_category)
+                if parsed_contact:
+                    contact_data.update(parsed_contact)
+                    break
+
+        return contact_data
+
+    def parse_contact_line(self, contact_line: str, service_category: str) -> Dict:
+        contact_data = {
+            "service_category": service_category,
+            "raw_contact_line": contact_line
+        }
+
+        phone_patterns = [
+            r'\*(\d{4})\*?',
+            r'(\d{4})\*',
+            r'(1-\d{3}-\d{2}-\d{2}-\d{2})',
+            r'(1-\d{3}-\d{4})',
+            r'(0\d-\d{7})',
+        ]
+
+        phones = []
+        for pattern in phone_patterns:
+            phones.extend(re.findall(pattern, contact_line))
+
+        if phones:
+            contact_data["phones"] = phones
+            contact_data["primary_phone"] = phones[0]
+
+        ext_patterns = [
+            r'שלוחה\s*(\d+)',
+            r'שלוחת\s*(\d+)',
+            r'ext\.?\s*(\d+)',
+            r'תוסף\s*(\d+)'
+        ]
+
+        extensions = []
+        for pattern in ext_patterns:
+            extensions.extend(re.findall(pattern, contact_line))
+
+        if extensions:
+            contact_data["extensions"] = extensions
+            contact_data["primary_extension"] = extensions[0]
+
+        return contact_data
+
+
+# ─── Inputs ──────────────────────────────────────────────────
+
+def collect_inputs(data: Dict) -> Dict[str, list]:
+    soups = [BeautifulSoup(render_page(template), "html.parser") for template in page_templates(data)]
+
+    cells = [cell.get_text(separator='\n', strip=True)
+             for soup in soups for row in soup.find("table").find_all("tr")[1:] for cell in row.find_all("td")[1:]]
+
+    lines = []
+    for services in data["benefits"].values():
+        for service in services.values():
+            for treatment in service["treatments"].values():
+                cells.append("\n".join(f"{tier}:\n{treatment[tier]['full_text']}"
+                                       for tier in ("זהב", "כסף", "ארד") if tier in treatment))
+                lines.extend(contact["raw_contact_line"] for contact in treatment.get("contacts", {}).values())
+
+    return {
+        "parse_tier_benefits": cells + EXTRA_CELLS,
+        "extract_hmo_contact_in_context": [soup.get_text() for soup in soups] + EXTRA_TEXTS,
+        "parse_contact_line": sorted(set(lines)) + EXTRA_LINES,
+    }
+
+
+def calls(parser: HMOHTMLParser, inputs: Dict[str, list]) -> Dict[str, list]:
+    """One zero-argument call per input, for each function"""
+    return {
+        "parse_tier_benefits": [lambda c=c: parser.parse_tier_benefits(c) for c in inputs["parse_tier_benefits"]],
+        "extract_hmo_contact_in_context": [lambda t=t, p=p: parser.extract_hmo_contact_in_context(t, p, "service")
+                                           for t in inputs["extract_hmo_contact_in_context"]
+                                           for p in HMO_PATTERNS.values()],
+        "parse_contact_line": [lambda l=l: parser.parse_contact_line(l, "service") for l in inputs["parse_contact_line"]],
+    }
+
+
+def main():
+    parser_args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser_args.add_argument("--repeats", type=int, default=20)
+    args = parser_args.parse_args()
+
+    with open("parsed_hmo_data.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    inputs = collect_inputs(data)
+    reference_calls = calls(ReferenceParser(), inputs)
+    current_calls = calls(HMOHTMLParser(), inputs)
+
+    failed = False
+    print(f"{'function':>32} {'inputs':>7} {'reference us':>13} {'current us':>11} {'speedup':>8}  identical")
+    for name in reference_calls:
+        identical = [f() for f in reference_calls[name]] == [f() for f in current_calls[name]]
+        failed |= not identical
+
+        timings = {}
+        for label, functions in (("reference", reference_calls[name]), ("current", current_calls[name])):
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                for f in functions:
+                    f()
+            timings[label] = (time.perf_counter() - start) / (args.repeats * len(functions)) * 1e6
+
+        print(f"{name:>32} {len(functions):>7} {timings['reference']:>13.1f} {timings['current']:>11.1f} "
+              f"{timings['reference'] / timings['current']:>7.1f}x  {identical}")
+
+    # Golden output: the pages rendered from parsed_hmo_data.json parse back to it
+    parser = HMOHTMLParser()
+    templates = page_templates(data)
+    parsed = parser.combine_documents([parser.parse_html(render_page(t), t["filename"]) for t in templates])
+    parsed = json.loads(json.dumps(parsed, ensure_ascii=False))
+    for key in ("benefits", "metadata"):
+        golden = parsed[key] == data[key]
+        failed |= not golden
+        print(f"golden {key}: {'identical' if golden else 'DIFFERENT'}")
+
+    if failed:
+        print("Regex extraction output changed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Hot reload of the knowledge base under load, against the fake server.
+
+Copies parsed_hmo_data.json and the embedding index to a temporary directory,
+starts FakeOpenAI.py and FastAPI.py there (with the file watcher on), and keeps
+/ask busy while the knowledge base is changed twice:
+
+    1. one description is edited and POST /admin/reload is called
+    2. another description is edited and the watcher picks it up on its own
+
+For each reload it reports the new generation, how long it took, how many
+texts were sent to the embedding API (only the edited documents should be),
+and the number of failed /ask requests and the latency while it ran.
+
+Usage:
+    python Benchmark_Reload.py [--concurrency 10]
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import httpx
+
+from LoadTest_Ask import wait_until_up
+
+
+FAKE_PORT = 8100
+API_URL = "http://127.0.0.1:8000"
+WATCH_INTERVAL = 0.5
+
+
+def edit_description(path: str, index: int):
+    """Append a marker to one treatment description of the parsed data"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    treatment = sorted(data["descriptions"])[index]
+    data["descriptions"][treatment] += f" (updated {time.time():.0f})"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+async def ask_load(http: httpx.AsyncClient, stop: asyncio.Event, concurrency: int) -> list:
+    """Fire distinct /ask requests until stopped; returns (latency, ok) per request"""
+    results = []
+
+    async def worker(n: int):
+        i = 0
+        while not stop.is_set():
+            i += 1
+            payload = {"prompt": f"question {n}-{i} about dental care", "hmo_name": "מכבי",
+                       "tier": "זהב", "history": []}
+            start = time.perf_counter()
+            try:
+                response = await http.post("/ask", json=payload)
+                results.append((time.perf_counter() - start, response.status_code == 200))
+            except httpx.HTTPError:
+                results.append((time.perf_counter() - start, False))
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return results
+
+
+async def wait_for_generation(http: httpx.AsyncClient, generation: int, timeout: float = 60) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        knowledge_base = (await http.get("/metrics")).json()["knowledge_base"]
+        if knowledge_base["generation"] >= generation and not knowledge_base["reloading"]:
+            return knowledge_base
+        if knowledge_base["last_error"]:
+            raise RuntimeError(f"Reload failed: {knowledge_base['last_error']}")
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Generation {generation} did not go live within {timeout}s")
+
+
+def embedded_texts(log_path: str) -> list:
+    """Number of texts sent to the embedding API, per rebuild, from the API log"""
+    with open(log_path, "r", encoding="utf-8") as f:
+        return [int(n) for n in re.findall(r"Embedding (\d+) new texts", f.read())]
+
+
+async def run(concurrency: int, data_path: str, log_path: str):
+    async with httpx.AsyncClient(base_url=API_URL, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency + 2)) as http:
+        for step, generation in (("admin endpoint", 2), ("file watcher", 3)):
+            stop = asyncio.Event()
+            load = asyncio.create_task(ask_load(http, stop, concurrency))
+            await asyncio.sleep(1)
+
+            edit_description(data_path, generation)
+            start = time.perf_counter()
+            if step == "admin endpoint":
+                response = await http.post("/admin/reload")
+                response.raise_for_status()
+            knowledge_base = await wait_for_generation(http, generation)
+            seconds = time.perf_counter() - start
+
+            await asyncio.sleep(1)
+            stop.set()
+            results = await load
+
+            latencies = np.array([latency for latency, _ in results]) * 1000
+            failed = sum(1 for _, ok in results if not ok)
+            print(f"{step:>15}: generation {knowledge_base['generation']} live after {seconds:.2f}s "
+                  f"({knowledge_base['documents']} documents, {embedded_texts(log_path)[-1]} embedded), "
+                  f"{len(results)} requests, {failed} failed, "
+                  f"p50 {np.percentile(latencies, 50):.0f} ms, p99 {np.percentile(latencies, 99):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(here, "parsed_hmo_data.json"), workdir)
+    shutil.copytree(os.path.join(here, "embedding_index"), os.path.join(workdir, "embedding_index"))
+    log_path = os.path.join(workdir, "chatbot.log")
+
+    env = dict(os.environ,
+               OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+               OpenAiAzureKey="fake",
+               EMBEDDING_MODEL="fake-embedding",
+               model_name="fake-chat",
+               BackLogPATH=log_path,
+               QUERY_CACHE_DB="",
+               KB_WATCH_INTERVAL=str(WATCH_INTERVAL))
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=env, stdout=subprocess.DEVNULL)
+    api = None
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+        api = subprocess.Popen([sys.executable, os.path.join(here, "FastAPI.py")], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_until_up(f"{API_URL}/health")
+
+        asyncio.run(run(args.concurrency, os.path.join(workdir, "parsed_hmo_data.json"), log_path))
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        fake.terminate()
+        fake.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Microbenchmark for the /ask retrieval step.
+
+Compares the previous approach (sklearn `cosine_similarity` on a list of lists
+followed by a full `np.argsort`) with `Retrieval.VectorIndex` (pre-normalized
+float32 matrix, one matrix-vector product, `argpartition` top-k) on synthetic
+corpora.
+
+Usage:
+    python Benchmark_Retrieval.py [--sizes 1000 10000 100000 1000000] [--dim 384]
+
+A corpus of 1M rows at the production dimension (1536) needs about 6 GB of
+RAM, so the default dimension is smaller. The baseline is skipped above
+--baseline-max rows because building the list of lists alone dominates.
+"""
+import argparse
+import time
+import numpy as np
+
+from Retrieval import VectorIndex, TOP_K
+
+
+def time_call(fn, repeats: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def baseline_search(query, embeddings_list):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    similarities = cosine_similarity([query], embeddings_list)[0]
+    return np.argsort(similarities)[-TOP_K:][::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--baseline-max", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'docs':>10} {'dim':>6} {'baseline ms':>12} {'index ms':>10} {'speedup':>8} {'same top-k':>10}")
+
+    for size in args.sizes:
+        matrix = rng.standard_normal((size, args.dim), dtype=np.float32)
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+
+        index = VectorIndex(matrix)
+        del matrix
+        indexed_ms = time_call(lambda: index.search(query, TOP_K), args.repeats)
+        top_indices, _ = index.search(query, TOP_K)
+
+        if size <= args.baseline_max:
+            embeddings_list = index.vectors.tolist()
+            same = bool(np.array_equal(baseline_search(query, embeddings_list), top_indices))
+            baseline_ms = time_call(lambda: baseline_search(query, embeddings_list), max(args.repeats // 4, 1))
+            del embeddings_list
+            print(f"{size:>10} {args.dim:>6} {baseline_ms:>12.2f} {indexed_ms:>10.2f} "
+                  f"{baseline_ms / indexed_ms:>7.1f}x {str(same):>10}")
+        else:
+            print(f"{size:>10} {args.dim:>6} {'-':>12} {indexed_ms:>10.2f} {'-':>8} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
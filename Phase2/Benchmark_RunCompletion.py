@@ -0,0 +1,104 @@
+"""
+Turn latency of the information-collection assistant against the fake server.
+
+Starts FakeOpenAI.py, points FastAPI.py at it, and times one full stateless
+turn (thread setup, run, tool calls, reply) with three run-completion
+strategies:
+
+    sleep-poll  - the previous loop: time.sleep backing off from 1s to 2s
+    poll        - adaptive polling from RUN_POLL_MIN_INTERVAL up to RUN_POLL_MAX_INTERVAL
+    stream      - the streaming runs API (event-driven)
+
+Each is measured on a plain reply and on a reply that needs a tool call
+(queued -> in_progress -> requires_action -> in_progress -> completed).
+
+Usage:
+    python Benchmark_RunCompletion.py [--repeats 5]
+"""
+import os
+import sys
+import time
+import argparse
+import warnings
+import tempfile
+import subprocess
+import numpy as np
+
+from LoadTest_Ask import wait_until_up
+
+
+FAKE_PORT = 8100
+
+
+def legacy_run_thread(api, thread_id: str):
+    """The sleep-polling loop the API used before event-driven completion"""
+    client = api.client
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=api.ASSISTANT_ID)
+
+    while True:
+        wait_time, total_wait = 1, 0
+        while run.status in ['queued', 'in_progress', 'cancelling'] and total_wait < 60:
+            time.sleep(wait_time)
+            total_wait += wait_time
+            wait_time = min(wait_time * 1.2, 2)
+            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+
+        if run.status == 'completed':
+            messages = client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=1)
+            return api.collection_result(messages.data[0].content[0].text.value, None)
+
+        if run.status != 'requires_action':
+            raise Exception(f"Assistant run failed with status: {run.status}")
+
+        tool_outputs = api.execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+        run = client.beta.threads.runs.submit_tool_outputs(thread_id=thread_id, run_id=run.id,
+                                                           tool_outputs=tool_outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.environ.update(OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+                      OpenAiAzureKey="fake",
+                      BackLogPATH=os.path.join(tempfile.gettempdir(), "benchmark_chatbot.log"))
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=dict(os.environ), stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+
+        import logging
+        import FastAPI as api
+        api.init_services()
+        logging.getLogger().setLevel(logging.WARNING)
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+        run_thread = api.run_thread
+        strategies = {
+            "sleep-poll": lambda: setattr(api, "run_thread", lambda thread_id: legacy_run_thread(api, thread_id)),
+            "poll": lambda: (setattr(api, "run_thread", run_thread), setattr(api, "RUN_COMPLETION_MODE", "poll")),
+            "stream": lambda: (setattr(api, "run_thread", run_thread), setattr(api, "RUN_COMPLETION_MODE", "stream")),
+        }
+        scenarios = {"plain reply": "Israel Israeli", "with tool call": "123456789"}
+
+        print(f"{'strategy':>10} {'scenario':>15} {'median s':>9} {'max s':>7}")
+        for name, activate in strategies.items():
+            activate()
+            for scenario, message in scenarios.items():
+                timings = []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    result = api.run_assistant_stateless(message, [])
+                    timings.append(time.perf_counter() - start)
+                    assert result["response"].startswith("Fake assistant reply")
+                print(f"{name:>10} {scenario:>15} {np.median(timings):>9.3f} {max(timings):>7.3f}")
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Import-time budget check and cold-start timing for FastAPI.py.
+
+Imports the module in a fresh interpreter with `python -X importtime`, using
+an empty environment (no endpoint, key or log path), so the check also proves
+that the import makes no network calls and needs no configuration. It reports
+the slowest top-level imports and exits with status 1 when the cumulative
+import time of FastAPI.py exceeds the budget.
+
+With --serve it also starts the API against the fake server and reports the
+time until /health answers (import, lifespan initialization and warm-up).
+
+Usage:
+    python Benchmark_Startup.py [--budget 1.0] [--repeats 5] [--serve]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+from LoadTest_Ask import wait_until_up
+
+
+FAKE_PORT = 8100
+API_URL = "http://127.0.0.1:8000"
+
+
+def import_times(here: str) -> dict:
+    """Cumulative import time per module (seconds) of one `import FastAPI`"""
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": here}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import FastAPI"],
+                            cwd=here, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import FastAPI failed offline:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Top level (FastAPI itself) and its direct imports only
+        if depth <= 1:
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def time_to_ready(here: str) -> float:
+    """Seconds from launching `python FastAPI.py` until /health answers"""
+    env = dict(os.environ,
+               OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+               OpenAiAzureKey="fake",
+               BackLogPATH=os.path.join(tempfile.gettempdir(), "benchmark_chatbot.log"))
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+        start = time.perf_counter()
+        api = subprocess.Popen([sys.executable, "FastAPI.py"], cwd=here, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(f"{API_URL}/health")
+            return time.perf_counter() - start
+        finally:
+            api.terminate()
+            api.wait()
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0")),
+                        help="maximum cumulative import time of FastAPI.py, in seconds")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--serve", action="store_true", help="also time the startup against the fake server")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    runs = [import_times(here) for _ in range(args.repeats)]
+    total = float(np.median([run["FastAPI"] for run in runs]))
+
+    print(f"{'module':>40} {'median s':>9}")
+    slowest = sorted(runs[0], key=lambda name: -np.median([run.get(name, 0) for run in runs]))
+    for name in slowest[:args.top]:
+        print(f"{name:>40} {np.median([run.get(name, 0) for run in runs]):>9.3f}")
+
+    print(f"\nimport FastAPI: {total:.3f}s (budget {args.budget:.3f}s)")
+
+    if args.serve:
+        print(f"time to ready: {time_to_ready(here):.2f}s")
+
+    if total > args.budget:
+        print("Import-time budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Startup time and per-worker memory of the multi-worker launch mode.
+
+Starts FakeOpenAI.py, then launches `Serve.py --workers N` against it twice
+with the same assistant registry file. For each launch it reports the time
+until /health answers and, per worker (sampled through GET /metrics), the
+startup time, RSS and assistant id. Both launches and all workers should use
+the same assistant, and the second launch should create none.
+
+RSS counts the shared memory-mapped index pages in every worker, so the sum
+over workers overstates the real memory use.
+
+Usage:
+    python Benchmark_Workers.py [--workers 4]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import httpx
+
+from LoadTest_Ask import wait_until_up
+
+
+FAKE_PORT = 8100
+API_PORT = 8000
+
+
+def launch(workers: int, env: dict) -> dict:
+    """Start Serve.py, wait until it serves, and collect each worker's /metrics"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "Serve.py", "--workers", str(workers), "--port", str(API_PORT)],
+                              cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{API_PORT}/health", timeout=120)
+        ready = time.perf_counter() - start
+
+        # Connections are spread over the workers by the OS, so sample until all were seen
+        seen = {}
+        deadline = time.time() + 30
+        while len(seen) < workers and time.time() < deadline:
+            worker = httpx.get(f"http://127.0.0.1:{API_PORT}/metrics", timeout=5).json()["worker"]
+            seen[worker["pid"]] = worker
+        return {"ready_seconds": ready, "workers": list(seen.values())}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    registry = os.path.join(tempfile.mkdtemp(), "assistant_registry.json")
+    env = dict(os.environ,
+               OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+               OpenAiAzureKey="fake",
+               BackLogPATH=os.path.join(tempfile.gettempdir(), "benchmark_chatbot.log"),
+               ASSISTANT_REGISTRY=registry)
+    env.pop("ASSISTANT_ID", None)
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+
+        for attempt in ("first launch", "restart"):
+            result = launch(args.workers, env)
+            print(f"{attempt}: serving after {result['ready_seconds']:.2f}s")
+            print(f"{'pid':>8} {'startup s':>9} {'RSS MB':>7}  assistant")
+            for worker in sorted(result["workers"], key=lambda w: w["pid"]):
+                print(f"{worker['pid']:>8} {worker['startup_seconds']:>9.2f} {worker['rss_mb']:>7.1f}  "
+                      f"{worker['assistant_id']}")
+            print()
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import re
+import sys
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from ParseHTML import HMOHTMLParser
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+TIERS = ["זהב", "כסף", "ארד"]
+MISSING = -1
+NO_ROWS = np.empty(0, dtype=np.int64)
+
+hmo_parser = HMOHTMLParser()
+
+LEADING_NUMBER = re.compile(r'\s*(\d+)')
+PARENTHETICAL = re.compile(r'\(([^)]*)\)')
+
+
+def parse_number(text: Optional[str]) -> int:
+    """Leading integer of "70%" or "20", or MISSING"""
+    match = LEADING_NUMBER.match(text or "")
+    return int(match.group(1)) if match else MISSING
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return " ".join((text or "").casefold().split())
+
+
+def treatment_aliases(name: str) -> List[str]:
+    """The full name, the name without its parenthetical and the parenthetical itself"""
+    aliases = [name, PARENTHETICAL.sub(" ", name)] + PARENTHETICAL.findall(name)
+    return [alias for alias in dict.fromkeys(normalize_text(a) for a in aliases) if len(alias) > 2]
+
+
+# ─── Benefits store ──────────────────────────────────────────────────
+
+class BenefitsStore:
+    """
+    Column store of the parsed benefits, one row per (HMO, service, treatment, tier).
+
+    Names are interned once in a string table and the rows hold integer codes
+    into it; discount and annual limit are integer columns (MISSING when the
+    page gives none). Hash indexes map every HMO, treatment and tier to its
+    rows and every full key to its row, so a lookup never scans the data.
+    Treatments are also indexed by their aliases, so the ones a question
+    names can be found in a single regex pass.
+    """
+
+    def __init__(self, benefits_data: Dict):
+        """
+        Args:
+            benefits_data (Dict): `HMOHTMLParser` output (parsed_hmo_data.json).
+        """
+        self.strings: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self.full_texts: List[str] = []
+        self.contacts: List[Dict] = []
+        contact_codes: Dict[Tuple[str, str], int] = {}
+
+        columns = {name: [] for name in ("hmo", "service", "treatment", "tier", "discount", "annual_limit", "contact")}
+
+        for hmo, services in benefits_data.get("benefits", {}).items():
+            for service, service_data in services.items():
+                for treatment, treatment_data in service_data.get("treatments", {}).items():
+                    contact = MISSING
+                    if hmo in treatment_data.get("contacts", {}):
+                        # The same contact line repeats across treatments; keep one copy of it
+                        contact_data = treatment_data["contacts"][hmo]
+                        contact_key = (contact_data.get("raw_contact_line", ""), contact_data.get("service_category", ""))
+                        contact = contact_codes.setdefault(contact_key, len(self.contacts))
+                        if contact == len(self.contacts):
+                            self.contacts.append(contact_data)
+
+                    for tier in TIERS:
+                        if tier not in treatment_data:
+                            continue
+                        columns["hmo"].append(self.intern(hmo_parser.normalize_hmo_name(hmo)))
+                        columns["service"].append(self.intern(service_data.get("title", service)))
+                        columns["treatment"].append(self.intern(treatment))
+                        columns["tier"].append(self.intern(tier))
+                        columns["discount"].append(parse_number(treatment_data[tier].get("discount")))
+                        columns["annual_limit"].append(parse_number(treatment_data[tier].get("annual_limit")))
+                        columns["contact"].append(contact)
+                        self.full_texts.append(sys.intern(treatment_data[tier].get("full_text", "")))
+
+        self.hmo = np.asarray(columns["hmo"], dtype=np.int32)
+        self.service = np.asarray(columns["service"], dtype=np.int32)
+        self.treatment = np.asarray(columns["treatment"], dtype=np.int32)
+        self.tier = np.asarray(columns["tier"], dtype=np.int32)
+        self.discount = np.asarray(columns["discount"], dtype=np.int16)
+        self.annual_limit = np.asarray(columns["annual_limit"], dtype=np.int16)
+        self.contact = np.asarray(columns["contact"], dtype=np.int32)
+
+        self.by_hmo = self.group(self.hmo)
+        self.by_treatment = self.group(self.treatment)
+        self.by_tier = self.group(self.tier)
+
+        # Composite keys are packed into one integer (see `key`), cheaper to hold and hash than tuples
+        hmo, service, treatment, tier = (column.astype(np.int64)
+                                         for column in (self.hmo, self.service, self.treatment, self.tier))
+        full_keys = self.key(hmo, service, treatment, tier).tolist()
+        self.by_key: Dict[int, int] = dict(zip(full_keys, range(len(full_keys))))
+        self.by_treatment_key: Dict[int, List[int]] = {}
+        for row, key in enumerate(self.key(hmo, MISSING, treatment, tier).tolist()):
+            self.by_treatment_key.setdefault(key, []).append(row)
+
+        self.aliases: Dict[str, int] = {}
+        for code in self.by_treatment:
+            for alias in treatment_aliases(self.strings[code]):
+                self.aliases.setdefault(alias, code)
+        # Longest alias first, so "דיקור סיני (אקופונקטורה)" wins over "דיקור סיני"
+        self.alias_pattern = re.compile("|".join(re.escape(a) for a in sorted(self.aliases, key=len, reverse=True))) \
+            if self.aliases else None
+
+        self.grounded = 0
+        self.not_grounded = 0
+
+        logger.info(f"Built benefits store with {len(self)} rows and {len(self.strings)} strings")
+
+    def __len__(self) -> int:
+        return len(self.full_texts)
+
+    def intern(self, text: str) -> int:
+        """Code of a string in the string table, adding it on first use"""
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(sys.intern(text))
+            self.codes[self.strings[code]] = code
+        return code
+
+    def key(self, hmo, service, treatment, tier):
+        """One integer for (hmo, service, treatment, tier) codes; element-wise on int64 columns"""
+        base = len(self.strings) + 1
+        return ((hmo * base + service + 1) * base + treatment) * base + tier
+
+    @staticmethod
+    def group(column: np.ndarray) -> Dict[int, np.ndarray]:
+        """Hash index: code -> sorted row ids"""
+        order = np.argsort(column, kind="stable")
+        codes, starts = np.unique(column[order], return_index=True)
+        return {int(code): rows for code, rows in zip(codes, np.split(order, starts[1:]))}
+
+    # ─── Key normalization ──────────────────────────────────────────────────
+
+    def hmo_code(self, hmo_name: Optional[str]) -> Optional[int]:
+        return self.codes.get(hmo_parser.normalize_hmo_name((hmo_name or "").strip()))
+
+    def tier_code(self, tier: Optional[str]) -> Optional[int]:
+        return self.codes.get(hmo_parser.normalize_tier((tier or "").strip()))
+
+    def treatment_code(self, treatment: Optional[str]) -> Optional[int]:
+        """Exact name or alias ("אקופונקטורה" for "דיקור סיני (אקופונקטורה)")"""
+        code = self.codes.get((treatment or "").strip())
+        if code is not None and code in self.by_treatment:
+            return code
+        return self.aliases.get(normalize_text(treatment))
+
+    # ─── Lookups ──────────────────────────────────────────────────
+
+    def row(self, i: int) -> Dict:
+        contact = int(self.contact[i])
+        return {
+            "hmo": self.strings[self.hmo[i]],
+            "service": self.strings[self.service[i]],
+            "treatment": self.strings[self.treatment[i]],
+            "tier": self.strings[self.tier[i]],
+            "discount": int(self.discount[i]) if self.discount[i] != MISSING else None,
+            "annual_limit": int(self.annual_limit[i]) if self.annual_limit[i] != MISSING else None,
+            "full_text": self.full_texts[i],
+            "contact": self.contacts[contact] if contact != MISSING else None,
+        }
+
+    def lookup(self, hmo_name: str, treatment: str, tier: str, service: Optional[str] = None) -> List[Dict]:
+        """
+        Benefits of one treatment for one HMO and tier, in O(1).
+
+        Args:
+            hmo_name (str): HMO, in English or Hebrew.
+            treatment (str): Treatment name or alias.
+            tier (str): Membership tier, in English or Hebrew.
+            service (str): Service page title; when omitted, the treatment
+                in every service is returned.
+
+        Returns:
+            List[Dict]: The matching rows (empty if there are none).
+        """
+        hmo, treatment, tier = self.hmo_code(hmo_name), self.treatment_code(treatment), self.tier_code(tier)
+        if hmo is None or treatment is None or tier is None:
+            return []
+
+        if service is not None:
+            service = self.codes.get(service)
+            row = self.by_key.get(self.key(hmo, service, treatment, tier)) if service is not None else None
+            return [self.row(row)] if row is not None else []
+
+        return [self.row(row) for row in self.by_treatment_key.get(self.key(hmo, MISSING, treatment, tier), [])]
+
+    def select(self, hmo_name: Optional[str] = None, treatment: Optional[str] = None,
+               tier: Optional[str] = None) -> np.ndarray:
+        """Row ids matching every given filter (intersection of the hash indexes)"""
+        rows = np.arange(len(self))
+        for index, value, code_of in ((self.by_hmo, hmo_name, self.hmo_code),
+                                      (self.by_treatment, treatment, self.treatment_code),
+                                      (self.by_tier, tier, self.tier_code)):
+            if value is not None:
+                rows = np.intersect1d(rows, index.get(code_of(value), NO_ROWS), assume_unique=True)
+        return rows
+
+    def find_treatments(self, text: str) -> List[int]:
+        """Codes of the treatments named in a free-text question, in order of appearance"""
+        if self.alias_pattern is None:
+            return []
+        return list(dict.fromkeys(self.aliases[m.group(0)] for m in self.alias_pattern.finditer(normalize_text(text))))
+
+    def ground(self, question: str, hmo_name: str, tier: Optional[str] = None) -> List[Dict]:
+        """
+        Rows that answer a question naming a treatment, without vector search.
+
+        Returns the user's HMO rows for every treatment the question names,
+        for the user's tier when it is known and for every tier otherwise.
+        Empty when the question names no known treatment.
+        """
+        rows = []
+        hmo = self.hmo_code(hmo_name)
+        if hmo is not None:
+            tier = self.tier_code(tier)
+            tiers = [tier] if tier is not None else [self.codes[t] for t in TIERS if t in self.codes]
+            for treatment in self.find_treatments(question):
+                for tier in tiers:
+                    key = self.key(hmo, MISSING, treatment, tier)
+                    rows.extend(self.row(i) for i in self.by_treatment_key.get(key, []))
+
+        if rows:
+            self.grounded += 1
+        else:
+            self.not_grounded += 1
+        return rows
+
+    def stats(self) -> Dict:
+        return {
+            "rows": len(self),
+            "strings": len(self.strings),
+            "treatments": len(self.by_treatment),
+            "column_bytes": sum(column.nbytes for column in (self.hmo, self.service, self.treatment, self.tier,
+                                                             self.discount, self.annual_limit, self.contact)),
+            "grounded_questions": self.grounded,
+            "not_grounded_questions": self.not_grounded,
+        }
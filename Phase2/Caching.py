@@ -0,0 +1,274 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional
+
+from ParseHTML import HMOHTMLParser
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB", "")
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+hmo_parser = HMOHTMLParser()
+
+
+def normalize_query_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query"""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+# ─── Query-embedding cache ──────────────────────────────────────────────────
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU with TTL for query embeddings.
+
+    Entries are keyed on the normalized query text and the embedding model.
+    An optional SQLite file acts as a second tier shared by every uvicorn
+    worker on the host: a local miss that hits the shared tier is promoted
+    into the local LRU.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 db_path: Optional[str] = QUERY_CACHE_DB):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS query_embeddings "
+                            "(key TEXT PRIMARY KEY, created REAL, vector BLOB)")
+            self.db.commit()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the cached embedding, or None on a miss"""
+        key = self.key(text, model)
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if now - created <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self.entries[key]
+                self.expirations += 1
+
+        vector = self._shared_get(key, now)
+        if vector is not None:
+            with self.lock:
+                self.shared_hits += 1
+                self._insert(key, vector, now)
+            return vector
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, model: str, vector):
+        key = self.key(text, model)
+        vector = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+
+        with self.lock:
+            self._insert(key, vector, now)
+        self._shared_put(key, vector, now)
+
+    def _insert(self, key: str, vector: np.ndarray, created: float):
+        self.entries[key] = (created, vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _shared_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        if self.db is None:
+            return None
+        try:
+            with self.lock:
+                row = self.db.execute("SELECT created, vector FROM query_embeddings WHERE key = ?",
+                                      (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared query cache read failed: {e}")
+            return None
+
+        if row is None or now - row[0] > self.ttl:
+            return None
+        return np.frombuffer(row[1], dtype=np.float32)
+
+    def _shared_put(self, key: str, vector: np.ndarray, created: float):
+        if self.db is None:
+            return
+        try:
+            with self.lock:
+                self.db.execute("INSERT OR REPLACE INTO query_embeddings (key, created, vector) VALUES (?, ?, ?)",
+                                (key, created, vector.tobytes()))
+                self.db.execute("DELETE FROM query_embeddings WHERE created < ?", (created - self.ttl,))
+                self.db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared query cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "shared_tier": self.db is not None,
+            }
+
+
+# ─── Semantic answer cache ──────────────────────────────────────────────────
+
+class SemanticAnswerCache:
+    """
+    Reuse a generated answer for near-duplicate questions.
+
+    Answers are grouped by (normalized HMO, normalized tier). A new question
+    hits when its embedding is within `threshold` cosine similarity of a cached
+    question in the same group. Only first questions of a conversation are
+    looked up and stored: the answer to a follow-up depends on the history,
+    which the key does not cover. The whole cache is dropped as soon as any
+    of the watched files (the parsed data and the embedding index) changes.
+    """
+
+    def __init__(self, watched_paths: List[str], threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        """
+        Args:
+            watched_paths (List[str]): Files whose change invalidates every answer.
+            threshold (float): Minimum cosine similarity for a hit.
+            max_size (int): Maximum number of answers per (HMO, tier) group.
+            ttl (float): Maximum age of an answer in seconds.
+        """
+        self.watched_paths = watched_paths
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        # group -> list of (created, unit query vector, answer dict, generation seconds)
+        self.groups: Dict[Tuple[str, str], List[tuple]] = {}
+        self.fingerprint = self._fingerprint()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    def _fingerprint(self) -> tuple:
+        fingerprint = []
+        for path in self.watched_paths:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _check_fingerprint(self):
+        fingerprint = self._fingerprint()
+        if fingerprint != self.fingerprint:
+            logger.info("Knowledge base changed, clearing the answer cache")
+            self.groups = {}
+            self.fingerprint = fingerprint
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every answer, e.g. when a new knowledge base generation goes live"""
+        with self.lock:
+            self.groups = {}
+            self.fingerprint = self._fingerprint()
+            self.invalidations += 1
+
+    @staticmethod
+    def group_key(hmo_name: str, tier: str) -> Tuple[str, str]:
+        return (hmo_parser.normalize_hmo_name((hmo_name or "").strip()),
+                hmo_parser.normalize_tier((tier or "").strip()))
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, hmo_name: str, tier: str, query_embedding) -> Optional[Dict]:
+        """Return the cached answer of the closest similar question, or None"""
+        query = self._unit(query_embedding)
+        now = time.time()
+
+        with self.lock:
+            self._check_fingerprint()
+            entries = [e for e in self.groups.get(self.group_key(hmo_name, tier), []) if now - e[0] <= self.ttl]
+            self.groups[self.group_key(hmo_name, tier)] = entries
+
+            if entries:
+                similarities = np.stack([e[1] for e in entries]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    self.latency_saved += entries[best][3]
+                    return entries[best][2]
+
+            self.misses += 1
+            return None
+
+    def store(self, hmo_name: str, tier: str, query_embedding, answer: Dict, generation_seconds: float):
+        """Remember an answer together with how long it took to produce"""
+        with self.lock:
+            self._check_fingerprint()
+            entries = self.groups.setdefault(self.group_key(hmo_name, tier), [])
+            entries.append((time.time(), self._unit(query_embedding), answer, generation_seconds))
+            if len(entries) > self.max_size:
+                del entries[0]
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": sum(len(e) for e in self.groups.values()),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
@@ -0,0 +1,121 @@
+"""
+Check the documents built from parsed_hmo_data.json.
+
+Expected counts are computed straight from the parsed data:
+
+    - one benefit chunk per (HMO, service, treatment, tier) present
+    - one description document per treatment description
+    - one metadata document per service page
+
+Every benefit chunk must carry its HMO and tier as fields, be unique, and
+hold its own tier's benefits (and no other tier's) in its text. The chunks
+of each (HMO, tier) must be contiguous, so every retrieval partition is a
+view on the memory-mapped index rather than a copy. An extra
+case checks that a treatment without any tier yields no chunk and does not
+pick up the text of the treatment before it.
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python Check_Documents.py [parsed_hmo_data.json]
+"""
+import sys
+import json
+from collections import Counter
+
+from Documents import build_documents, TIERS
+from Retrieval import partition_key
+
+
+def expected_counts(data: dict) -> Counter:
+    counts = Counter()
+    for services in data["benefits"].values():
+        for service in services.values():
+            for treatment in service.get("treatments", {}).values():
+                counts["benefit"] += sum(1 for tier in TIERS if tier in treatment)
+    counts["description"] = len(data.get("descriptions", {}))
+    counts["metadata"] = len(data.get("metadata", []))
+    return counts
+
+
+def benefit_errors(data: dict, documents: list) -> list:
+    errors = []
+    benefits = [d for d in documents if d["type"] == "benefit"]
+    missing = [d["treatment"] for d in benefits if not d.get("hmo") or not d.get("tier")]
+    if missing:
+        return [f"{len(missing)} benefit chunks without an hmo or tier field"]
+
+    keys = Counter((d["hmo"], d["service"], d["treatment"], d["tier"]) for d in benefits)
+    errors += [f"duplicate chunk {key}" for key, count in keys.items() if count > 1]
+
+    for doc in benefits:
+        treatment = data["benefits"][doc["hmo"]][doc["service"]]["treatments"][doc["treatment"]]
+        if doc["tier"] not in TIERS:
+            errors.append(f"unknown tier {doc['tier']!r} in {doc['treatment']}")
+            continue
+        own_text = treatment[doc["tier"]]["full_text"]
+        if own_text not in doc["text"]:
+            errors.append(f"{doc['treatment']} ({doc['hmo']}, {doc['tier']}) misses its own benefits")
+        # Another tier's text may be part of this one's ("25% הנחה" in "50% הנחה, 25% הנחה על ..."), look outside it
+        rest = doc["text"].replace(own_text, "")
+        for other in TIERS:
+            if other != doc["tier"] and other in treatment and treatment[other]["full_text"] in rest:
+                errors.append(f"{doc['treatment']} ({doc['hmo']}, {doc['tier']}) holds the {other} benefits")
+    return errors
+
+
+def contiguity_errors(documents: list) -> list:
+    """Rows of every retrieval partition must form one block"""
+    errors, finished, previous = [], set(), None
+    for doc in documents:
+        key = partition_key(doc)
+        if key != previous:
+            if key in finished:
+                errors.append(f"partition {key} is split into several blocks")
+            finished.add(previous)
+            previous = key
+    return errors
+
+
+def carry_over_errors() -> list:
+    """A treatment with no tier must not reuse the previous treatment's text"""
+    data = {"benefits": {"מכבי": {"page": {"title": "page", "treatments": {
+        "with tiers": {"זהב": {"discount": "70%", "annual_limit": "20", "full_text": "70% הנחה"}},
+        "without tiers": {"contacts": {"מכבי": {"raw_contact_line": "*3555", "service_category": "page"}}},
+    }}}}}
+    treatments = [d["treatment"] for d in build_documents(data)]
+    return [] if treatments == ["with tiers"] else [f"tier-less treatment produced chunks: {treatments}"]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "parsed_hmo_data.json"
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    documents = build_documents(data)
+    expected = expected_counts(data)
+    actual = Counter(doc["type"] for doc in documents)
+
+    errors = []
+    for doc_type in ("benefit", "description", "metadata"):
+        ok = actual[doc_type] == expected[doc_type]
+        print(f"{doc_type:>12}: {actual[doc_type]:>4} documents, expected {expected[doc_type]:>4}  "
+              f"{'ok' if ok else 'MISMATCH'}")
+        if not ok:
+            errors.append(f"{doc_type}: {actual[doc_type]} documents, expected {expected[doc_type]}")
+
+    errors += benefit_errors(data, documents)
+    errors += contiguity_errors(documents)
+    errors += carry_over_errors()
+
+    tiers = Counter(doc.get("tier") for doc in documents if doc["type"] == "benefit")
+    print(f"benefit chunks per tier: {dict(tiers)}")
+
+    for error in errors:
+        print(f"FAILED: {error}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+ASSISTANT_REGISTRY = os.getenv("ASSISTANT_REGISTRY", "assistant_registry.json")
+
+
+# ─── Assistant registry ──────────────────────────────────────────────────
+
+def assistant_fingerprint(endpoint: str, config: Dict) -> str:
+    """Hash of the endpoint and the assistant definition, so any change gets a new assistant"""
+    payload = json.dumps({"endpoint": endpoint, "config": config}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_registry(registry_path: str = ASSISTANT_REGISTRY) -> Dict:
+    if not os.path.exists(registry_path):
+        return {}
+    with open(registry_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_registry(registry: Dict, registry_path: str = ASSISTANT_REGISTRY):
+    """Write the registry atomically, so a concurrent reader never sees a partial file"""
+    tmp_path = f"{registry_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, registry_path)
+
+
+def resolve_assistant_id(client, endpoint: str, config: Dict, registry_path: str = ASSISTANT_REGISTRY) -> str:
+    """
+    Return the id of the assistant to use, creating it only when needed.
+
+    ASSISTANT_ID from the environment wins (the multi-worker launcher sets it
+    for its workers). Otherwise the registry file is looked up by the
+    fingerprint of the endpoint and assistant definition, and the remote
+    assistant is checked to still exist. A new assistant is created and
+    recorded only when there is no usable entry.
+
+    Args:
+        client: Sync Azure OpenAI client.
+        endpoint (str): Azure OpenAI endpoint the assistant belongs to.
+        config (Dict): Keyword arguments for `client.beta.assistants.create`.
+        registry_path (str): Path of the local registry file.
+
+    Returns:
+        str: The assistant id.
+    """
+    import openai
+
+    assistant_id = os.getenv("ASSISTANT_ID")
+    if assistant_id:
+        logger.info(f"Using assistant {assistant_id} from ASSISTANT_ID")
+        return assistant_id
+
+    fingerprint = assistant_fingerprint(endpoint, config)
+    registry = load_registry(registry_path)
+    entry = registry.get(fingerprint)
+
+    if entry is not None:
+        try:
+            client.beta.assistants.retrieve(entry["id"])
+            logger.info(f"Reusing assistant {entry['id']} from {registry_path}")
+            return entry["id"]
+        except openai.NotFoundError:
+            logger.warning(f"Assistant {entry['id']} no longer exists, creating a new one")
+
+    assistant = client.beta.assistants.create(**config)
+    registry[fingerprint] = {"id": assistant.id, "created_at": int(time.time())}
+    save_registry(registry, registry_path)
+    logger.info(f"Created assistant {assistant.id} and recorded it in {registry_path}")
+
+    return assistant.id
+
+
+# ─── Worker process info ──────────────────────────────────────────────────
+
+def rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (None where it cannot be read)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak RSS, in bytes on macOS and in KB elsewhere
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    except ImportError:
+        return None
@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+# Bumped whenever the documents built from the same data change, so an index
+# written by an older version is rebuilt instead of loaded
+DOCUMENTS_VERSION = 3
+
+TIERS = ["זהב", "כסף", "ארד"]
+
+
+# ─── Document construction ──────────────────────────────────────────────────
+
+def benefit_text(hmo: str, service_title: str, treatment: str, tier: str, tier_info: Dict,
+                 contact: Optional[Dict]) -> str:
+    text = f"Treatment {treatment}, which is part of {service_title} in {hmo} " \
+           f"have the next information: {tier}: {tier_info.get('full_text', '')}"
+    if contact:
+        text += f" Content information is {contact.get('raw_contact_line', '')} " \
+                f"for {contact.get('service_category', '')}"
+    return text
+
+
+def benefit_documents(benefits_data: Dict) -> List[Dict]:
+    """
+    One chunk per (HMO, service, treatment, tier).
+
+    Every chunk carries its HMO and tier as fields, so retrieval can filter
+    on them, and only its own tier's benefits in the text. A treatment
+    without tier information yields no chunk.
+
+    Chunks are grouped by HMO, then tier, so every retrieval partition
+    (see `Retrieval.partition_key`) is one contiguous block of index rows,
+    i.e. a view on the memory-mapped matrix rather than a copy.
+    """
+    documents = []
+    for hmo, services in benefits_data.get("benefits", {}).items():
+        for service_name, service_data in services.items():
+            for treatment, treatment_data in service_data.get("treatments", {}).items():
+                if not any(tier in treatment_data for tier in TIERS):
+                    logger.warning(f"No tier information for {treatment} "
+                                   f"({service_data.get('title', service_name)}, {hmo}), skipped")
+
+        for tier in TIERS:
+            for service_name, service_data in services.items():
+                service_title = service_data.get("title", service_name)
+                for treatment, treatment_data in service_data.get("treatments", {}).items():
+                    if tier not in treatment_data:
+                        continue
+                    contact = treatment_data.get("contacts", {}).get(hmo)
+                    documents.append({
+                        "type": "benefit",
+                        "hmo": hmo,
+                        "tier": tier,
+                        "service": service_name,
+                        "treatment": treatment,
+                        "data": treatment_data[tier],
+                        "contact": contact,
+                        "text": benefit_text(hmo, service_title, treatment, tier, treatment_data[tier], contact)
+                    })
+    return documents
+
+
+def build_documents(benefits_data: Dict) -> List[Dict]:
+    """
+    Build the documents that are embedded and searched.
+
+    Args:
+        benefits_data (Dict): `HMOHTMLParser` output (parsed_hmo_data.json).
+
+    Returns:
+        List[Dict]: Benefit chunks (see `benefit_documents`), then one document
+            per treatment description and one per service page.
+    """
+    documents = benefit_documents(benefits_data)
+
+    for treatment, description in benefits_data.get("descriptions", {}).items():
+        documents.append({
+            "type": "description",
+            "treatment": treatment,
+            "description": description,
+            "text": f"{treatment} is {description}"
+        })
+
+    for metadata in benefits_data.get("metadata", []):
+        documents.append({
+            "type": "metadata",
+            "filename": metadata.get('filename', ''),
+            "title": metadata.get('title', ''),
+            "data": metadata,
+            "text": f"{metadata.get('title', '')} is {metadata.get('description', '')}"
+        })
+
+    return documents
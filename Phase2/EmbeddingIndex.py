@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import pickle
+import time
+import shutil
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+INDEX_FORMAT_VERSION = 2
+# Version 1 kept the data files next to the manifest; such indexes are still read
+READABLE_FORMAT_VERSIONS = (1, 2)
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "embedding_index")
+
+# A load retries when a newer save removed the version it was reading
+LOAD_ATTEMPTS = 3
+
+MANIFEST_FILE = "manifest.json"
+# Version directories are named v-<time_ns>-<pid>, so their names order them by creation time
+DATA_DIR_PREFIX = "v-"
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+# ─── Index format ──────────────────────────────────────────────────
+#
+# embedding_index/
+# ├── manifest.json        # format version, shape, dtype, model, documents version, data_dir
+# └── v-<id>/              # one directory per saved version, named by the manifest's data_dir
+#     ├── vectors.npy      # contiguous float32 matrix, rows L2-normalized
+#     └── documents.json   # one metadata dict per row, same order as vectors.npy
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of the matrix with every row scaled to unit length"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def index_exists(index_dir: str) -> bool:
+    """Whether an index has been written (a directory without a manifest is not an index yet)"""
+    return os.path.exists(os.path.join(index_dir, MANIFEST_FILE))
+
+
+def save_index(index_dir: str, embeddings, documents: List[Dict], model: str = "", documents_version: int = 1):
+    """
+    Write embeddings and documents in the versioned index format.
+
+    The data files go to a new version directory and the manifest pointing
+    at it replaces the old one with one atomic rename, so readers see either
+    the old index or the new one, never a half-written or missing one. The
+    previous version directory is kept, so a reader that read the old
+    manifest just before the swap can still open its files.
+
+    Args:
+        index_dir (str): Target directory.
+        embeddings: Matrix or list of embedding vectors, one per document.
+        documents (List[Dict]): Document metadata, one per embedding row.
+        model (str): Name of the embedding model that produced the vectors.
+        documents_version (int): Version of the document layout (see Documents.py).
+    """
+    vectors = normalize_rows(embeddings) if len(documents) else np.zeros((0, 0), dtype=np.float32)
+    if vectors.shape[0] != len(documents):
+        raise ValueError(f"Got {vectors.shape[0]} embeddings for {len(documents)} documents")
+
+    os.makedirs(index_dir, exist_ok=True)
+    try:
+        previous = load_manifest(index_dir)
+    except (OSError, ValueError):
+        previous = None
+
+    data_dir = f"{DATA_DIR_PREFIX}{time.time_ns()}-{os.getpid()}"
+    os.makedirs(os.path.join(index_dir, data_dir))
+
+    np.save(os.path.join(index_dir, data_dir, VECTORS_FILE), vectors)
+
+    with open(os.path.join(index_dir, data_dir, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+        json.dump(documents, f, ensure_ascii=False, separators=(",", ":"))
+
+    manifest = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "dtype": "float32",
+        "normalized": True,
+        "model": model or "",
+        "documents_version": documents_version,
+        "data_dir": data_dir,
+    }
+    tmp_manifest = os.path.join(index_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_manifest, os.path.join(index_dir, MANIFEST_FILE))
+    except BaseException:
+        if os.path.exists(tmp_manifest):
+            os.remove(tmp_manifest)
+        raise
+
+    remove_old_versions(index_dir, data_dir, previous)
+
+    logger.info(f"Saved embedding index with {manifest['count']} rows to {index_dir}")
+
+
+def data_dir_created(name: str) -> int:
+    """Creation time (ns) encoded in a version directory name, 0 if it is not one"""
+    try:
+        return int(name[len(DATA_DIR_PREFIX):].split("-")[0]) if name.startswith(DATA_DIR_PREFIX) else 0
+    except ValueError:
+        return 0
+
+
+def remove_old_versions(index_dir: str, data_dir: str, previous: Optional[Dict]):
+    """
+    Remove version directories older than both the new and the previous manifest's.
+
+    The previous version stays for readers that read the old manifest just
+    before the swap. Newer directories belong to another writer that has not
+    published its manifest yet, and other processes' temporary files are not
+    touched either.
+    """
+    targets = [data_dir]
+    if previous is not None and previous.get("data_dir"):
+        targets.append(previous["data_dir"])
+        # Version 1 data files next to the manifest are two versions old now
+        for name in (VECTORS_FILE, DOCUMENTS_FILE):
+            try:
+                os.remove(os.path.join(index_dir, name))
+            except OSError:
+                pass
+
+    oldest_kept = min(data_dir_created(target) for target in targets)
+    for name in os.listdir(index_dir):
+        created = data_dir_created(name)
+        if created and created < oldest_kept and name not in targets:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def load_manifest(index_dir: str) -> Dict:
+    """Read and validate the index manifest"""
+    with open(os.path.join(index_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") not in READABLE_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported embedding index version {manifest.get('format_version')} "
+                         f"(expected {INDEX_FORMAT_VERSION})")
+    return manifest
+
+
+def load_index(index_dir: str) -> Tuple[np.ndarray, List[Dict], Dict]:
+    """
+    Load an index written by `save_index`.
+
+    The vectors are memory-mapped read-only, so loading does not copy the
+    matrix and several processes share the same physical pages.
+
+    Returns:
+        Tuple: (vectors, documents, manifest)
+    """
+    for attempt in range(LOAD_ATTEMPTS):
+        manifest = load_manifest(index_dir)
+        data_dir = os.path.join(index_dir, manifest.get("data_dir", ""))
+        try:
+            vectors = np.load(os.path.join(data_dir, VECTORS_FILE), mmap_mode="r")
+            with open(os.path.join(data_dir, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+                documents = json.load(f)
+            break
+        except FileNotFoundError:
+            # Two saves since the manifest was read removed its version: read the new manifest
+            if attempt == LOAD_ATTEMPTS - 1 or load_manifest(index_dir).get("data_dir") == manifest.get("data_dir"):
+                raise
+
+    if vectors.dtype != np.float32 or vectors.shape[0] != manifest["count"]:
+        raise ValueError(f"Embedding index at {index_dir} does not match its manifest")
+
+    logger.info(f"Loaded embedding index with {len(documents)} rows from {index_dir}")
+    return vectors, documents, manifest
+
+
+def convert_pickle(pickle_path: str = "embeddings.pkl", index_dir: str = EMBEDDING_INDEX_DIR, model: str = "",
+                   min_documents_version: int = 1) -> bool:
+    """
+    One-shot conversion of the legacy `embeddings.pkl` into the index format.
+
+    Args:
+        min_documents_version (int): Skip the conversion when the pickle's
+            document layout is older (pickles without one are version 1),
+            since such an index would be rebuilt right after loading anyway.
+
+    Returns:
+        bool: True if the index was written.
+    """
+    with open(pickle_path, "rb") as f:
+        data = pickle.load(f)
+
+    documents_version = data.get("documents_version", 1)
+    if documents_version < min_documents_version:
+        logger.info(f"{pickle_path} has document layout {documents_version}, older than "
+                    f"{min_documents_version}, not converted")
+        return False
+
+    save_index(index_dir, data["embeddings"], data["documents"], model=model, documents_version=documents_version)
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "embeddings.pkl"
+    target = sys.argv[2] if len(sys.argv) > 2 else EMBEDDING_INDEX_DIR
+
+    convert_pickle(source, target, model=os.getenv("EMBEDDING_MODEL", ""))
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+import hashlib
+import pickle
+import logging
+from typing import List, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.pkl")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+# A query embedding slower than this is abandoned and the question is answered by lexical retrieval
+QUERY_EMBEDDING_BUDGET = float(os.getenv("QUERY_EMBEDDING_BUDGET", "2"))
+EMBEDDING_RETRY_AFTER = float(os.getenv("EMBEDDING_RETRY_AFTER", "30"))
+
+
+# ─── Content-hash cache ──────────────────────────────────────────────────
+
+class EmbeddingCache:
+    """
+    On-disk cache of embeddings keyed by a hash of (model, text).
+
+    Re-running the embedding step after the parsed data changed only pays for
+    documents whose text is new; unchanged documents are served from the cache.
+    """
+
+    def __init__(self, path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.vectors: Dict[str, List[float]] = {}
+
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.vectors = pickle.load(f)
+            logger.info(f"Loaded {len(self.vectors)} cached embeddings from {path}")
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        """Content hash of a single text for a given embedding model"""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        return self.vectors.get(self.key(text, model))
+
+    def put(self, text: str, model: str, vector: List[float]):
+        self.vectors[self.key(text, model)] = vector
+
+    def prune(self, texts: List[str], model: str):
+        """Drop every entry that does not belong to the given texts"""
+        live = {self.key(text, model) for text in texts}
+        self.vectors = {k: v for k, v in self.vectors.items() if k in live}
+
+    def save(self):
+        """Write the cache atomically so a crash never leaves a partial file"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.vectors, f)
+        os.replace(tmp_path, self.path)
+
+
+# ─── Batched embedding ──────────────────────────────────────────────────
+
+def embed_batch(client, texts: List[str], model: str) -> List[List[float]]:
+    """
+    Embed a batch of texts with a single API call.
+
+    Args:
+        client: Any object exposing the OpenAI `embeddings.create` interface.
+        texts (List[str]): Texts to embed.
+        model (str): Embedding model / deployment name.
+
+    Returns:
+        List[List[float]]: One embedding per text, in input order.
+    """
+    response = client.embeddings.create(input=texts, model=model)
+    data = sorted(response.data, key=lambda item: item.index)
+    return [item.embedding for item in data]
+
+
+async def embed_texts(client, texts: List[str], model: str,
+                      cache: Optional[EmbeddingCache] = None,
+                      batch_size: int = EMBEDDING_BATCH_SIZE,
+                      max_concurrency: int = EMBEDDING_MAX_CONCURRENCY) -> List[List[float]]:
+    """
+    Embed many texts with batched requests and bounded concurrency.
+
+    Texts already present in the cache are not sent to the API. The blocking
+    client calls run in worker threads so the event loop stays responsive.
+
+    Args:
+        client: Any object exposing the OpenAI `embeddings.create` interface.
+        texts (List[str]): Texts to embed.
+        model (str): Embedding model / deployment name.
+        cache (EmbeddingCache): Optional content-hash cache.
+        batch_size (int): Maximum number of texts per API call.
+        max_concurrency (int): Maximum number of API calls in flight.
+
+    Returns:
+        List[List[float]]: One embedding per text, in input order.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    missing: Dict[str, List[int]] = {}
+
+    for i, text in enumerate(texts):
+        vector = cache.get(text, model) if cache else None
+        if vector is not None:
+            results[i] = vector
+        else:
+            missing.setdefault(text, []).append(i)
+
+    pending = list(missing.keys())
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), max(batch_size, 1))]
+    logger.info(f"Embedding {len(pending)} new texts in {len(batches)} batches "
+                f"({len(texts) - sum(len(v) for v in missing.values())} served from cache)")
+
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def run_batch(batch: List[str]):
+        async with semaphore:
+            vectors = await asyncio.to_thread(embed_batch, client, batch, model)
+        for text, vector in zip(batch, vectors):
+            for i in missing[text]:
+                results[i] = vector
+            if cache:
+                cache.put(text, model, vector)
+
+    await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+    return results
+
+
+# ─── Degraded mode ──────────────────────────────────────────────────
+
+class EmbeddingCircuit:
+    """
+    Tracks whether query embeddings should be requested at all.
+
+    After a failed or too slow embedding call the circuit opens for
+    `retry_after` seconds: queries skip the embedding service and are served
+    by lexical retrieval alone, instead of each waiting out the budget. The
+    first query after that tries the service again.
+    """
+
+    def __init__(self, retry_after: float = EMBEDDING_RETRY_AFTER):
+        self.retry_after = retry_after
+        self.open_until = 0.0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    def available(self) -> bool:
+        if time.monotonic() < self.open_until:
+            self.skipped += 1
+            return False
+        return True
+
+    def failed(self, error: Exception):
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.open_until = time.monotonic() + self.retry_after
+        logger.warning(f"Query embedding failed ({self.last_error}), lexical retrieval only "
+                       f"for the next {self.retry_after:.0f}s")
+
+    def stats(self) -> Dict:
+        return {
+            "open": time.monotonic() < self.open_until,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,334 @@
+"""
+Local stand-in for the Azure OpenAI endpoints used by FastAPI.py.
+
+Every response is produced after a configurable artificial latency, so load
+tests can measure how the API behaves with many slow upstream calls in flight
+without spending tokens. Embeddings are deterministic per input text, and
+assistant runs go through the queued / in_progress / requires_action states
+on a configurable timeline.
+
+Usage:
+    python FakeOpenAI.py [--port 8100]
+
+Point the API at it with OpenAiAzureEndPoint=http://127.0.0.1:8100
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+app = FastAPI(title="Fake Azure OpenAI", version="1.0.0")
+
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0.05"))
+CHAT_LATENCY = float(os.getenv("FAKE_CHAT_LATENCY", "0.5"))
+CHAT_TOKENS = int(os.getenv("FAKE_CHAT_TOKENS", "20"))
+
+assistants = {}
+
+
+def fake_embedding(text: str) -> list:
+    """Deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# ─── Endpoints ──────────────────────────────────────────────────
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(EMBEDDING_LATENCY)
+
+    return {
+        "object": "list",
+        "model": deployment,
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                 for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    content = f"Fake answer to: {body['messages'][-1]['content'][-80:]}"
+
+    if body.get("stream"):
+        return StreamingResponse(stream_chat(deployment, content), media_type="text/event-stream")
+
+    await asyncio.sleep(CHAT_LATENCY)
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+async def stream_chat(deployment: str, content: str):
+    """Emit the answer in CHAT_TOKENS chunks spread over CHAT_LATENCY"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    step = max(len(content) // CHAT_TOKENS, 1)
+
+    for start in range(0, len(content), step):
+        await asyncio.sleep(CHAT_LATENCY / CHAT_TOKENS)
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/assistants")
+async def create_assistant(request: Request):
+    body = await request.json()
+
+    assistant = {
+        "id": f"asst_{uuid.uuid4().hex[:24]}",
+        "object": "assistant",
+        "created_at": int(time.time()),
+        "model": body.get("model", ""),
+        "instructions": body.get("instructions", ""),
+        "tools": body.get("tools", []),
+    }
+    assistants[assistant["id"]] = assistant
+    return assistant
+
+
+@app.get("/openai/assistants/{assistant_id}")
+async def retrieve_assistant(assistant_id: str):
+    if assistant_id not in assistants:
+        raise HTTPException(status_code=404, detail={"error": {"message": "No assistant found", "code": "not_found"}})
+    return assistants[assistant_id]
+
+
+# ─── Assistants (threads, messages, runs) ──────────────────────────────────────────────────
+#
+# A run is queued for FAKE_RUN_QUEUED seconds, then in_progress for
+# FAKE_RUN_IN_PROGRESS seconds. If the last user message contains a digit the
+# run then stops in requires_action with one Validate_ID tool call, and if it is
+# a confirmation ("yes", "כן") with one Submit_UserInfo call for a fixed
+# profile; after the tool outputs are submitted it is in_progress again before
+# it completes.
+
+RUN_QUEUED = float(os.getenv("FAKE_RUN_QUEUED", "0.1"))
+RUN_IN_PROGRESS = float(os.getenv("FAKE_RUN_IN_PROGRESS", "0.3"))
+
+threads = {}
+runs = {}
+
+CONFIRMATIONS = {"yes", "כן"}
+
+FAKE_PROFILE = {"F_name": "Israel", "L_name": "Israeli", "id": 123456789, "gender": "m", "age": 34,
+                "hmo_name": "Maccabi", "HMOcn": 987654321, "MemTier": "Gold"}
+
+
+def required_tool(text: str):
+    """The tool call a run needs before it can answer the user message, if any"""
+    if text.strip().lower() in CONFIRMATIONS:
+        return {"name": "Submit_UserInfo", "arguments": json.dumps(FAKE_PROFILE)}
+    if any(ch.isdigit() for ch in text):
+        return {"name": "Validate_ID", "arguments": json.dumps({"id": 123456789})}
+    return None
+
+
+def message_object(thread_id: str, role: str, content: str, message_id: str = None) -> dict:
+    return {
+        "id": message_id or f"msg_{uuid.uuid4().hex[:24]}",
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "status": "completed",
+        "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def run_object(run: dict) -> dict:
+    status = run_status(run)
+    required_action = None
+    if status == "requires_action":
+        required_action = {
+            "type": "submit_tool_outputs",
+            "submit_tool_outputs": {"tool_calls": [{
+                "id": f"call_{run['id']}",
+                "type": "function",
+                "function": run["needs_tool"],
+            }]},
+        }
+
+    return {
+        "id": run["id"],
+        "object": "thread.run",
+        "created_at": int(run["created"]),
+        "thread_id": run["thread_id"],
+        "assistant_id": run["assistant_id"],
+        "status": status,
+        "required_action": required_action,
+        "tools": [],
+        "metadata": {},
+    }
+
+
+def run_status(run: dict) -> str:
+    """Status of a run as a function of time, completing it when due"""
+    elapsed = time.time() - run["phase_start"]
+
+    if run["phase"] == "start":
+        if elapsed < RUN_QUEUED:
+            return "queued"
+        if elapsed < RUN_QUEUED + RUN_IN_PROGRESS:
+            return "in_progress"
+        if run["needs_tool"]:
+            return "requires_action"
+    elif elapsed < RUN_IN_PROGRESS:
+        return "in_progress"
+
+    complete_run(run)
+    return "completed"
+
+
+def complete_run(run: dict):
+    if run["reply"] is None:
+        last_user = next((m for m in reversed(threads[run["thread_id"]]) if m["role"] == "user"), None)
+        text = last_user["content"][0]["text"]["value"] if last_user else ""
+        run["reply"] = message_object(run["thread_id"], "assistant", f"Fake assistant reply to: {text[-80:]}")
+        threads[run["thread_id"]].append(run["reply"])
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_run(run: dict):
+    """Emit the run lifecycle as Assistants stream events, in real time"""
+    if run["phase"] == "start":
+        yield sse("thread.run.created", run_object(run))
+        yield sse("thread.run.queued", run_object(run))
+        await asyncio.sleep(RUN_QUEUED)
+
+    yield sse("thread.run.in_progress", run_object(run))
+    await asyncio.sleep(max(run["phase_start"] + (RUN_QUEUED if run["phase"] == "start" else 0)
+                            + RUN_IN_PROGRESS - time.time(), 0))
+
+    status = run_status(run)
+    if status == "requires_action":
+        yield sse("thread.run.requires_action", run_object(run))
+        yield "event: done\ndata: [DONE]\n\n"
+        return
+
+    reply = run["reply"]
+    value = reply["content"][0]["text"]["value"]
+    yield sse("thread.message.created", dict(reply, status="in_progress", content=[]))
+    step = max(len(value) // CHAT_TOKENS, 1)
+    for start in range(0, len(value), step):
+        yield sse("thread.message.delta", {
+            "id": reply["id"],
+            "object": "thread.message.delta",
+            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": value[start:start + step], "annotations": []}}]},
+        })
+    yield sse("thread.message.completed", reply)
+    yield sse("thread.run.completed", run_object(run))
+    yield "event: done\ndata: [DONE]\n\n"
+
+
+@app.post("/openai/threads")
+async def create_thread():
+    thread_id = f"thread_{uuid.uuid4().hex[:24]}"
+    threads[thread_id] = []
+    return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+
+@app.delete("/openai/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    threads.pop(thread_id, None)
+    return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+
+@app.post("/openai/threads/{thread_id}/messages")
+async def create_message(thread_id: str, request: Request):
+    body = await request.json()
+    message = message_object(thread_id, body["role"], body["content"])
+    threads[thread_id].append(message)
+    return message
+
+
+@app.get("/openai/threads/{thread_id}/messages")
+async def list_messages(thread_id: str, order: str = "desc", limit: int = 20):
+    messages = list(reversed(threads[thread_id])) if order == "desc" else list(threads[thread_id])
+    return {"object": "list", "data": messages[:limit], "has_more": len(messages) > limit}
+
+
+@app.post("/openai/threads/{thread_id}/runs")
+async def create_run(thread_id: str, request: Request):
+    body = await request.json()
+    last_user = next((m for m in reversed(threads[thread_id]) if m["role"] == "user"), None)
+    text = last_user["content"][0]["text"]["value"] if last_user else ""
+
+    run = {
+        "id": f"run_{uuid.uuid4().hex[:24]}",
+        "thread_id": thread_id,
+        "assistant_id": body.get("assistant_id", ""),
+        "created": time.time(),
+        "phase": "start",
+        "phase_start": time.time(),
+        "needs_tool": required_tool(text),
+        "reply": None,
+    }
+    runs[run["id"]] = run
+
+    if body.get("stream"):
+        return StreamingResponse(stream_run(run), media_type="text/event-stream")
+    return run_object(run)
+
+
+@app.get("/openai/threads/{thread_id}/runs/{run_id}")
+async def retrieve_run(thread_id: str, run_id: str):
+    return run_object(runs[run_id])
+
+
+@app.post("/openai/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+async def submit_tool_outputs(thread_id: str, run_id: str, request: Request):
+    body = await request.json()
+    run = runs[run_id]
+    run["phase"] = "after_tools"
+    run["phase_start"] = time.time()
+
+    if body.get("stream"):
+        return StreamingResponse(stream_run(run), media_type="text/event-stream")
+    return run_object(run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI server")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -1,61 +1,96 @@
 import os
 import time
-from openai import AzureOpenAI 
 import json
+import hmac
 import logging
-from fastapi import FastAPI , HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI , APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
-import uvicorn
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+import anyio
 from typing import List, Dict 
 import warnings
 import sys
 import numpy as np
-import requests
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 
-# ─── Initializtion ──────────────────────────────────────────────────
+# Before the local modules, so the settings they read at import come from .env too
 load_dotenv()
-app = FastAPI(title="Stateless FastAPI Chatbot" , version="1.0.0")
-FASTAPI_URL = "http://localhost:8000"
 
-#Logger
-format="%(asctime)s [%(levelname)s] %(message)s"
-formatter = logging.Formatter(format)
+from Embeddings import EmbeddingCache, EmbeddingCircuit, embed_texts, QUERY_EMBEDDING_BUDGET
+from EmbeddingIndex import (EMBEDDING_INDEX_DIR, MANIFEST_FILE, save_index, load_index, load_manifest,
+                            convert_pickle, index_exists)
+from Documents import build_documents, DOCUMENTS_VERSION
+from Retrieval import TOP_K, reciprocal_rank_fusion, normalize_tier
+from KnowledgeBase import KnowledgeBase, KnowledgeBaseManager, rebuild_lock, file_fingerprint, KB_WATCH_INTERVAL
+from Caching import QueryEmbeddingCache, SemanticAnswerCache
+from Sessions import SessionStore
+from Admission import AdmissionController, AdmissionRejected, CHAT_POOL_SIZE
+from LocalCollection import LocalCollector, CompletionStats, count_user_turns, LOCAL_COLLECTION
+from Deployment import resolve_assistant_id, rss_mb
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# ─── Initializtion ──────────────────────────────────────────────────
+#
+# Importing this module has no side effects: logging handlers, the Azure
+# OpenAI clients, the assistant and the index are set up by `init_services`
+# and `load_data`, which the lifespan hook of `create_app` runs.
+
+startup_begin = time.perf_counter()
+startup_seconds = None
 
-console_h = logging.StreamHandler(sys.stdout)
-console_h.setFormatter(formatter)
-logger.addHandler(console_h)
+logger = logging.getLogger()
 
-file_h = logging.FileHandler(os.getenv("BackLogPATH"), mode="a", encoding="utf-8")
-file_h.setFormatter(formatter)
-logger.addHandler(file_h)
+# Azure OpenAI (created by init_services)
+client = None
+async_client = None
+ASSISTANT_ID = None
 
-# Azure OpenAI
-client = AzureOpenAI(
-  azure_endpoint = os.getenv("OpenAiAzureEndPoint"),
-  api_key= os.getenv("OpenAiAzureKey"),
-  api_version="2024-05-01-preview"
-)
+# Async Azure OpenAI for the Q&A path, over one pooled HTTP connection pool
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "60"))
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
 
-executor = ThreadPoolExecutor(max_workers=50)
-embeddings = []
-documents = []
-benefits_data = {}    
+# Assistant run completion: "stream" (event-driven) or "poll" (adaptive polling)
+RUN_COMPLETION_MODE = os.getenv("RUN_COMPLETION_MODE", "stream")
+RUN_POLL_MIN_INTERVAL = float(os.getenv("RUN_POLL_MIN_INTERVAL", "0.02"))
+RUN_POLL_MAX_INTERVAL = float(os.getenv("RUN_POLL_MAX_INTERVAL", "0.1"))
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", "60"))
+
+# Chat requests are admitted (bounded queue, per-client limit) before they reach the pool
+executor = ThreadPoolExecutor(max_workers=CHAT_POOL_SIZE)
+admission = AdmissionController()
+tool_executor = ThreadPoolExecutor(max_workers=8)
+
+# The live knowledge base generation (data, documents, index), swapped as a whole on reload
+kb_manager = KnowledgeBaseManager()
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Questions naming a known treatment are answered from the benefits store, without vector search
+BENEFITS_GROUNDING = os.getenv("BENEFITS_GROUNDING", "1") == "1"
+
+# "hybrid" (vector + BM25, rank-fused), "vector" or "lexical"; any mode falls back to lexical
+# while the embedding service is failing or slower than QUERY_EMBEDDING_BUDGET
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+embedding_circuit = EmbeddingCircuit()
+retrieval_counts = {"hybrid": 0, "vector": 0, "lexical": 0}
+
+query_cache = None
+answer_cache = SemanticAnswerCache([kb_manager.source_path, os.path.join(EMBEDDING_INDEX_DIR, MANIFEST_FILE)])
+
+# Persistent assistant threads per client session (disable for stateless horizontal scaling)
+ASSISTANT_SESSION_MODE = os.getenv("ASSISTANT_SESSION_MODE", "1") == "1"
+session_store = SessionStore(lambda thread_id: delete_thread(thread_id))
 
 
 # ─── Assistant Initializtion ──────────────────────────────────────────────────
 
-assistant = client.beta.assistants.create(
+ASSISTANT_CONFIG = dict(
   model="gpt-4o-mini",
   instructions="""
   You are a persistent information collection assistant with a mandatory stage process.
@@ -83,19 +118,87 @@ Provide a confirmation step for users to review and correct their information.
 
 Do not answer anything the user ask until you have all information confirmed
 Only after the user confirm his information you can move forward to Q&A with the user.
-When confirmed, tell the user:
-if the language is english: 
-"Information collection completed. How can i help you today and add the user name? You are in HMO_name, ranked as membership tier
+When confirmed, call the Submit_UserInfo tool once with all the confirmed details.
+If it returns invalid fields, ask the user to correct them and submit again.
+If it is valid, tell the user in his language that the information collection is completed and ask how you can help, for example:
+if the language is english:
+"Information collection completed. How can i help you today, user name? You are in HMO_name, ranked as membership tier
 if the language is hebrew:
 איסוף המידע הושלם. איך אני יכול לעזור לך היום, user name? אתה בקופת חולים hmo name, בדרגת חברות tier
 """,
-  tools=[{"type":"function","function":{"name":"Validate_ID","description":"Validate ID length","parameters":{"type":"object","properties":{"id":{"type":"integer","description":"The user id, should be 9-digit number"}},"required":["id"]}}},{"type":"function","function":{"name":"Validate_HMOCardNum","description":"Validate HMO card number length","parameters":{"type":"object","properties":{"HMOcn":{"type":"integer","description":"The user HMO card number, should be 9-digit number"}},"required":["HMOcn"]}}},{"type":"function","function":{"name":"Validate_UserName","description":"Validate that the user give booth first and last name","parameters":{"type":"object","properties":{"F_name":{"type":"string","description":"The user first name"},"L_name":{"type":"string","description":"The user last name"}},"required":["F_name","L_name"]}}},{"type":"function","function":{"name":"Validate_Age","description":"Validate that the user give his age and its inside the allowed range","parameters":{"type":"object","properties":{"age":{"type":"integer","description":"The user age","minimum":0,"maximum":120}},"required":["age"]}}},{"type":"function","function":{"name":"Validate_Gender","description":"Validate that the user give his gender","parameters":{"type":"object","properties":{"gender":{"type":"string","description":"The user gender","enum":["f","m"]}},"required":["gender"]}}},{"type":"function","function":{"name":"Validate_HMOname","description":"Validate that the user give his HMO name","parameters":{"type":"object","properties":{"hmo_name":{"type":"string","description":"The user HMO name","enum":["Meuhedet","Maccabi","Clalit","מכבי","מאוחדת","כללית"]}},"required":["hmo_name"]}}},{"type":"function","function":{"name":"Validate_MemTier","description":"Validate that the user give his insurance membership tier","parameters":{"type":"object","properties":{"MemTier":{"type":"string","description":"The user insurance membership tier","enum":["Gold","Silver","Bronze","זהב","כסף","ארד"]}},"required":["MemTier"]}}}],
+  tools=[{"type":"function","function":{"name":"Validate_ID","description":"Validate ID length","parameters":{"type":"object","properties":{"id":{"type":"integer","description":"The user id, should be 9-digit number"}},"required":["id"]}}},{"type":"function","function":{"name":"Validate_HMOCardNum","description":"Validate HMO card number length","parameters":{"type":"object","properties":{"HMOcn":{"type":"integer","description":"The user HMO card number, should be 9-digit number"}},"required":["HMOcn"]}}},{"type":"function","function":{"name":"Validate_UserName","description":"Validate that the user give booth first and last name","parameters":{"type":"object","properties":{"F_name":{"type":"string","description":"The user first name"},"L_name":{"type":"string","description":"The user last name"}},"required":["F_name","L_name"]}}},{"type":"function","function":{"name":"Validate_Age","description":"Validate that the user give his age and its inside the allowed range","parameters":{"type":"object","properties":{"age":{"type":"integer","description":"The user age","minimum":0,"maximum":120}},"required":["age"]}}},{"type":"function","function":{"name":"Validate_Gender","description":"Validate that the user give his gender","parameters":{"type":"object","properties":{"gender":{"type":"string","description":"The user gender","enum":["f","m"]}},"required":["gender"]}}},{"type":"function","function":{"name":"Validate_HMOname","description":"Validate that the user give his HMO name","parameters":{"type":"object","properties":{"hmo_name":{"type":"string","description":"The user HMO name","enum":["Meuhedet","Maccabi","Clalit","מכבי","מאוחדת","כללית"]}},"required":["hmo_name"]}}},{"type":"function","function":{"name":"Validate_MemTier","description":"Validate that the user give his insurance membership tier","parameters":{"type":"object","properties":{"MemTier":{"type":"string","description":"The user insurance membership tier","enum":["Gold","Silver","Bronze","זהב","כסף","ארד"]}},"required":["MemTier"]}}},{"type":"function","function":{"name":"Submit_UserInfo","description":"Submit all the user details once the user confirmed them. Completes the information collection","parameters":{"type":"object","properties":{"F_name":{"type":"string","description":"The user first name"},"L_name":{"type":"string","description":"The user last name"},"id":{"type":"integer","description":"The user id, 9-digit number"},"gender":{"type":"string","enum":["f","m"]},"age":{"type":"integer","minimum":0,"maximum":120},"hmo_name":{"type":"string","enum":["Meuhedet","Maccabi","Clalit","מכבי","מאוחדת","כללית"]},"HMOcn":{"type":"integer","description":"The user HMO card number, 9-digit number"},"MemTier":{"type":"string","enum":["Gold","Silver","Bronze","זהב","כסף","ארד"]}},"required":["F_name","L_name","id","gender","age","hmo_name","HMOcn","MemTier"]}}}],
   tool_resources= {},
   temperature=1,
   top_p=1
 )
 
 
+def configure_logging():
+    """Attach the console handler and, if BackLogPATH is set, the log file handler (once)"""
+    if any(getattr(handler, "chatbot_handler", False) for handler in logger.handlers):
+        return
+    
+    #Logger
+    format="%(asctime)s [%(levelname)s] %(message)s"
+    formatter = logging.Formatter(format)
+    
+    logger.setLevel(logging.INFO)
+    
+    console_h = logging.StreamHandler(sys.stdout)
+    console_h.setFormatter(formatter)
+    console_h.chatbot_handler = True
+    logger.addHandler(console_h)
+    
+    if os.getenv("BackLogPATH"):
+        file_h = logging.FileHandler(os.getenv("BackLogPATH"), mode="a", encoding="utf-8")
+        file_h.setFormatter(formatter)
+        file_h.chatbot_handler = True
+        logger.addHandler(file_h)
+
+
+def init_services():
+    """
+    Create the Azure OpenAI clients, resolve the assistant and open the query cache.
+
+    Runs once per process, from the lifespan hook (scripts that use the
+    module functions directly call it themselves). The openai and httpx
+    packages are only imported here, so importing this module stays fast and
+    works offline.
+    """
+    global client, async_client, ASSISTANT_ID, query_cache
+    
+    if client is not None:
+        return
+    
+    import httpx
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+    
+    configure_logging()
+    
+    # Azure OpenAI
+    client = AzureOpenAI(
+      azure_endpoint = os.getenv("OpenAiAzureEndPoint"),
+      api_key= os.getenv("OpenAiAzureKey"),
+      api_version="2024-05-01-preview"
+    )
+    
+    async_client = AsyncAzureOpenAI(
+      azure_endpoint = os.getenv("OpenAiAzureEndPoint"),
+      api_key= os.getenv("OpenAiAzureKey"),
+      api_version="2024-05-01-preview",
+      http_client=httpx.AsyncClient(
+          limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                              max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+          timeout=httpx.Timeout(CHAT_TIMEOUT, connect=5.0)
+      )
+    )
+    
+    # One assistant per definition, reused across restarts and shared by all workers
+    ASSISTANT_ID = resolve_assistant_id(client, os.getenv("OpenAiAzureEndPoint"), ASSISTANT_CONFIG)
+    
+    query_cache = QueryEmbeddingCache()
+
+
 
 # ─── Class Declaration──────────────────────────────────────────────────
 
@@ -106,6 +209,7 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[Dict]] = []
+    session_id: Optional[str] = None
     user_info: Optional[Dict] = None
     system_message: Optional[str] = None
     
@@ -139,12 +243,24 @@ class HMONamePayload(BaseModel):
        
 class MemTierPayload(BaseModel):
     MemTier: str
+
+class UserInfoPayload(BaseModel):
+    F_name: str
+    L_name: str
+    id: int
+    gender: str
+    age: int
+    hmo_name: str
+    HMOcn: int
+    MemTier: str
       
 class QueryRequest(BaseModel):
     prompt: str
     hmo_name: str
     tier: str
     history: list
+    # Restrict retrieval to these document types ("benefit", "description", "metadata")
+    doc_types: Optional[List[str]] = None
     
     
     
@@ -153,6 +269,317 @@ class QueryRequest(BaseModel):
 
 
 
+def create_stateless_thread(message: str, history: List[Dict]):
+    """Create a temporary thread holding the client-side history and the new user message"""
+    temp_thread = client.beta.threads.create()
+    logger.info(f"Created temporary thread {temp_thread.id}")
+    
+    for msg in history:
+        if isinstance(msg, dict) and "role" in msg and "content" in msg:
+            client.beta.threads.messages.create(
+                thread_id=temp_thread.id,
+                role=msg["role"],
+                content=msg["content"]
+            )
+    
+    logger.info(f"Added {len(history)} history messages to thread {temp_thread.id}")
+    
+    # Add current message
+    client.beta.threads.messages.create(
+        thread_id=temp_thread.id,
+        role="user",
+        content=message
+    )
+    
+    return temp_thread
+
+
+def delete_thread(thread_id: str):
+    """Cleanup temporary thread"""
+    try:
+        client.beta.threads.delete(thread_id)
+        logger.info(f"Deleted temporary thread: {thread_id}")
+    except Exception as cleanup_error:
+        logger.warning(f"Could not delete thread {thread_id}: {cleanup_error}")
+
+
+def execute_tool_call(tool_call) -> Dict:
+    """
+    Run one validation tool in-process.
+
+    The validators behind the HTTP endpoints are called directly, so a tool
+    call costs no TCP connection, serialization or routing.
+
+    Returns:
+        Dict: Tool output ready for `submit_tool_outputs`.
+    """
+    fn_name = tool_call.function.name
+    fn_args_str = tool_call.function.arguments
+    tool_call_id = tool_call.id
+    
+    try:
+        try:
+            fn_args = json.loads(fn_args_str) if fn_args_str else {}
+        except json.JSONDecodeError as json_error:
+            logger.error(f"JSON decode error for {fn_name}: {json_error}")
+            fn_args = {}
+
+        validator, payload_model = TOOL_REGISTRY[fn_name]
+        logger.info(f"Calling tool {fn_name} with args: {fn_args}")
+        
+        result = validator(payload_model(**fn_args))
+        
+        if result is None:
+            result = {"error": "Tool returned None"}
+        
+        return {
+            "tool_call_id": tool_call_id,
+            "output": json.dumps(result)
+        }
+        
+    except ValidationError as validation_error:
+        logger.error(f"Invalid arguments for {fn_name}: {validation_error}")
+        error_msg = f"Invalid arguments for {fn_name}: {validation_error}"
+        
+    except Exception as e:
+        logger.error(f"Error calling function {fn_name}: {e}")
+        error_msg = f"Error calling function {fn_name}: {e}"
+    
+    return {
+        "tool_call_id": tool_call_id,
+        "output": json.dumps({"error": error_msg})
+    }
+
+
+def execute_tool_calls(tool_calls) -> List[Dict]:
+    """
+    Run the validation tools requested by the assistant.
+
+    The tool calls of one `requires_action` step are independent, so they run
+    concurrently.
+
+    Args:
+        tool_calls: Tool calls from a run's `required_action`.
+
+    Returns:
+        List[Dict]: Tool outputs ready for `submit_tool_outputs`, in call order.
+    """
+    if len(tool_calls) <= 1:
+        return [execute_tool_call(tool_call) for tool_call in tool_calls]
+    
+    return list(tool_executor.map(execute_tool_call, tool_calls))
+
+
+def collection_result(response_content: str, profile: Optional[Dict]) -> Dict:
+    """
+    Build the result of a collection turn.
+
+    The collection is complete only when the assistant submitted a validated
+    profile through the Submit_UserInfo tool during the turn, so the reply
+    text may be worded freely.
+
+    Returns:
+        Dict: {
+            "response" : response content , 
+            "collection_complete" : boolean mark if information collection complete ,
+            "Personal_Information" : relevant personal Information
+        }
+    """
+    return {
+        "response" : response_content ,
+        "collection_complete" : profile is not None ,
+        "Personal_Information" : profile or {}
+        }
+
+
+def submitted_profile(tool_calls, tool_outputs: List[Dict]) -> Optional[Dict]:
+    """The validated profile of a Submit_UserInfo call among the tool calls, if any"""
+    for tool_call, tool_output in zip(tool_calls, tool_outputs):
+        if tool_call.function.name != "Submit_UserInfo":
+            continue
+        
+        output = json.loads(tool_output["output"])
+        if output.get("valid"):
+            return output["profile"]
+        
+        completion_stats.rejected()
+        logger.info(f"Submit_UserInfo rejected: {output}")
+    
+    return None
+
+
+def wait_for_run(thread_id: str, run):
+    """
+    Poll a run until it leaves the queued/in_progress states.
+
+    Polling starts at RUN_POLL_MIN_INTERVAL and backs off to at most
+    RUN_POLL_MAX_INTERVAL, so a run is noticed within ~100ms of finishing.
+    """
+    interval = RUN_POLL_MIN_INTERVAL
+    start = time.monotonic()
+    
+    while run.status in ['queued', 'in_progress', 'cancelling'] and time.monotonic() - start < RUN_TIMEOUT:
+        time.sleep(interval)
+        interval = min(interval * 1.5, RUN_POLL_MAX_INTERVAL)
+        
+        run = client.beta.threads.runs.retrieve(
+            thread_id=thread_id,
+            run_id=run.id
+        )
+    
+    logger.info(f"Run status: {run.status}, waited: {time.monotonic() - start:.2f}s")
+    return run
+
+
+def run_thread(thread_id: str) -> Dict:
+    """
+    Run the assistant on a thread until it produces its reply.
+
+    By default the run is consumed through the streaming runs API, so the
+    turn returns as soon as the run completes. With RUN_COMPLETION_MODE=poll
+    the run is polled with `wait_for_run` instead.
+
+    Args:
+        thread_id (str): Thread that already holds the new user message.
+
+    Returns:
+        Dict: See `collection_result`.
+    """
+    if RUN_COMPLETION_MODE == "stream":
+        for payload in stream_thread(thread_id):
+            result = payload
+        result.pop("done", None)
+        return result
+    
+    logger.info(f"Starting assistant run for thread {thread_id}")
+    
+    # Run assistant
+    run = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=ASSISTANT_ID
+    )
+    
+    logger.info(f"Run created with ID: {run.id}, status: {run.status}")
+    
+    max_iterations = 10
+    iteration = 0
+    profile = None
+    
+    while iteration < max_iterations:
+        iteration += 1
+        run = wait_for_run(thread_id, run)
+        
+        if run.status == 'completed':
+            logger.info(f"Run completed successfully for thread {thread_id}")
+            
+            messages = client.beta.threads.messages.list(
+                thread_id=thread_id,
+                order="desc",
+                limit=1
+            )
+            
+            assistant_message = messages.data[0]
+            response_content = assistant_message.content[0].text.value
+            
+            return collection_result(response_content, profile)
+        
+        
+        elif run.status == 'requires_action':
+            
+            required_action = run.required_action
+            
+            if required_action.type == 'submit_tool_outputs':
+                tool_calls = required_action.submit_tool_outputs.tool_calls
+                tool_outputs = execute_tool_calls(tool_calls)
+                profile = submitted_profile(tool_calls, tool_outputs) or profile
+                
+                try:
+                    run = client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs
+                    )
+
+                    continue
+                
+                except Exception as submit_error:
+                    logger.error(f"Error submitting tool outputs: {submit_error}")
+                    raise submit_error
+                                           
+        else:
+            logger.error(f"Assistant run failed with status: {run.status}")
+            raise Exception(f"Assistant run failed with status: {run.status}")
+    
+    raise Exception(f"Assistant run did not complete after {max_iterations} tool steps")
+
+
+def stream_thread(thread_id: str):
+    """
+    Streaming variant of `run_thread`.
+
+    Uses the streaming runs API, so text is forwarded as soon as the assistant
+    produces it and tool calls are handled when the run asks for them.
+
+    Yields:
+        Dict: {"token": ...} for every text delta, then the final
+        `collection_result` dict with "done": True.
+    """
+    stream = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=ASSISTANT_ID,
+        stream=True
+    )
+    
+    response_content = ""
+    profile = None
+    
+    try:
+        while stream is not None:
+            next_stream = None
+            
+            for event in stream:
+                if event.event == "thread.message.created":
+                    response_content = ""
+                
+                elif event.event == "thread.message.delta":
+                    for part in event.data.delta.content or []:
+                        if part.type == "text" and part.text and part.text.value:
+                            response_content += part.text.value
+                            yield {"token": part.text.value}
+                
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                    tool_outputs = execute_tool_calls(tool_calls)
+                    profile = submitted_profile(tool_calls, tool_outputs) or profile
+                    next_stream = client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs,
+                        stream=True
+                    )
+                    break
+                
+                elif event.event in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+                    raise Exception(f"Assistant run failed with status: {event.data.status}")
+                
+                elif event.event == "error":
+                    raise Exception(f"Assistant stream error: {event.data}")
+            
+            stream.close()
+            stream = next_stream
+    
+    finally:
+        # Also reached when the generator is closed mid-run, e.g. the client went away
+        if stream is not None:
+            stream.close()
+    
+    logger.info(f"Streamed run completed for thread {thread_id}")
+    result = collection_result(response_content, profile)
+    result["done"] = True
+    yield result
+
+
 def run_assistant_stateless(message: str, history: List[Dict]):
     """
     Process a single user message through the assistant without maintaining server-side state.
@@ -172,288 +599,485 @@ def run_assistant_stateless(message: str, history: List[Dict]):
             "Personal_Information" : relevant personal Information
         }
     """
-    endpoint_map = {
-        "Validate_ID":         "validate_id",
-        "Validate_HMOCardNum": "validate_hmo_card", 
-        "Validate_UserName":   "validate_user_name",
-        "Validate_Age":        "validate_age",
-        "Validate_Gender":     "validate_gender",
-        "Validate_HMOname":    "validate_hmo_name",
-        "Validate_MemTier":    "validate_mem_tier",
-    }
+    temp_thread = create_stateless_thread(message, history)
+
+    try:
+        return run_thread(temp_thread.id)
+        
+    except Exception as e:
+        logger.error(f"Error in run_assistant_stateless: {str(e)}")
+        raise e
     
-    temp_thread = client.beta.threads.create()
+    finally:
+        delete_thread(temp_thread.id)
+
+
+def stream_assistant_stateless(message: str, history: List[Dict]):
+    """
+    Streaming variant of `run_assistant_stateless`.
+
+    Args:
+        message (str):User message to process.
+        history (List[Dict]): A list of previous messages.
+
+    Yields:
+        Dict: See `stream_thread`, or {"error": ...} if the run failed.
+    """
+    temp_thread = None
 
     try:
-        logger.info(f"Created temporary thread {temp_thread.id}")
+        temp_thread = create_stateless_thread(message, history)
+        yield from stream_thread(temp_thread.id)
         
-        for msg in history:
-            if isinstance(msg, dict) and "role" in msg and "content" in msg:
-                client.beta.threads.messages.create(
-                    thread_id=temp_thread.id,
-                    role=msg["role"],
-                    content=msg["content"]
-                )
+    except Exception as e:
+        logger.error(f"Error in stream_assistant_stateless: {str(e)}")
+        yield {"error": str(e)}
+    
+    finally:
+        if temp_thread is not None:
+            delete_thread(temp_thread.id)
+
+
+def open_session(session_id: str, message: str, history: List[Dict]):
+    """
+    Return the session's thread with the new user message appended.
+
+    A known session only gets the new message, so a turn costs O(1) API calls.
+    An unknown or expired session is rebuilt once from the client-side history.
+    The session is returned with `session.lock` held, the caller releases it
+    once the run is over.
+    """
+    while True:
+        session, created = session_store.reserve(session_id)
         
-        logger.info(f"Added {len(history)} history messages to thread {temp_thread.id}")
+        if created:
+            try:
+                thread = create_stateless_thread(message, history)
+            except Exception:
+                session_store.remove(session_id, session)
+                session.lock.release()
+                raise
+            session.thread_id = thread.id
+            logger.info(f"Session {session_id} bound to thread {thread.id}")
+            return session
+        
+        session.lock.acquire()
+        if session.thread_id is not None:
+            break
+        # The turn that created the session failed to create its thread
+        session.lock.release()
+    
+    try:
+        # Turns answered locally since the last run are added first, in order.
+        # A turn is dropped only once posted, so a failed call loses none of them
+        while session.local_turns:
+            turn = session.local_turns[0]
+            client.beta.threads.messages.create(
+                thread_id=session.thread_id,
+                role=turn["role"],
+                content=turn["content"]
+            )
+            session.local_turns.pop(0)
         
-        # Add current message
         client.beta.threads.messages.create(
-            thread_id=temp_thread.id,
+            thread_id=session.thread_id,
             role="user",
             content=message
         )
+    except Exception:
+        session.lock.release()
+        raise
+    
+    return session
+
+
+def run_assistant_session(session_id: str, message: str, history: List[Dict]):
+    """
+    Process a user message on the persistent thread of a conversation.
+
+    Args:
+        session_id (str): Client session id.
+        message (str):User message to process.
+        history (List[Dict]): Client-side history, only used when the session must be rebuilt.
+
+    Returns:
+        Dict: See `run_assistant_stateless`.
+    """
+    session = open_session(session_id, message, history)
+    
+    try:
+        result = run_thread(session.thread_id)
+        session.turns += 1
         
-        logger.info(f"Starting assistant run for thread {temp_thread.id}")
-        
-        # Run assistant
-        run = client.beta.threads.runs.create(
-            thread_id=temp_thread.id,
-            assistant_id=assistant.id
-        )
-        
-        logger.info(f"Run created with ID: {run.id}, status: {run.status}")
-        
-        max_iterations = 10
-        iteration = 0
-        
-        while iteration < max_iterations:
-            wait_time = 1
-            max_wait = 60
-            total_wait = 0
-            iteration += 1
-            
-            print(f"Processing iteration {iteration}") 
+        # The thread is no longer needed once the profile is collected
+        if result["collection_complete"]:
+            session_store.remove(session_id, session)
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error in run_assistant_session: {str(e)}")
+        session_store.remove(session_id, session)
+        raise e
+    
+    finally:
+        session.lock.release()
+
+
+def stream_assistant_session(session_id: str, message: str, history: List[Dict]):
+    """Streaming variant of `run_assistant_session`"""
+    session = None
+    
+    try:
+        session = open_session(session_id, message, history)
+        for payload in stream_thread(session.thread_id):
+            yield payload
+        session.turns += 1
         
-            while run.status in ['queued', 'in_progress', 'cancelling'] and total_wait < max_wait:
-                time.sleep(wait_time)
-                total_wait += wait_time
-                wait_time = min(wait_time * 1.2, 2)
-                
-                run = client.beta.threads.runs.retrieve(
-                    thread_id=temp_thread.id,
-                    run_id=run.id
-                )
-                
-                logger.info(f"Run status: {run.status}, waited: {total_wait:.1f}s")
-            
-            if run.status == 'completed':
-                collection_complete = False
-                Personal_Information = {}
-                logger.info(f"Run completed successfully for thread {temp_thread.id}")
-                
-                messages = client.beta.threads.messages.list(
-                    thread_id=temp_thread.id,
-                    order="desc",
-                    limit=1
-                )
-                
-                assistant_message = messages.data[0]
-                response_content = assistant_message.content[0].text.value
-                
-                # Signal that the data collection is finished. (English)
-                if "Information collection completed." in response_content:
-                        
-                    name_part = response_content.split("today,", 1)[1].split("?", 1)[0]
-                    remainder = response_content.split("? You are in ", 1)[1] 
-                    hmo_part, tier_part = remainder.split(", ranked as ", 1)
-
-                    user_full_name = name_part.strip()
-                    user_hmo = hmo_part.strip()
-                    user_tier = tier_part.strip()
-                    
-                    collection_complete =  True
-                    Personal_Information = {
-                        "user_full_name" :user_full_name ,
-                        "user_hmo":user_hmo, 
-                        "user_tier":user_tier
-                        }
-                    
-                 # Signal that the data collection is finished. (Hebrew)
-                if "איסוף המידע הושלם." in response_content or "אסיפת המידע הושלמה" in response_content:
-
-                    user_full_name = response_content.split("היום, ", 1)[1].split("?", 1)[0].strip()
-                    remainder = response_content.split("? אתה בקופת חולים ", 1)[1]
-                    user_hmo, tier_part = remainder.split(", בדרגת חברות ", 1)
-                    
-                    user_hmo = user_hmo.strip()
-                    user_tier = tier_part.rstrip(" .").strip()
-                    
-                    collection_complete =  True
-                    Personal_Information = {
-                        "user_full_name" :user_full_name ,
-                        "user_hmo":user_hmo, 
-                        "user_tier":user_tier
-                        } 
-                    
-                                       
-                return {
-                    "response" : response_content ,
-                    "collection_complete" : collection_complete ,
-                    "Personal_Information" : Personal_Information
-                    }
+        # The thread is no longer needed once the profile is collected
+        if payload.get("collection_complete"):
+            session_store.remove(session_id, session)
             
-            
-            elif run.status == 'requires_action':
-                
-                required_action = run.required_action
-                
-                if required_action.type == 'submit_tool_outputs':
-                    tool_outputs = []
-                    
-                    for tool_call in required_action.submit_tool_outputs.tool_calls:
-                        try:
-                            fn_name = tool_call.function.name
-                            fn_args_str = tool_call.function.arguments
-                            tool_call_id = tool_call.id
-                            
-                            try:
-                                fn_args = json.loads(fn_args_str) if fn_args_str else {}
-                            except json.JSONDecodeError as json_error:
-                                logger.error(f"JSON decode error for {fn_name}: {json_error}")
-                                fn_args = {}
-
-                            url = f"{FASTAPI_URL}/{endpoint_map[fn_name]}"
-                            logger.info(f"Calling URL: {url} with args: {fn_args}")
-                            
-                            resp = requests.post(url, json=fn_args, timeout=30)
-                            resp.raise_for_status()
-                            result = resp.json()
-                            
-                            if result is None:
-                                result = {"error": "API returned None"}
-                            
-                            # Add tool output
-                            tool_outputs.append({
-                                "tool_call_id": tool_call_id,
-                                "output": json.dumps(result)
-                            })
-                            
-                        except requests.exceptions.RequestException as req_error:
-                            logger.error(req_error)
-                            error_msg = f"Request error for {fn_name}: {req_error}"
-                            tool_outputs.append({
-                                "tool_call_id": tool_call_id,
-                                "output": json.dumps({"error": error_msg})
-                            })
-                            
-                        except Exception as e:
-                            logger.error(f"Error calling function {fn_name}: {e}")
-                            error_msg = f"Error calling function {fn_name}: {e}"
-                            tool_outputs.append({
-                                "tool_call_id": tool_call_id,
-                                "output": json.dumps({"error": error_msg})
-                            })
-                
-                    
-                    try:
-                        run = client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=temp_thread.id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
-
-                        continue
-                    
-                    except Exception as submit_error:
-                        logger.error(f"Error submitting tool outputs: {submit_error}")
-                        raise submit_error
-                                               
-            else:
-                logger.error(f"Assistant run failed with status: {run.status}")
-                raise Exception(f"Assistant run failed with status: {run.status}")
-        
     except Exception as e:
-        logger.error(f"Error in run_assistant_stateless: {str(e)}")
-        raise e
+        logger.error(f"Error in stream_assistant_session: {str(e)}")
+        session_store.remove(session_id, session)
+        yield {"error": str(e)}
     
     finally:
-        #Cleanup temporary thread
-        try:
-            client.beta.threads.delete(temp_thread.id)
-            logger.info(f"Deleted temporary thread: {temp_thread.id}")
-        except Exception as cleanup_error:
-            logger.warning(f"Could not delete thread {temp_thread.id}: {cleanup_error}")
+        if session is not None:
+            session.lock.release()
             
             
-async def create_embeddings():
-    
-    """
-    Create embeddings to the HTML parsed json file.
-    """
-    
-    global embeddings, documents
-    
-    documents = []
-    
-    # 1. BENEFITS data
-    for hmo, services in benefits_data["benefits"].items():
-        for service_name, service_data in services.items():
-            if "treatments" in service_data:
-                for treatment, treatment_data in service_data["treatments"].items():
-                    
-                    # Add tier information
-                    for tier in ["זהב", "כסף", "ארד"]:
-                        if tier in treatment_data:
-                            tier_info = treatment_data[tier]
-                            text = f""" Treatment {treatment}, which is part of {service_data.get('title', service_name)} in {hmo} 
-                            have the next information: {tier}: {tier_info.get('discount', '')} הנחה, עד {tier_info.get('annual_limit', '')} טיפולים"""    
-                    
-                    # Add contact info
-                    if "contacts" in treatment_data and hmo in treatment_data["contacts"]:
-                        contact = treatment_data["contacts"][hmo]
-                        text += f""" Content information is {contact.get('raw_contact_line', '')} for {contact.get('service_category', '')} """
-                    
-                    
-                    doc_holder={
-                        "type": "benefit",
-                        "hmo": hmo,
-                        "service": service_name,
-                        "treatment": treatment,
-                        "data": treatment_data,
-                        "text": text.strip()
-                    }
-                    documents.append(doc_holder)
-                                        
-    
-    # 2. DESCRIPTIONS data
-    for treatment, description in benefits_data.get("descriptions", {}).items():
-        text = f""" {treatment} is {description} """
-        documents.append({
-            "type": "description",
-            "treatment": treatment,
-            "description": description,
-            "text": text.strip()
-        })
-        
+def collect_locally(request: ChatRequest) -> Optional[Dict]:
+    """
+    Answer a collection turn without the assistant when the user's reply is unambiguous.
+
+    In session mode the locally answered turn is queued on the session, so the
+    assistant thread still sees it before its next run.
+
+    Returns:
+        Optional[Dict]: See `run_assistant_stateless`, or None if the assistant must answer.
+    """
+    if not LOCAL_COLLECTION:
+        return None
     
-    # 3. METADATA data
-    for metadata in benefits_data.get("metadata", []):
-        text = f""" {metadata.get('title', '')} is {metadata.get('description', '')}"""
-        documents.append({
-            "type": "metadata",
-            "filename": metadata.get('filename', ''),
-            "title": metadata.get('title', ''),
-            "data": metadata,
-            "text": text.strip()
-        })
-        
-         
-    # Create embeddings
-    embeddings = []
-    
-    for doc in documents:
-        response = client.embeddings.create(
-            input=doc["text"],
-            model=os.getenv("EMBEDDING_MODEL")
+    result = collector.reply(request.message, request.history or [])
+    if result is None:
+        return None
+    
+    if ASSISTANT_SESSION_MODE and request.session_id:
+        if result["collection_complete"]:
+            session_store.remove(request.session_id)
+        else:
+            session = session_store.get(request.session_id)
+            if session is not None:
+                session.local_turns.extend([
+                    {"role": "user", "content": request.message},
+                    {"role": "assistant", "content": result["response"]}
+                ])
+    
+    return result
+
+
+def record_completion(request: ChatRequest, result: Dict, path: str):
+    """Count the user turns it took to complete the collection dialog"""
+    if result.get("collection_complete"):
+        completion_stats.record(count_user_turns(request.message, request.history or []), path)
+
+
+def warm_up(knowledge_base: KnowledgeBase):
+    """
+    Touch the index and run one search per partition before serving.
+
+    Startup finishes before uvicorn accepts connections, so the first real
+    request does not pay for page faults on the memory-mapped index. The pages
+    land in the OS page cache, which all workers share. A reloaded generation
+    is warmed up the same way before it is swapped in.
+    """
+    if not len(knowledge_base.documents):
+        return
+    
+    float(np.asarray(knowledge_base.embeddings).sum())
+    query = np.ones(knowledge_base.embeddings.shape[1], dtype=np.float32)
+    for hmo, _, tier in knowledge_base.vector_index.partitions:
+        knowledge_base.vector_index.search(query, hmo_name=hmo, k=TOP_K, tier=tier)
+        knowledge_base.lexical_index.search(knowledge_base.documents[0]["text"], hmo_name=hmo, k=TOP_K, tier=tier)
+
+
+def sse_event(payload: Dict) -> str:
+    """Encode one server-sent event"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def close_events(events, step: Optional[Future]):
+    """Close a blocking event generator once its current step (if any) is over"""
+    if step is not None:
+        wait([step])
+    events.close()
+
+
+async def embed_query(request: QueryRequest):
+    """
+    Embed the user question (common questions are served from the cache).
+
+    Only the question is embedded: the HMO and tier are applied as retrieval
+    filters, so the same question shares one cached embedding across users.
+    """
+    query_text = request.prompt
+    query_embedding = query_cache.get(query_text, EMBEDDING_MODEL)
+    
+    if query_embedding is None:
+        query_response = await async_client.embeddings.create(
+                input=query_text,
+                model=EMBEDDING_MODEL,
+                timeout=EMBEDDING_TIMEOUT
         )
-        embeddings.append(response.data[0].embedding)
+        query_embedding = query_response.data[0].embedding
+        query_cache.put(query_text, EMBEDDING_MODEL, query_embedding)
+        
+    return query_embedding
+
+
+async def embed_query_or_fallback(request: QueryRequest):
+    """
+    Embed the user question within QUERY_EMBEDDING_BUDGET seconds.
+
+    Returns:
+        The query embedding, or None when retrieval should be lexical only
+        (lexical mode, or the embedding service failed or was too slow).
+    """
+    if RETRIEVAL_MODE == "lexical" or not embedding_circuit.available():
+        return None
+    
+    try:
+        return await asyncio.wait_for(embed_query(request), QUERY_EMBEDDING_BUDGET)
+    except Exception as e:
+        embedding_circuit.failed(e)
+        return None
+
+
+def retrieve(request: QueryRequest, query_embedding, knowledge_base: KnowledgeBase) -> np.ndarray:
+    """
+    Indices of the documents to answer from, best first.
+
+    Vector and BM25 results are fused by reciprocal rank in hybrid mode; the
+    BM25 results are used alone when there is no query embedding. Both only
+    score the shared docs and the benefit chunks of the user's HMO and tier,
+    restricted to `request.doc_types` when given.
+    """
+    filters = {"hmo_name": request.hmo_name, "tier": request.tier, "doc_types": request.doc_types}
+    if query_embedding is None:
+        retrieval_counts["lexical"] += 1
+        top_indices, _ = knowledge_base.lexical_index.search(request.prompt, k=TOP_K, **filters)
+        return top_indices
+    
+    vector_indices, _ = knowledge_base.vector_index.search(query_embedding, k=TOP_K, **filters)
+    if RETRIEVAL_MODE != "hybrid":
+        retrieval_counts["vector"] += 1
+        return vector_indices
+    
+    retrieval_counts["hybrid"] += 1
+    lexical_indices, _ = knowledge_base.lexical_index.search(request.prompt, k=TOP_K, **filters)
+    top_indices, _ = reciprocal_rank_fusion([vector_indices, lexical_indices], k=TOP_K)
+    return top_indices
+
+
+def check_tier(request: QueryRequest):
+    """An unknown tier is answered with 422 instead of being searched with no tier filter"""
+    if request.tier.strip() and normalize_tier(request.tier) is None:
+        raise HTTPException(status_code=422,
+                            detail=f"Unknown tier {request.tier!r}, expected Gold, Silver, Bronze, זהב, כסף or ארד")
+
+
+def grounded_benefits(request: QueryRequest, knowledge_base: KnowledgeBase) -> List[Dict]:
+    """The user's benefit rows for a treatment named in the question, unless the request excludes benefit docs"""
+    if not BENEFITS_GROUNDING or (request.doc_types and "benefit" not in request.doc_types):
+        return []
+    return knowledge_base.benefits.ground(request.prompt, request.hmo_name, request.tier)
+
+
+def answer_messages(request: QueryRequest, context: str) -> List[Dict]:
+    """Chat messages answering the request from the given context only"""
+    
+    system_prompt = """You are an expert Israeli health-fund assistant. Whenever the user provides a health fund (קופת חולים) and an insurance tier (רמת ביטוח), you must respond with:
+    Coverage details (which services are included)
+    Any co-payments or limits (annual/session)
+    Contact info or next steps
+    Answer concisely in Hebrew/english according to the user request."""
+    
+
+    context_message = f"""
+the only information you have:
+{context}
+"""
+
+    user_prompt = f"""
+use information
+- health fund (קופת חולים): {request.hmo_name}
+- insurance tier (רמת ביטוח): {request.tier}
+- converstion history: {request.history}
+
+user ask to know: {request.prompt}
+"""
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "assistant", "content": context_message},
+        {"role": "user", "content": user_prompt}
+    ]
+    
+    return messages
+
+
+def build_grounded_messages(request: QueryRequest, rows: List[Dict], knowledge_base: KnowledgeBase):
+    """
+    Build the chat messages from benefits store rows, without vector search.
+
+    Args:
+        rows (List[Dict]): `BenefitsStore.ground` rows for the question.
+        knowledge_base (KnowledgeBase): The generation the rows come from.
+
+    Returns:
+        Tuple: (chat messages, number of sources used)
+    """
+    descriptions = knowledge_base.benefits_data.get("descriptions", {})
+    
+    context = ""
+    for treatment in dict.fromkeys(row["treatment"] for row in rows):
+        if treatment in descriptions:
+            context += f"{treatment} is {descriptions[treatment]}\n\n"
+    
+    for row in rows:
+        context += f"Treatment {row['treatment']}, which is part of {row['service']} in {row['hmo']} " \
+                   f"have the next information: {row['tier']}: {row['full_text']}"
+        if row["contact"]:
+            context += f" Content information is {row['contact'].get('raw_contact_line', '')} " \
+                       f"for {row['contact'].get('service_category', '')}"
+        context += "\n\n"
+    
+    return answer_messages(request, context), len(rows)
+
+
+def build_answer_messages(request: QueryRequest, query_embedding, knowledge_base: KnowledgeBase):
+    """
+    Retrieve the relevant documents and build the chat messages for the answer.
+
+    Args:
+        query_embedding: The question's embedding, or None for lexical-only retrieval.
+        knowledge_base (KnowledgeBase): The generation taken at the start of
+            the request, so a reload in the meantime does not mix two indexes.
+
+    Returns:
+        Tuple: (chat messages, number of sources used)
+    """
+    documents = knowledge_base.documents
+    top_indices = retrieve(request, query_embedding, knowledge_base)
+    
+    context = ""
+    user_specific_docs = []
+    visited_doc = []
+    
+    
+    for idx in top_indices:
+        doc = documents[idx]
+        if doc["type"] == "benefit":
+            visited_doc.append(idx)
+            user_specific_docs.append(doc)
+            context += f"{doc['text']}\n\n"
+        else:
+            visited_doc.append(idx)
+            context += f"{doc['text']}\n\n"  
+    
+    
+    messages = answer_messages(request, context)
+    
+    return messages, len(user_specific_docs) if user_specific_docs else len(top_indices)
+
+
+async def create_embeddings(benefits_data: Dict, previous: Optional[KnowledgeBase] = None):
+    
+    """
+    Create embeddings to the HTML parsed json file and write the index.
+    
+    Args:
+        benefits_data (Dict): The parsed data.
+        previous (KnowledgeBase): The live generation, if any. Its vectors seed
+            the cache, so a rebuild only embeds new or changed documents.
+    """
+    
+    documents = build_documents(benefits_data)
+    
+    # Create embeddings (batched, unchanged texts are served from the cache)
+    cache = EmbeddingCache()
+    if previous is not None and previous.model == (EMBEDDING_MODEL or ""):
+        for doc, vector in zip(previous.documents, previous.embeddings):
+            if cache.get(doc["text"], EMBEDDING_MODEL) is None:
+                cache.put(doc["text"], EMBEDDING_MODEL, vector.tolist())
+    
+    texts = [doc["text"] for doc in documents]
+    embeddings = await embed_texts(client, texts, EMBEDDING_MODEL, cache=cache)
+    
+    cache.prune(texts, EMBEDDING_MODEL)
+    await asyncio.to_thread(cache.save)
     
     # Save embeddings
-    with open("embeddings.pkl", "wb") as f:
-        pickle.dump({"embeddings": embeddings, "documents": documents}, f)
+    await asyncio.to_thread(save_index, EMBEDDING_INDEX_DIR, embeddings, documents, model=EMBEDDING_MODEL,
+                            documents_version=DOCUMENTS_VERSION)
     
     logger.info("Finish creating embeding")
+
+
+def read_benefits_data(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def load_knowledge_base(rebuild: bool = False):
+    """
+    Build a knowledge base generation from disk, warm it up and swap it in.
+
+    Requests keep using the generation they started with; new requests see
+    the new one as soon as it is installed. All disk and CPU work runs in
+    worker threads, so serving is not blocked while a reload is in progress.
+
+    Args:
+        rebuild (bool): Re-embed the parsed data and rewrite the index first
+            (also done when there is no index yet, or when it was built by an
+            older `DOCUMENTS_VERSION`). Only one process rebuilds
+            at a time; the others load the index it writes.
+    """
+    source_fingerprint = file_fingerprint(kb_manager.source_path)
+    benefits_data = await asyncio.to_thread(read_benefits_data, kb_manager.source_path)
+    
+    if not rebuild and index_exists(EMBEDDING_INDEX_DIR) \
+            and load_manifest(EMBEDDING_INDEX_DIR).get("documents_version", 1) != DOCUMENTS_VERSION:
+        logger.info("The embedding index was built from an older document layout")
+        rebuild = True
+    
+    if rebuild or not index_exists(EMBEDDING_INDEX_DIR):
+        with rebuild_lock() as acquired:
+            if acquired:
+                logger.info("Rebuilding the embedding index")
+                await create_embeddings(benefits_data, kb_manager.current)
+            elif kb_manager.current is not None:
+                logger.info("Another process is rebuilding the embedding index, it is loaded once written")
+                return
+            else:
+                raise RuntimeError("Another process is building the embedding index, start again once it is written")
+    
+    index_fingerprint = file_fingerprint(kb_manager.manifest_path)
+    embeddings, documents, manifest = await asyncio.to_thread(load_index, EMBEDDING_INDEX_DIR)
+    knowledge_base = await asyncio.to_thread(kb_manager.build, benefits_data, embeddings, documents,
+                                             (source_fingerprint, index_fingerprint), manifest.get("model", ""))
+    await asyncio.to_thread(warm_up, knowledge_base)
+    
+    kb_manager.install(knowledge_base)
+    answer_cache.clear()
+
+
+def reload_on_change(change: str):
+    """Watcher callback: re-embed after a data change, reload only after another process rewrote the index"""
+    logger.info(f"Knowledge base {change} changed on disk, reloading")
+    kb_manager.start_reload(lambda: load_knowledge_base(rebuild=change == "source"))
   
    
   
@@ -461,38 +1085,41 @@ async def create_embeddings():
     
 # ─── FastAPI service ──────────────────────────────────────────────────
 
-@app.post("/validate_id")
+router = APIRouter()
+
+
+@router.post("/validate_id")
 def validate_id(payload: IDPayload):
     '''Validate id'''
     return {"valid": len(str(payload.id)) == 9}
 
 
-@app.post("/validate_hmo_card")
+@router.post("/validate_hmo_card")
 def validate_hmo_card(payload: HMOcnPayload):
     '''Validate hmo card number'''
     return {"valid": len(str(payload.HMOcn)) == 9}
 
 
-@app.post("/validate_user_name")
+@router.post("/validate_user_name")
 def validate_user_name(payload: UserNamePayload):
     '''Validate user name'''
     valid = bool(payload.F_name.strip()) and bool(payload.L_name.strip())
     return {"valid": valid}
 
 
-@app.post("/validate_age")
+@router.post("/validate_age")
 def validate_age(payload: AgePayload):
     '''Validate age'''
     return {"valid": 0 <= payload.age <= 120}
 
 
-@app.post("/validate_gender")
+@router.post("/validate_gender")
 def validate_gender(payload: GenderPayload):
     '''Validate gender'''
     return {"valid": payload.gender.lower() in ("f", "m")}
 
 
-@app.post("/validate_hmo_name")
+@router.post("/validate_hmo_name")
 def validate_hmo_name(payload: HMONamePayload):
     '''Validate hmo name'''
     return {
@@ -502,7 +1129,7 @@ def validate_hmo_name(payload: HMONamePayload):
     }
 
 
-@app.post("/validate_mem_tier")
+@router.post("/validate_mem_tier")
 def validate_mem_tier(payload: MemTierPayload):
     '''Validate tier'''
     return {
@@ -510,33 +1137,141 @@ def validate_mem_tier(payload: MemTierPayload):
     }
 
 
-@app.get("/health", response_model=HealthResponse)
+@router.post("/validate_user_info")
+def validate_user_info(payload: UserInfoPayload):
+    '''Validate the full profile submitted at the end of the collection'''
+    checks = {
+        "name": validate_user_name(UserNamePayload(F_name=payload.F_name, L_name=payload.L_name)),
+        "id": validate_id(IDPayload(id=payload.id)),
+        "gender": validate_gender(GenderPayload(gender=payload.gender)),
+        "age": validate_age(AgePayload(age=payload.age)),
+        "hmo_name": validate_hmo_name(HMONamePayload(hmo_name=payload.hmo_name)),
+        "hmo_card": validate_hmo_card(HMOcnPayload(HMOcn=payload.HMOcn)),
+        "tier": validate_mem_tier(MemTierPayload(MemTier=payload.MemTier)),
+    }
+    invalid_fields = [field for field, result in checks.items() if not result["valid"]]
+    
+    if invalid_fields:
+        return {"valid": False, "invalid_fields": invalid_fields}
+    
+    return {
+        "valid": True,
+        "profile": {
+            "user_full_name": f"{payload.F_name.strip()} {payload.L_name.strip()}",
+            "user_hmo": payload.hmo_name,
+            "user_tier": payload.MemTier
+        }
+    }
+
+
+# Assistant tools are dispatched in-process to the same validators the endpoints expose
+TOOL_REGISTRY = {
+    "Validate_ID":         (validate_id,        IDPayload),
+    "Validate_HMOCardNum": (validate_hmo_card,  HMOcnPayload),
+    "Validate_UserName":   (validate_user_name, UserNamePayload),
+    "Validate_Age":        (validate_age,       AgePayload),
+    "Validate_Gender":     (validate_gender,    GenderPayload),
+    "Validate_HMOname":    (validate_hmo_name,  HMONamePayload),
+    "Validate_MemTier":    (validate_mem_tier,  MemTierPayload),
+    "Submit_UserInfo":     (validate_user_info, UserInfoPayload),
+}
+
+# Well-formed answers to the collection questions are recognized without an assistant run
+collector = LocalCollector(TOOL_REGISTRY)
+completion_stats = CompletionStats()
+
+
+@router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(status="healthy", message="Service is running")
 
 
+@router.get("/metrics")
+async def metrics():
+    """Cache, session, admission, collection and knowledge base counters of this worker, with its startup time and RSS"""
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "assistant_sessions": session_store.stats(),
+        "chat_admission": admission.stats(),
+        "local_collection": collector.stats(),
+        "collection_completion": completion_stats.stats(),
+        "knowledge_base": kb_manager.stats(),
+        "benefits_store": kb_manager.current.benefits.stats() if kb_manager.current else None,
+        "retrieval": {"mode": RETRIEVAL_MODE, **retrieval_counts, "embedding_circuit": embedding_circuit.stats()},
+        "worker": {
+            "pid": os.getpid(),
+            "assistant_id": ASSISTANT_ID,
+            "startup_seconds": startup_seconds,
+            "rss_mb": rss_mb()
+        }
+    }
+
+
 
-@app.post("/chatCollectUserData", response_model=ChatResponse)
-async def chat_with_assistant(request: ChatRequest):
+def client_key(http_request: Request, request: ChatRequest) -> str:
+    """Identify the caller for per-client admission limits"""
+    return (http_request.headers.get("X-Client-Id")
+            or request.session_id
+            or (http_request.client.host if http_request.client else "unknown"))
+
+
+async def admit(client_id: str) -> int:
+    """Take an admission slot, or answer 503 with a Retry-After hint"""
+    try:
+        return await admission.acquire(client_id)
+    except AdmissionRejected as rejected:
+        logger.warning(f"Rejected chat request from {client_id}: {rejected.reason}")
+        raise HTTPException(
+            status_code=503,
+            detail=rejected.reason,
+            headers={"Retry-After": str(rejected.retry_after)}
+        )
+
+
+@router.post("/chatCollectUserData", response_model=ChatResponse)
+async def chat_with_assistant(request: ChatRequest, http_request: Request):
     """
-    Stateless chat with client-side history and user data
+    Chat with client-side history and user data
     - Uses history from client side
+    - With a session_id, the conversation keeps one assistant thread and each turn only appends the new message
+    - Overload is answered with 503 and Retry-After instead of queueing without bound
+    - Bare, valid answers to the collection questions are handled locally without an assistant run
     """
     logger.info(f"Processing stateless chat request")
     logger.info(f"Message: {request.message[:50]}...")
     logger.info(f"History length: {len(request.history) if request.history else 0}")
     
+    local_result = await asyncio.to_thread(collect_locally, request)
+    if local_result is not None:
+        logger.info(f"Collection turn answered locally")
+        record_completion(request, local_result, "local")
+        return ChatResponse(**local_result)
+    
+    client_id = client_key(http_request, request)
+    ticket = await admit(client_id)
+    
     try:
         loop = asyncio.get_event_loop()
-        response_content = await loop.run_in_executor(
-            executor,
-            run_assistant_stateless,
-            request.message,
-            request.history or []
-        )
+        if ASSISTANT_SESSION_MODE and request.session_id:
+            response_content = await loop.run_in_executor(
+                executor,
+                run_assistant_session,
+                request.session_id,
+                request.message,
+                request.history or []
+            )
+        else:
+            response_content = await loop.run_in_executor(
+                executor,
+                run_assistant_stateless,
+                request.message,
+                request.history or []
+            )
         
         logger.info(f"Successfully processed stateless chat request")
+        record_completion(request, response_content, "assistant")
                 
         return ChatResponse(
             response=response_content["response"],
@@ -547,106 +1282,280 @@ async def chat_with_assistant(request: ChatRequest):
     except Exception as e:
         logger.error(f"Error processing stateless chat request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    finally:
+        admission.release(client_id, ticket)
   
 
     
-@app.on_event("startup")
-async def load_data():
-    """Load JSON and create embeddings once"""
-    global embeddings, documents, benefits_data
+
+@router.post("/chatCollectUserData/stream")
+async def chat_with_assistant_stream(request: ChatRequest, http_request: Request):
+    """
+    Same as /chatCollectUserData, but the assistant reply is streamed as server-sent events.
+
+    Events:
+        {"token": "..."}                                                  - next piece of the reply
+        {"done": true, "response", "collection_complete", "Personal_Information"}  - end of the reply
+        {"error": "..."}                                                  - the reply could not be generated
+    """
+    logger.info(f"Processing streaming chat request")
     
-    with open("parsed_hmo_data.json", "r", encoding="utf-8") as f:
-        all_data = json.load(f)
+    local_result = await asyncio.to_thread(collect_locally, request)
+    if local_result is not None:
+        logger.info(f"Collection turn answered locally")
+        record_completion(request, local_result, "local")
+        
+        async def local_stream():
+            yield sse_event({"token": local_result["response"]})
+            yield sse_event(dict(local_result, done=True))
+        
+        return StreamingResponse(local_stream(), media_type="text/event-stream")
     
-    benefits_data = all_data
+    client_id = client_key(http_request, request)
+    ticket = await admit(client_id)
     
-    # Try to load existing embeddings
-    if os.path.exists("embeddings.pkl"):
-        with open("embeddings.pkl", "rb") as f:
-            data = pickle.load(f)
-            embeddings = data["embeddings"]
-            documents = data["documents"]
-        logger.info("Loaded existing embeddings")
+    if ASSISTANT_SESSION_MODE and request.session_id:
+        events = stream_assistant_session(request.session_id, request.message, request.history or [])
     else:
-        logger.info("Embeddings not found. create new embeddings")
-        await create_embeddings()
+        events = stream_assistant_stateless(request.message, request.history or [])
+    step = None
+    
+    async def event_stream():
+        nonlocal step
+        loop = asyncio.get_running_loop()
+        try:
+            # Each step of the blocking run goes through the same CHAT_POOL_SIZE pool as /chatCollectUserData
+            while True:
+                step = executor.submit(next, events, None)
+                payload = await asyncio.wrap_future(step)
+                if payload is None:
+                    break
+                if payload.get("done"):
+                    record_completion(request, payload, "assistant")
+                yield sse_event(payload)
         
-
+        finally:
+            # On a disconnect the run is closed (its connection and session lock freed) on the
+            # pool before the slot is released, so admission never exceeds what the pool can run
+            try:
+                with anyio.CancelScope(shield=True):
+                    await loop.run_in_executor(executor, close_events, events, step)
+            finally:
+                admission.release(client_id, ticket)
     
-@app.post("/ask")
-async def ask_question(request: QueryRequest):
-    """Answer user question using embeddings + LLM"""
+    body = event_stream()
     
-    # Get query embedding
-    query_response = client.embeddings.create(
-            input=request.hmo_name+" "+request.tier+" "+request.prompt,
-            model=os.getenv("EMBEDDING_MODEL")
-    )
-    query_embedding = query_response.data[0].embedding
+    async def finish():
+        """Close a body left at a yield or never started, then release the slot (twice is a no-op)"""
+        await body.aclose()
+        admission.release(client_id, ticket)
     
+    try:
+        return StreamingResponse(body, media_type="text/event-stream", background=BackgroundTask(finish))
+    except BaseException:
+        admission.release(client_id, ticket)
+        raise
 
-    similarities = cosine_similarity([query_embedding], embeddings)[0]
-    
-    top_indices = np.argsort(similarities)[-10:][::-1]
     
-    context = ""
-    user_specific_docs = []
-    visited_doc = []
+async def load_data():
+    """Load JSON and the embeddings (created once if missing) as the first knowledge base generation"""
+    global startup_seconds
     
+    # Convert the legacy pickle once, then memory-map the index. Only the worker holding the
+    # rebuild lock converts, and it checks again inside the lock
+    if not index_exists(EMBEDDING_INDEX_DIR) and os.path.exists("embeddings.pkl"):
+        with rebuild_lock(EMBEDDING_INDEX_DIR) as acquired:
+            if acquired and not index_exists(EMBEDDING_INDEX_DIR):
+                logger.info("No embedding index, converting embeddings.pkl if its document layout is current")
+                convert_pickle("embeddings.pkl", EMBEDDING_INDEX_DIR, model=EMBEDDING_MODEL,
+                               min_documents_version=DOCUMENTS_VERSION)
     
-    for idx in top_indices:
-        doc = documents[idx]
-        if doc["type"] == "benefit":
-            if doc["hmo"] == request.hmo_name:
-                visited_doc.append(idx)
-                user_specific_docs.append(doc)
-                print(doc)
-                context += f"{doc['text']}\n\n"
-        else:
-            visited_doc.append(idx)
-            print(doc)
-            context += f"{doc['text']}\n\n"  
+    if not index_exists(EMBEDDING_INDEX_DIR):
+        logger.info("Embeddings not found. create new embeddings")
     
+    await load_knowledge_base()
     
-    system_prompt = """You are an expert Israeli health-fund assistant. Whenever the user provides a health fund (קופת חולים) and an insurance tier (רמת ביטוח), you must respond with:
-    Coverage details (which services are included)
-    Any co-payments or limits (annual/session)
-    Contact info or next steps
-    Answer concisely in Hebrew/english according to the user request."""
-    
+    startup_seconds = time.perf_counter() - startup_begin
+    logger.info(f"Worker {os.getpid()} ready in {startup_seconds:.2f}s, RSS {rss_mb() or 0:.0f} MB")
+        
 
-    context_message = f"""
-the only information you have:
-{context}
-"""
 
-    user_prompt = f"""
-use information
-- health fund (קופת חולים): {request.hmo_name}
-- insurance tier (רמת ביטוח): {request.tier}
-- converstion history: {request.history}
+async def close_clients():
+    """Close the pooled async HTTP connections"""
+    await async_client.close()
 
-user ask to know: {request.prompt}
-"""
+
+def require_admin(http_request: Request):
+    """Admin endpoints need the X-Admin-Token header when ADMIN_TOKEN is set, otherwise a local caller"""
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(http_request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif not http_request.client or http_request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Admin endpoints are local only when ADMIN_TOKEN is not set")
+
+
+@router.post("/admin/reload", status_code=202)
+async def reload_knowledge_base(http_request: Request, rebuild: bool = True):
+    """
+    Reload the knowledge base in the background, without dropping any request.
+
+    With rebuild (the default) parsed_hmo_data.json is re-read and only new or
+    changed documents are embedded; with rebuild=false the index is reloaded
+    as written on disk. The current generation keeps serving until the new
+    one is warmed up and swapped in. Progress is reported on GET /metrics.
+    """
+    require_admin(http_request)
+    started = kb_manager.start_reload(lambda: load_knowledge_base(rebuild=rebuild))
     
-    response = client.chat.completions.create(
+    return {"started": started, "knowledge_base": kb_manager.stats()}
+    
+    
+@router.post("/ask")
+async def ask_question(request: QueryRequest):
+    """Answer user question using embeddings + LLM"""
+    check_tier(request)
+    
+    knowledge_base = kb_manager.current
+    grounded_rows = grounded_benefits(request, knowledge_base)
+    
+    if grounded_rows:
+        # The question names a treatment: its rows are the context, no embedding or vector search
+        query_embedding, cacheable = None, False
+        generation_start = time.perf_counter()
+        messages, sources_used = build_grounded_messages(request, grounded_rows, knowledge_base)
+    else:
+        query_embedding = await embed_query_or_fallback(request)
+        
+        # Near-duplicate questions for the same HMO and tier reuse the previous answer. Not
+        # follow-ups, whose answer depends on the conversation, nor doc-type filtered ones,
+        # which are answered from a different context
+        cacheable = query_embedding is not None and not request.history and not request.doc_types
+        cached_answer = answer_cache.lookup(request.hmo_name, request.tier, query_embedding) \
+            if cacheable else None
+        if cached_answer is not None:
+            logger.info("Answer served from the semantic cache")
+            return cached_answer
+        
+        generation_start = time.perf_counter()
+        messages, sources_used = build_answer_messages(request, query_embedding, knowledge_base)
+    
+    response = await async_client.chat.completions.create(
         model=os.getenv("model_name"),
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "assistant", "content": context_message},
-            {"role": "user", "content": user_prompt}
-        ],
+        messages=messages,
         temperature=0,
-        max_tokens=500
+        max_tokens=500,
+        timeout=CHAT_TIMEOUT
     )
     
-    return {
+    answer = {
         "response": response.choices[0].message.content,
-        "sources_used": len(user_specific_docs) if user_specific_docs else len(top_indices)
+        "sources_used": sources_used
     }
+    # An answer from a generation that was replaced meanwhile is not cached
+    if cacheable and knowledge_base is kb_manager.current:
+        answer_cache.store(request.hmo_name, request.tier, query_embedding, answer,
+                           time.perf_counter() - generation_start)
+    
+    return answer
+
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest):
+    """
+    Same as /ask, but the answer is streamed as server-sent events while the model generates.
+
+    Events:
+        {"token": "..."}                       - next piece of the answer
+        {"done": true, "sources_used": n}      - end of the answer
+        {"error": "..."}                       - the answer could not be generated
+    """
+    check_tier(request)
+    
+    async def event_stream():
+        try:
+            knowledge_base = kb_manager.current
+            grounded_rows = grounded_benefits(request, knowledge_base)
+            
+            if grounded_rows:
+                query_embedding, cacheable = None, False
+                generation_start = time.perf_counter()
+                messages, sources_used = build_grounded_messages(request, grounded_rows, knowledge_base)
+            else:
+                query_embedding = await embed_query_or_fallback(request)
+                
+                cacheable = query_embedding is not None and not request.history and not request.doc_types
+                cached_answer = answer_cache.lookup(request.hmo_name, request.tier, query_embedding) \
+                    if cacheable else None
+                if cached_answer is not None:
+                    logger.info("Answer served from the semantic cache")
+                    yield sse_event({"token": cached_answer["response"]})
+                    yield sse_event({"done": True, "sources_used": cached_answer["sources_used"]})
+                    return
+                
+                generation_start = time.perf_counter()
+                messages, sources_used = build_answer_messages(request, query_embedding, knowledge_base)
+            
+            stream = await async_client.chat.completions.create(
+                model=os.getenv("model_name"),
+                messages=messages,
+                temperature=0,
+                max_tokens=500,
+                timeout=CHAT_TIMEOUT,
+                stream=True
+            )
+            
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield sse_event({"token": chunk.choices[0].delta.content})
+            
+            answer = {
+                "response": "".join(parts),
+                "sources_used": sources_used
+            }
+            if cacheable and knowledge_base is kb_manager.current:
+                answer_cache.store(request.hmo_name, request.tier, query_embedding, answer,
+                                   time.perf_counter() - generation_start)
+            
+            yield sse_event({"done": True, "sources_used": sources_used})
+            
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield sse_event({"error": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
   
       
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """Initialize the services and warm up before serving, close the clients on shutdown"""
+    init_services()
+    await load_data()
+    
+    # Optional polling of the parsed data and the index for hot reload
+    watcher = asyncio.create_task(kb_manager.watch(reload_on_change)) if KB_WATCH_INTERVAL > 0 else None
+    yield
+    
+    if watcher is not None:
+        watcher.cancel()
+    await close_clients()
+
+
+def create_app() -> FastAPI:
+    """Application factory, used by uvicorn (`FastAPI:app`) and by scripts"""
+    application = FastAPI(title="Stateless FastAPI Chatbot" , version="1.0.0", lifespan=lifespan)
+    application.include_router(router)
+    return application
+
+
+app = create_app()
+
+      
 if __name__ == "__main__":
+    import uvicorn
+    
     uvicorn.run(
         app, 
         host="127.0.0.1", 
@@ -654,20 +1563,3 @@ if __name__ == "__main__":
         workers=1, 
         loop="asyncio"
     )    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
- 
\ No newline at end of file
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
-from typing import  Dict
+import json
+from typing import  Dict, Iterator
 
 
 # ─── Initializtion ──────────────────────────────────────────────────
@@ -18,13 +19,14 @@ def check_api_health() -> bool:
     except:
         return False
 
-def call_fastapi_chatCollectData(message: str, history : list) -> Dict:
+def call_fastapi_chatCollectData(message: str, history : list, session_id: str = None) -> Dict:
     """
     Send a chat message and its conversation history to the FastAPI endpoint for data collection.
 
     Args:
         message (str): The user’s input.
         history (list): Previous conversation messages.
+        session_id (str): Optional conversation id, lets the server keep one assistant thread per conversation.
 
     Returns:
         Dict: The parsed JSON response returned by the FastAPI chat endpoint.
@@ -33,6 +35,7 @@ def call_fastapi_chatCollectData(message: str, history : list) -> Dict:
     payload = {
         "message": message,
         "history" : history,
+        "session_id": session_id,
     }
         
     try:
@@ -86,3 +89,107 @@ def QAaking(message: str,hmo_name: str,tier: str,history : list)-> Dict:
     except requests.exceptions.RequestException as e:
         st.error(f"Error calling API: {str(e)}")
         return None
+
+
+def read_sse_events(response: requests.Response) -> Iterator[Dict]:
+    """
+    Parse server-sent events from a streaming response as they arrive.
+
+    Args:
+        response (requests.Response): A response opened with `stream=True`.
+
+    Yields:
+        Dict: The JSON payload of each event.
+    """
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+
+def stream_fastapi_chatCollectData(message: str, history : list, result: Dict, session_id: str = None) -> Iterator[str]:
+    """
+    Stream the data-collection reply token by token.
+
+    Args:
+        message (str): The user’s input.
+        history (list): Previous conversation messages.
+        result (Dict): Filled with the final response fields
+            ("response", "collection_complete", "Personal_Information") once the stream ends,
+            or with "error" if the call failed.
+        session_id (str): Optional conversation id, lets the server keep one assistant thread per conversation.
+
+    Yields:
+        str: Pieces of the assistant reply, as soon as the model produces them.
+    """
+    payload = {
+        "message": message,
+        "history" : history,
+        "session_id": session_id,
+    }
+    
+    try:
+        with requests.post(
+            f"{FASTAPI_URL}/chatCollectUserData/stream",
+            json=payload,
+            stream=True,
+            timeout=(5, 300)
+        ) as response:
+            
+            response.raise_for_status()
+            
+            for event in read_sse_events(response):
+                if "token" in event:
+                    yield event["token"]
+                elif "error" in event:
+                    result["error"] = event["error"]
+                elif event.get("done"):
+                    result.update(event)
+    
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error calling API: {str(e)}")
+        result["error"] = str(e)
+
+
+def stream_QAaking(message: str,hmo_name: str,tier: str,history : list, result: Dict) -> Iterator[str]:
+    """
+    Stream the answer of the QA endpoint token by token.
+
+    Args:
+        message (str): The user’s question.
+        hmo_name (str): Name of the HMO.
+        tier (str): The service tier of the user.
+        history (list): Previous conversation messages.
+        result (Dict): Filled with "sources_used" once the stream ends, or with "error" if the call failed.
+
+    Yields:
+        str: Pieces of the answer, as soon as the model produces them.
+    """
+    data = {
+    "prompt": message,
+    "hmo_name": hmo_name, 
+    "tier": tier,
+    "history":history
+    }
+
+    try:
+        with requests.post(
+            f"{FASTAPI_URL}/ask/stream",
+            json=data,
+            stream=True,
+            timeout=(5, 60)
+        ) as response:
+            
+            response.raise_for_status()
+            
+            for event in read_sse_events(response):
+                if "token" in event:
+                    yield event["token"]
+                elif "error" in event:
+                    result["error"] = event["error"]
+                elif event.get("done"):
+                    result.update(event)
+    
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error calling API: {str(e)}")
+        result["error"] = str(e)
@@ -0,0 +1,216 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from Retrieval import PartitionedIndex
+from BenefitsStore import BenefitsStore
+from LexicalIndex import LexicalIndex
+from EmbeddingIndex import EMBEDDING_INDEX_DIR, MANIFEST_FILE
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+KB_SOURCE_PATH = os.getenv("KB_SOURCE_PATH", "parsed_hmo_data.json")
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "0"))
+KB_RETIRE_TIMEOUT = float(os.getenv("KB_RETIRE_TIMEOUT", "60"))
+KB_LOCK_STALE_SECONDS = float(os.getenv("KB_LOCK_STALE_SECONDS", "600"))
+
+
+def file_fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+@contextmanager
+def rebuild_lock(index_dir: str = EMBEDDING_INDEX_DIR):
+    """
+    Cross-process lock around an index rebuild.
+
+    Yields True if this process holds the lock, False if another process is
+    rebuilding. A lock file older than KB_LOCK_STALE_SECONDS is treated as left
+    over by a crashed process and taken over.
+    """
+    lock_path = f"{index_dir}.lock"
+    try:
+        if time.time() - os.path.getmtime(lock_path) > KB_LOCK_STALE_SECONDS:
+            os.remove(lock_path)
+    except OSError:
+        pass
+
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        yield False
+        return
+
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield True
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+# ─── Knowledge base generations ──────────────────────────────────────────────────
+
+class KnowledgeBase:
+    """
+    One immutable generation of the knowledge base.
+
+    Holds the parsed data, its structured benefits store, the documents and
+    their vector and lexical indexes, together with the fingerprints of the files it was built from. It is never modified after
+    construction: a reload builds a new generation and swaps it in, so a reader
+    that took a reference keeps a consistent view until it is done.
+    """
+
+    def __init__(self, generation: int, benefits_data: Dict, embeddings, documents: List[Dict],
+                 source_fingerprint: Optional[tuple], index_fingerprint: Optional[tuple], model: str = "",
+                 previous: Optional["KnowledgeBase"] = None):
+        self.generation = generation
+        self.benefits_data = benefits_data
+        self.benefits = BenefitsStore(benefits_data)
+        self.embeddings = embeddings
+        self.documents = documents
+        # An approximate index reuses the clusters of the previous generation built with the same model
+        previous_index = previous.vector_index if previous is not None and previous.model == model else None
+        self.vector_index = PartitionedIndex(embeddings, documents, normalized=True, previous=previous_index)
+        self.lexical_index = LexicalIndex(documents)
+        self.source_fingerprint = source_fingerprint
+        self.index_fingerprint = index_fingerprint
+        self.model = model
+        self.loaded_at = time.time()
+
+
+class KnowledgeBaseManager:
+    """
+    Holds the current knowledge base generation and swaps in rebuilt ones.
+
+    The swap is a single reference assignment, so readers never block. At
+    most one reload runs at a time, and a reload does not start building until
+    the generation it replaced last time has been released by in-flight
+    requests, so at most two generations are alive at any moment.
+    """
+
+    def __init__(self, source_path: str = KB_SOURCE_PATH, index_dir: str = EMBEDDING_INDEX_DIR):
+        self.source_path = source_path
+        self.manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+
+        self.current: Optional[KnowledgeBase] = None
+        self.generation = 0
+        self.retired: Optional[weakref.ref] = None
+        self.reloading: Optional[asyncio.Task] = None
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_reload_seconds: Optional[float] = None
+
+    def fingerprints(self) -> Tuple[Optional[tuple], Optional[tuple]]:
+        """Current (source, index) file fingerprints"""
+        return file_fingerprint(self.source_path), file_fingerprint(self.manifest_path)
+
+    def build(self, benefits_data: Dict, embeddings, documents: List[Dict],
+              fingerprints: Tuple[Optional[tuple], Optional[tuple]], model: str = "") -> KnowledgeBase:
+        """
+        Build the next generation without installing it.
+
+        Args:
+            fingerprints (Tuple): (source, index) fingerprints, taken before
+                the files were read, so a change during the load is not missed.
+        """
+        return KnowledgeBase(self.generation + 1, benefits_data, embeddings, documents, *fingerprints, model=model,
+                             previous=self.current)
+
+    def install(self, knowledge_base: KnowledgeBase):
+        """Make a generation current; the previous one lives on only while requests still use it"""
+        previous, self.current = self.current, knowledge_base
+        self.generation = knowledge_base.generation
+        if previous is not None:
+            self.retired = weakref.ref(previous)
+        logger.info(f"Knowledge base generation {knowledge_base.generation} is live "
+                    f"({len(knowledge_base.documents)} documents)")
+
+    def changed(self) -> Optional[str]:
+        """
+        What changed on disk since the current generation was loaded.
+
+        Returns:
+            "index" if the embedding index was rewritten (e.g. by another
+            worker), "source" if only the parsed data changed, else None.
+        """
+        if self.current is None:
+            return None
+        source, index = self.fingerprints()
+        if index != self.current.index_fingerprint:
+            return "index"
+        if source != self.current.source_fingerprint:
+            return "source"
+        return None
+
+    async def wait_for_retired(self, timeout: float = KB_RETIRE_TIMEOUT):
+        """Wait until the previously replaced generation has been garbage collected"""
+        deadline = time.monotonic() + timeout
+        while self.retired is not None and self.retired() is not None:
+            if time.monotonic() > deadline:
+                raise TimeoutError("The previous knowledge base generation is still in use")
+            await asyncio.sleep(0.05)
+        self.retired = None
+
+    def start_reload(self, reload: Callable[[], Awaitable[None]]) -> bool:
+        """
+        Run `reload` in the background unless a reload is already running.
+
+        Returns:
+            bool: True if a new reload was started.
+        """
+        if self.reloading is not None and not self.reloading.done():
+            return False
+        self.reloading = asyncio.get_running_loop().create_task(self._reload(reload))
+        return True
+
+    async def _reload(self, reload: Callable[[], Awaitable[None]]):
+        start = time.perf_counter()
+        try:
+            await self.wait_for_retired()
+            await reload()
+            self.reloads += 1
+            self.last_error = None
+            self.last_reload_seconds = time.perf_counter() - start
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Knowledge base reload failed: {e}")
+
+    async def watch(self, on_change: Callable[[str], None], interval: float = KB_WATCH_INTERVAL):
+        """Poll the source and index files and call `on_change` with what changed"""
+        while True:
+            await asyncio.sleep(interval)
+            change = self.changed()
+            if change is not None:
+                on_change(change)
+
+    def stats(self) -> Dict:
+        return {
+            "generation": self.generation,
+            "documents": len(self.current.documents) if self.current else 0,
+            "loaded_at": self.current.loaded_at if self.current else None,
+            "vector_index": self.current.vector_index.stats() if self.current else {},
+            "reloading": self.reloading is not None and not self.reloading.done(),
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_reload_seconds": self.last_reload_seconds,
+            "previous_generation_alive": self.retired is not None and self.retired() is not None,
+        }
@@ -0,0 +1,165 @@
+import re
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from Retrieval import TOP_K, top_k, normalize_hmo, normalize_tier, partition_key, key_matches
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Hebrew one-letter prefixes (ו, ה, ב, כ, ל, מ, ש) are written attached to the word
+HEBREW_PREFIXES = "והבכלמש"
+MAX_PREFIX_LETTERS = 2
+MIN_STEM_LETTERS = 3
+
+NIQQUD = re.compile(r'[\u0591-\u05C7]')
+# Phone numbers ("1-700-50-53-53", "03-9766111") are kept whole; geresh and quotes inside words are dropped
+TOKEN = re.compile(r'\d+(?:-\d+)+|\w+(?:["\'\u05F3\u05F4]\w+)*')
+HEBREW_WORD = re.compile(r'[\u05D0-\u05EA]+')
+QUOTES = re.compile(r'["\'\u05F3\u05F4]')
+
+
+# ─── Tokenization ──────────────────────────────────────────────────
+
+def hebrew_variants(word: str) -> List[str]:
+    """The word and its forms without up to two prefix letters ("ולשיאצו" -> "לשיאצו", "שיאצו")"""
+    variants = [word]
+    for strip in range(1, MAX_PREFIX_LETTERS + 1):
+        if word[strip - 1] not in HEBREW_PREFIXES or len(word) - strip < MIN_STEM_LETTERS:
+            break
+        variants.append(word[strip:])
+    return variants
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms of a Hebrew/English text.
+
+    Hebrew words also yield their prefix-stripped forms, so "לשיאצו" matches
+    "שיאצו" on either side. Phone numbers become one digits-only term.
+    """
+    terms = []
+    for token in TOKEN.findall(NIQQUD.sub("", (text or "").casefold())):
+        if token[0].isdigit() and "-" in token:
+            terms.append(token.replace("-", ""))
+        elif HEBREW_WORD.fullmatch(token):
+            terms.extend(hebrew_variants(token))
+        else:
+            terms.append(QUOTES.sub("", token))
+    return terms
+
+
+# ─── BM25 inverted index ──────────────────────────────────────────────────
+
+class LexicalIndex:
+    """
+    BM25 over the same documents as the vector index, as an inverted index.
+
+    Postings are stored CSR-style (one offset per term into flat document id
+    and weight arrays), and the length-normalized term-frequency part of
+    BM25 is precomputed per posting, so scoring a query only touches the
+    postings of its own terms. Searches take the same HMO, tier and doc type
+    filters as `PartitionedIndex`, applied as a boolean mask before top-k.
+    """
+
+    def __init__(self, documents: List[Dict], k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            documents (List[Dict]): Document metadata with a "text" field, same
+                order as the vector index rows.
+        """
+        self.documents = documents
+        self.vocabulary: Dict[str, int] = {}
+
+        postings: Dict[int, Dict[int, int]] = {}
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, doc in enumerate(documents):
+            terms = tokenize(doc.get("text", ""))
+            lengths[doc_id] = len(terms)
+            for term in terms:
+                term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                counts = postings.setdefault(term_id, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        average_length = float(lengths.mean()) if len(documents) else 0.0
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for term_id in range(len(self.vocabulary)):
+            counts = postings[term_id]
+            self.offsets[term_id + 1] = self.offsets[term_id] + len(counts)
+            doc_ids.extend(counts)
+            weights.extend(counts.values())
+
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tf = np.asarray(weights, dtype=np.float32)
+        norm = k1 * (1 - b + b * lengths[self.doc_ids] / average_length) if len(tf) else tf
+        self.weights = tf * (k1 + 1) / (tf + norm)
+
+        document_frequency = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        self.partitions: Dict[Tuple, List[int]] = {}
+        for doc_id, doc in enumerate(documents):
+            self.partitions.setdefault(partition_key(doc), []).append(doc_id)
+        # One mask per distinct set of matching partitions, built on first use
+        self.masks: Dict[Tuple, np.ndarray] = {}
+
+        logger.info(f"Built lexical index with {len(self.vocabulary)} terms over {len(documents)} documents")
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def mask(self, hmo_name: Optional[str], tier: Optional[str] = None,
+             doc_types: Optional[List[str]] = None) -> np.ndarray:
+        """Documents passing the filters: the shared ones and the HMO's own benefits of that tier"""
+        hmo, tier = normalize_hmo(hmo_name), normalize_tier(tier)
+        doc_types = set(doc_types) if doc_types else None
+        keys = tuple(key for key in self.partitions if key_matches(key, hmo, tier, doc_types))
+
+        mask = self.masks.get(keys)
+        if mask is None:
+            mask = np.zeros(len(self), dtype=bool)
+            for key in keys:
+                mask[self.partitions[key]] = True
+            self.masks[keys] = mask
+        return mask
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document (0 when no term matches)"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A term appears once per document in its postings, so plain fancy-index addition is safe
+            scores[self.doc_ids[start:end]] += self.idf[term_id] * self.weights[start:end]
+        return scores
+
+    def search(self, query: str, hmo_name: Optional[str] = None, k: int = TOP_K,
+               tier: Optional[str] = None, doc_types: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k documents by BM25 among those passing the filters.
+
+        Args:
+            query (str): The user question.
+            hmo_name (str): The user's HMO, in English or Hebrew.
+            k (int): Number of results.
+            tier (str): The user's tier, in English or Hebrew; None for any tier.
+            doc_types (List[str]): Document types to search; None for all.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (document indices, BM25 scores), best
+                first; only documents sharing at least one term with the query.
+        """
+        scores = self.scores(query)
+        scores[~self.mask(hmo_name, tier, doc_types)] = 0
+        indices, values = top_k(scores, k)
+        matched = values > 0
+        return indices[matched], values[matched]
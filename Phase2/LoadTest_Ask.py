@@ -0,0 +1,123 @@
+"""
+Load test for the /ask endpoint against the local fake OpenAI server.
+
+Starts FakeOpenAI.py and FastAPI.py as subprocesses (the API is pointed at the
+fake server), then fires concurrent /ask requests with distinct prompts so no
+cache can short-circuit them, and reports throughput and latency.
+
+Usage:
+    python LoadTest_Ask.py [--requests 200] [--concurrency 1 10 50]
+
+With a blocking OpenAI client on the event loop, throughput stays at roughly
+one request per upstream round trip regardless of concurrency; with the
+async client it scales with the number of requests in flight.
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import httpx
+
+
+FAKE_PORT = 8100
+API_URL = "http://127.0.0.1:8000"
+
+
+def wait_until_up(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers() -> list:
+    """Launch the fake OpenAI server and the API pointed at it"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ,
+               OpenAiAzureEndPoint=f"http://127.0.0.1:{FAKE_PORT}",
+               OpenAiAzureKey="fake",
+               EMBEDDING_MODEL="fake-embedding",
+               model_name="fake-chat",
+               BackLogPATH=os.path.join(tempfile.gettempdir(), "loadtest_chatbot.log"),
+               QUERY_CACHE_DB="")
+
+    fake = subprocess.Popen([sys.executable, "FakeOpenAI.py", "--port", str(FAKE_PORT)],
+                            cwd=here, env=env, stdout=subprocess.DEVNULL)
+    wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+
+    api = subprocess.Popen([sys.executable, "FastAPI.py"], cwd=here, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(f"{API_URL}/health")
+
+    return [api, fake]
+
+
+async def run_load(total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=API_URL, timeout=300,
+                                 limits=httpx.Limits(max_connections=concurrency)) as http:
+
+        async def one_request():
+            nonlocal errors
+            payload = {
+                "prompt": f"load test question {uuid.uuid4().hex}",
+                "hmo_name": "מכבי",
+                "tier": "זהב",
+                "history": [],
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await http.post("/ask", json=payload)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "throughput": len(latencies) / elapsed,
+        "p50": float(np.percentile(latencies, 50)) if latencies else float("nan"),
+        "p95": float(np.percentile(latencies, 95)) if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--no-launch", action="store_true", help="use an already running API and fake server")
+    args = parser.parse_args()
+
+    processes = [] if args.no_launch else start_servers()
+    try:
+        print(f"{'concurrency':>11} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'errors':>6}")
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_load(args.requests, concurrency))
+            print(f"{result['concurrency']:>11} {result['throughput']:>8.2f} "
+                  f"{result['p50']:>7.3f} {result['p95']:>7.3f} {result['errors']:>6}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
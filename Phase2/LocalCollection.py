@@ -0,0 +1,391 @@
+import os
+import re
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from collections import deque
+from ParseHTML import HMOHTMLParser
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+LOCAL_COLLECTION = os.getenv("LOCAL_COLLECTION", "1") == "1"
+
+hmo_parser = HMOHTMLParser()
+
+# Collection order of the assistant instructions, with the tool that validates each field
+FIELDS = ["name", "id", "gender", "age", "hmo", "card", "tier"]
+
+FIELD_TOOLS = {
+    "name":   "Validate_UserName",
+    "id":     "Validate_ID",
+    "gender": "Validate_Gender",
+    "age":    "Validate_Age",
+    "hmo":    "Validate_HMOname",
+    "card":   "Validate_HMOCardNum",
+    "tier":   "Validate_MemTier",
+}
+
+PROMPTS = {
+    "en": {
+        "name":   "Hello! Before I can help you I need a few details. What is your first and last name?",
+        "id":     "Thank you. What is your ID number (9 digits)?",
+        "gender": "Thank you. What is your gender (male/female)?",
+        "age":    "Thank you. What is your age?",
+        "hmo":    "Thank you. Which HMO are you a member of (Maccabi, Meuhedet, Clalit)?",
+        "card":   "Thank you. What is your HMO card number (9 digits)?",
+        "tier":   "Thank you. What is your insurance membership tier (Gold, Silver, Bronze)?",
+    },
+    "he": {
+        "name":   "שלום! לפני שאוכל לעזור לך אני צריך כמה פרטים. מה השם הפרטי ושם המשפחה שלך?",
+        "id":     "תודה. מה מספר תעודת הזהות שלך (9 ספרות)?",
+        "gender": "תודה. מה המגדר שלך (זכר/נקבה)?",
+        "age":    "תודה. מה הגיל שלך?",
+        "hmo":    "תודה. באיזו קופת חולים את/ה חבר/ה (מכבי, מאוחדת, כללית)?",
+        "card":   "תודה. מה מספר כרטיס קופת החולים שלך (9 ספרות)?",
+        "tier":   "תודה. מה דרגת החברות שלך בביטוח (זהב, כסף, ארד)?",
+    },
+}
+
+CONFIRM_HEADER = {
+    "en": "Please confirm your details:",
+    "he": "אנא אשר/י את הפרטים שלך:",
+}
+
+CONFIRM_LABELS = {
+    "en": {"name": "Name", "id": "ID number", "gender": "Gender", "age": "Age",
+           "hmo": "HMO", "card": "HMO card number", "tier": "Membership tier"},
+    "he": {"name": "שם", "id": "תעודת זהות", "gender": "מגדר", "age": "גיל",
+           "hmo": "קופת חולים", "card": "מספר כרטיס", "tier": "דרגת חברות"},
+}
+
+CONFIRM_FOOTER = {
+    "en": 'Reply "yes" to confirm, or tell me what to correct.',
+    "he": 'השב/י "כן" לאישור, או כתוב/כתבי מה לתקן.',
+}
+
+# Which field an assistant message asks for. The card pattern wins over the HMO one
+FIELD_PATTERNS = {
+    "name":   re.compile(r"first and last name|full name|your name|שם הפרטי|שם מלא|שמך", re.IGNORECASE),
+    "id":     re.compile(r"\bID\b|identity|תעודת זהות|תעודת הזהות|ת\.ז", re.IGNORECASE),
+    "gender": re.compile(r"gender|\bsex\b|מגדר|\bמין\b", re.IGNORECASE),
+    "age":    re.compile(r"\bage\b|how old|\bגיל\b|הגיל|גילך", re.IGNORECASE),
+    "hmo":    re.compile(r"\bHMO\b|health fund|קופת חולים|קופת החולים", re.IGNORECASE),
+    "card":   re.compile(r"card|כרטיס", re.IGNORECASE),
+    "tier":   re.compile(r"\btier\b|membership|דרגת|רמת ביטוח", re.IGNORECASE),
+}
+
+GREETINGS = {"hi", "hello", "hey", "hi there", "good morning", "good evening",
+             "שלום", "היי", "הי", "בוקר טוב", "ערב טוב"}
+
+CONFIRMATIONS = {"yes", "y", "yes please", "correct", "confirm", "confirmed", "approved", "ok", "yes correct",
+                 "כן", "נכון", "מאשר", "מאשרת", "מאושר", "כן נכון", "הכל נכון"}
+
+GENDER_ALIASES = {"m": "m", "male": "m", "man": "m", "זכר": "m", "גבר": "m",
+                  "f": "f", "female": "f", "woman": "f", "נקבה": "f", "אישה": "f", "אשה": "f"}
+
+GENDER_DISPLAY = {"en": {"m": "Male", "f": "Female"}, "he": {"m": "זכר", "f": "נקבה"}}
+
+# Words that show a reply is not a name even though it is made of letters only
+NOT_NAME_WORDS = set(GREETINGS) | set(CONFIRMATIONS) | set(GENDER_ALIASES) \
+    | set(hmo_parser.hmo_mapping) | set(hmo_parser.tier_mapping) \
+    | {"i", "im", "dont", "don't", "know", "not", "no", "skip", "why", "what", "want", "help", "please",
+       "later", "sure", "thanks", "thank", "you", "לא", "רוצה", "יודע", "יודעת", "למה", "מה", "דלג",
+       "עזרה", "אני", "תודה", "אחר", "כך"}
+
+NAME_PREFIX = re.compile(r"^(?:my name is|i am|i'm|שמי הוא|שמי|קוראים לי)\s+", re.IGNORECASE)
+NAME_WORD = re.compile(r"^[^\W\d_]+(?:['\-][^\W\d_]+)*$")
+NUMBER = re.compile(r"^\d+$")
+AGE = re.compile(r"^(\d{1,3})(?:\s*(?:years old|years|yo|שנים|שנה))?$", re.IGNORECASE)
+HEBREW = re.compile(r"[֐-׿]")
+LATIN = re.compile(r"[A-Za-z]")
+
+
+def clean(text: str) -> str:
+    """Trim whitespace and trailing punctuation, collapse inner spaces"""
+    return " ".join(text.strip().rstrip(".!").split())
+
+
+def language_of(text: str) -> Optional[str]:
+    if HEBREW.search(text):
+        return "he"
+    if LATIN.search(text):
+        return "en"
+    return None
+
+
+# ─── Local collection engine ──────────────────────────────────────────────────
+
+class LocalCollector:
+    """
+    Deterministic fast path for the information-collection dialog.
+
+    The assistant asks for one field per turn, so most replies are a bare
+    value ("123456789", "Maccabi"). When the previous assistant message asks
+    for a known field and the reply is a well-formed value that passes the
+    same validator the assistant's tool would call, the next question is
+    produced locally and no assistant run is needed. The profile is rebuilt
+    from the client-side history on every turn, so the engine keeps no state
+    and works the same in stateless and session mode. Anything ambiguous
+    returns None and the turn goes to the assistant.
+    """
+
+    def __init__(self, tool_registry: Dict[str, Tuple[Callable, type]]):
+        self.tool_registry = tool_registry
+
+        # reply() runs in worker threads
+        self.lock = threading.Lock()
+        self.local_turns = 0
+        self.assistant_turns = 0
+        self.recognized = {field: 0 for field in FIELDS}
+
+    def validate(self, field: str, **arguments) -> bool:
+        """Run the validation tool of the field on the parsed value"""
+        validator, payload_model = self.tool_registry[FIELD_TOOLS[field]]
+        return bool(validator(payload_model(**arguments))["valid"])
+
+    def parse(self, field: str, text: str):
+        """
+        Parse a bare answer for one field.
+
+        Returns:
+            The validated value, or None if the text is not just a valid answer.
+        """
+        text = clean(text)
+        lowered = text.lower()
+
+        if field == "name":
+            words = NAME_PREFIX.sub("", text).split()
+            if not 2 <= len(words) <= 3:
+                return None
+            if not all(NAME_WORD.match(word) for word in words):
+                return None
+            if any(word.lower() in NOT_NAME_WORDS for word in words):
+                return None
+            name = " ".join(words)
+            return name if self.validate(field, F_name=words[0], L_name=" ".join(words[1:])) else None
+
+        if field in ("id", "card"):
+            digits = re.sub(r"[\s\-]", "", text)
+            if not NUMBER.match(digits):
+                return None
+            arguments = {"id": int(digits)} if field == "id" else {"HMOcn": int(digits)}
+            return digits if self.validate(field, **arguments) else None
+
+        if field == "age":
+            match = AGE.match(text)
+            if not match:
+                return None
+            age = int(match.group(1))
+            return age if self.validate(field, age=age) else None
+
+        if field == "gender":
+            gender = GENDER_ALIASES.get(lowered)
+            return gender if gender and self.validate(field, gender=gender) else None
+
+        if field == "hmo":
+            if lowered not in hmo_parser.hmo_mapping:
+                return None
+            hmo_name = lowered.capitalize() if LATIN.search(lowered) else lowered
+            return hmo_name if self.validate(field, hmo_name=hmo_name) else None
+
+        if field == "tier":
+            if lowered not in hmo_parser.tier_mapping:
+                return None
+            tier = lowered.capitalize() if LATIN.search(lowered) else lowered
+            return tier if self.validate(field, MemTier=tier) else None
+
+        return None
+
+    def asked_field(self, assistant_message: str) -> Optional[str]:
+        """The field an assistant message asks for, "confirm", or None if unclear"""
+        if any(assistant_message.startswith(header) for header in CONFIRM_HEADER.values()):
+            return "confirm"
+
+        matched = {field for field, pattern in FIELD_PATTERNS.items() if pattern.search(assistant_message)}
+        if "card" in matched:
+            matched.discard("hmo")
+
+        return matched.pop() if len(matched) == 1 else None
+
+    def rebuild_profile(self, history: List[Dict]) -> Dict:
+        """Replay the answers in the history to the questions that preceded them"""
+        profile = {}
+        for i, message in enumerate(history[:-1]):
+            if message["role"] != "assistant" or history[i + 1]["role"] != "user":
+                continue
+            field = self.asked_field(message["content"])
+            if field in FIELDS:
+                value = self.parse(field, history[i + 1]["content"])
+                if value is not None:
+                    profile[field] = value
+        return profile
+
+    def reply(self, message: str, history: List[Dict]) -> Optional[Dict]:
+        """
+        Answer a collection turn locally when the user's reply is unambiguous.
+
+        Args:
+            message (str): User message to process.
+            history (List[Dict]): Client-side history, optionally already ending with `message`.
+
+        Returns:
+            Optional[Dict]: Same shape as the assistant result
+            ("response", "collection_complete", "Personal_Information"),
+            or None if the assistant must handle the turn.
+        """
+        history = [msg for msg in history
+                   if isinstance(msg, dict) and msg.get("role") in ("user", "assistant") and "content" in msg]
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+            history = history[:-1]
+        last_assistant = next((msg["content"] for msg in reversed(history) if msg["role"] == "assistant"), None)
+
+        result = self._reply(message, history, last_assistant)
+
+        # Only turns of the collection dialog count toward the local share: the first turn, or a
+        # reply to a field question or the confirmation. Declined turns after it do not
+        with self.lock:
+            if result is not None:
+                self.local_turns += 1
+            elif last_assistant is None or self.asked_field(last_assistant) is not None:
+                self.assistant_turns += 1
+        return result
+
+    def _reply(self, message: str, history: List[Dict], last_assistant: Optional[str]) -> Optional[Dict]:
+        language = self.conversation_language(message, history)
+
+        # First turn: a plain greeting gets the first question
+        if last_assistant is None:
+            if clean(message).lower() in GREETINGS:
+                return self.ask("name", language)
+            return None
+
+        field = self.asked_field(last_assistant)
+        profile = self.rebuild_profile(history)
+
+        if field == "confirm":
+            if clean(message).lower() in CONFIRMATIONS and all(name in profile for name in FIELDS):
+                return self.complete(profile, language)
+            return None
+
+        if field is None:
+            return None
+
+        value = self.parse(field, message)
+        if value is None:
+            return None
+
+        profile[field] = value
+        with self.lock:
+            self.recognized[field] += 1
+
+        next_index = FIELDS.index(field) + 1
+        if next_index < len(FIELDS):
+            return self.ask(FIELDS[next_index], language)
+
+        # Fields answered through the assistant may be missing from the replay
+        if not all(name in profile for name in FIELDS):
+            return None
+        return self.confirm(profile, language)
+
+    def conversation_language(self, message: str, history: List[Dict]) -> str:
+        """Language of the latest user text with letters, then of the assistant"""
+        for text in [message] + [msg["content"] for msg in reversed(history) if msg["role"] == "user"]:
+            language = language_of(text)
+            if language:
+                return language
+        for msg in reversed(history):
+            language = language_of(msg["content"])
+            if language:
+                return language
+        return "en"
+
+    def ask(self, field: str, language: str) -> Dict:
+        return {"response": PROMPTS[language][field], "collection_complete": False, "Personal_Information": {}}
+
+    def confirm(self, profile: Dict, language: str) -> Dict:
+        labels = CONFIRM_LABELS[language]
+        values = dict(profile, gender=GENDER_DISPLAY[language][profile["gender"]])
+        lines = [CONFIRM_HEADER[language]]
+        lines += [f"- {labels[field]}: {values[field]}" for field in FIELDS]
+        lines.append(CONFIRM_FOOTER[language])
+        return {"response": "\n".join(lines), "collection_complete": False, "Personal_Information": {}}
+
+    def complete(self, profile: Dict, language: str) -> Dict:
+        """The completion reply with the confirmed profile"""
+        if language == "he":
+            response = (f"איסוף המידע הושלם. איך אני יכול לעזור לך היום, {profile['name']}? "
+                        f"אתה בקופת חולים {profile['hmo']}, בדרגת חברות {profile['tier']}")
+        else:
+            response = (f"Information collection completed. How can i help you today, {profile['name']}? "
+                        f"You are in {profile['hmo']}, ranked as {profile['tier']}")
+
+        return {
+            "response": response,
+            "collection_complete": True,
+            "Personal_Information": {
+                "user_full_name": profile["name"],
+                "user_hmo": profile["hmo"],
+                "user_tier": profile["tier"]
+            }
+        }
+
+    def stats(self) -> Dict:
+        with self.lock:
+            local_turns, assistant_turns, recognized = self.local_turns, self.assistant_turns, dict(self.recognized)
+        total = local_turns + assistant_turns
+        return {
+            "local_turns": local_turns,
+            "assistant_turns": assistant_turns,
+            "local_share": local_turns / total if total else 0.0,
+            "recognized_fields": recognized,
+        }
+
+
+def count_user_turns(message: str, history: List[Dict]) -> int:
+    """Number of user messages in the dialog, including the current one"""
+    turns = sum(1 for msg in history if isinstance(msg, dict) and msg.get("role") == "user")
+    if not history or history[-1].get("role") != "user" or history[-1].get("content") != message:
+        turns += 1
+    return turns
+
+
+# ─── Completion counters ──────────────────────────────────────────────────
+
+class CompletionStats:
+    """How many user turns it takes to complete the collection dialog"""
+
+    def __init__(self, window: int = 1000):
+        # Updated from chat-pool worker threads
+        self.lock = threading.Lock()
+        self.completed = {"assistant": 0, "local": 0}
+        self.rejected_submissions = 0
+        self.turns = deque(maxlen=window)
+
+    def record(self, turns: int, path: str):
+        """Count one completed dialog, finished by the assistant or the local path"""
+        with self.lock:
+            self.completed[path] += 1
+            self.turns.append(turns)
+
+    def rejected(self):
+        """Count one profile submission the validator rejected"""
+        with self.lock:
+            self.rejected_submissions += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            completed, rejected_submissions = dict(self.completed), self.rejected_submissions
+            turns = np.array(self.turns) if self.turns else np.zeros(1)
+        return {
+            "completed": completed,
+            "rejected_submissions": rejected_submissions,
+            "turns_to_complete": {
+                "mean": float(turns.mean()),
+                "p50": float(np.percentile(turns, 50)),
+                "max": int(turns.max()),
+            },
+        }
@@ -2,11 +2,90 @@ import os
 import glob
 import re
 import json
+import time
+import pickle
+import hashlib
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
-from typing import Dict, List
+from bs4.builder import builder_registry
+from typing import Dict, List, Optional, Tuple
+
+# Bump when the parsing logic changes, so cached per-file results are not reused
+PARSER_VERSION = 1
+
+# BeautifulSoup tree builder: "html.parser" (pure Python) or "lxml" (C, if installed)
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "html.parser")
+
+
+def resolve_backend(features: str) -> str:
+    """The requested tree builder if it is installed, otherwise the built-in html.parser"""
+    if builder_registry.lookup(features) is None:
+        print(f"HTML parser backend '{features}' is not installed, using html.parser")
+        return "html.parser"
+    return features
+
+
+# ─── Precompiled patterns ──────────────────────────────────────────────────
+#
+# Phone and extension patterns keep one findall per pattern, in this order:
+# a single alternation would drop overlapping matches ("*3555*" yields "3555"
+# from both of the first two patterns) and reorder the rest. A pattern is
+# skipped when the line lacks a literal that every match of it contains.
+
+TIER_LABEL = re.compile(r'(זהב|כסף|ארד):')
+
+# A discount and a limit match can never overlap, so one scan finds the first of each
+TIER_DETAILS = re.compile(r'(?P<discount>\d+)%\s*הנחה|עד\s*(?P<limit>\d+)\s*טיפולים')
+
+PHONE_PATTERNS = [
+    ('*',  re.compile(r'\*(\d{4})\*?')),
+    ('*',  re.compile(r'(\d{4})\*')),
+    ('1-', re.compile(r'(1-\d{3}-\d{2}-\d{2}-\d{2})')),
+    ('1-', re.compile(r'(1-\d{3}-\d{4})')),
+    ('-',  re.compile(r'(0\d-\d{7})')),
+]
+
+EXTENSION_PATTERNS = [
+    ('שלוחה', re.compile(r'שלוחה\s*(\d+)')),
+    ('שלוחת', re.compile(r'שלוחת\s*(\d+)')),
+    ('ext',   re.compile(r'ext\.?\s*(\d+)')),
+    ('תוסף',  re.compile(r'תוסף\s*(\d+)')),
+]
+
+# What follows an HMO name up to its contact line
+CONTACT_TAIL = r'[^:]*:?\s*([^\n]*(?:\*?\d{4}\*?|1-\d{3}-\d{2}-\d{2}-\d{2}|1-\d{3}-\d{4}|0\d-\d{7})[^\n]*)'
+
+
+@lru_cache(maxsize=None)
+def contact_pattern(alias: str) -> Tuple[Optional[str], re.Pattern]:
+    """
+    Compiled contact pattern of one HMO alias.
+
+    Returns:
+        Tuple: (literal every match contains, or None for aliases that are
+        regexes or have case, compiled pattern)
+    """
+    literal = alias if re.escape(alias) == alias and alias.lower() == alias.upper() else None
+    return literal, re.compile(alias + CONTACT_TAIL, re.IGNORECASE | re.MULTILINE)
+
+
+# Process pool workers: one parser per process, created by the pool initializer
+_worker_parser = None
+
+def _init_worker(features: str):
+    global _worker_parser
+    _worker_parser = HMOHTMLParser(features)
+
+def _parse_in_worker(item: Tuple[str, str]) -> Dict:
+    return _worker_parser.parse_html(*item)
+
 
 class HMOHTMLParser:
-    def __init__(self):
+    def __init__(self, features: str = HTML_PARSER_BACKEND):
+        self.features = resolve_backend(features)
+        
         self.hmo_mapping = {
             "maccabi": "מכבי",
             "meuhedet": "מאוחדת", 
@@ -76,54 +155,50 @@ class HMOHTMLParser:
     def parse_tier_benefits(self, cell_content: str) -> Dict:
         '''Parse benefits for each tier from a block of text.'''
         tier_benefits = {}
-        lines = cell_content.split('\n')
         
-        # Process lines in pairs - tier name on one line, benefits on next
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
+        # Single pass - a tier name line starts a tier, the lines up to the next tier name are its benefits
+        tier = None
+        benefits_lines = []
+        for line in cell_content.split('\n'):
+            line = line.strip()
             if not line:
-                i += 1
                 continue
             
-            tier_match = re.search(r'(זהב|כסף|ארד):', line)
+            tier_match = TIER_LABEL.search(line)
             if tier_match:
+                self.add_tier_benefits(tier_benefits, tier, benefits_lines)
                 tier = tier_match.group(1)
-                
-                benefits_text = ""
-                j = i + 1
-                
-                while j < len(lines):
-                    next_line = lines[j].strip()
-                    if not next_line:
-                        j += 1
-                        continue
-                    
-                    if re.search(r'(זהב|כסף|ארד):', next_line):
-                        break
-                    
-                    benefits_text += next_line + " "
-                    j += 1
-                
-                benefits_text = benefits_text.strip()
-                
-                if benefits_text:
-                    # Extract details from the benefits text
-                    discount_match = re.search(r'(\d+)%\s*הנחה', benefits_text)
-                    limit_match = re.search(r'עד\s*(\d+)\s*טיפולים', benefits_text)
-                    
-                    tier_benefits[tier] = {
-                        "discount": discount_match.group(1) + "%" if discount_match else "",
-                        "annual_limit": limit_match.group(1) if limit_match else "",
-                        "full_text": benefits_text
-                    }
-                
-                i = j  
-            else:
-                i += 1
+                benefits_lines = []
+            elif tier:
+                benefits_lines.append(line)
+        
+        self.add_tier_benefits(tier_benefits, tier, benefits_lines)
         
         return tier_benefits
     
+    @staticmethod
+    def add_tier_benefits(tier_benefits: Dict, tier: Optional[str], benefits_lines: List[str]):
+        '''Record the benefits text of one tier with its discount and annual limit.'''
+        benefits_text = " ".join(benefits_lines)
+        if not tier or not benefits_text:
+            return
+        
+        # Extract details from the benefits text
+        discount = limit = None
+        for match in TIER_DETAILS.finditer(benefits_text):
+            if match.lastgroup == "discount" and discount is None:
+                discount = match.group("discount")
+            elif match.lastgroup == "limit" and limit is None:
+                limit = match.group("limit")
+            if discount is not None and limit is not None:
+                break
+        
+        tier_benefits[tier] = {
+            "discount": discount + "%" if discount is not None else "",
+            "annual_limit": limit if limit is not None else "",
+            "full_text": benefits_text
+        }
+    
      
     def extract_hmo_contact_in_context(self, text_content: str, hmo_patterns: List[str], service_category: str) -> Dict:
         """Extract contact info for specific HMO in service context"""
@@ -131,12 +206,15 @@ class HMOHTMLParser:
         contact_data = {}
         
         for pattern in hmo_patterns:
-            hmo_pattern = rf'{pattern}[^:]*:?\s*([^\n]*(?:\*?\d{{4}}\*?|1-\d{{3}}-\d{{2}}-\d{{2}}-\d{{2}}|1-\d{{3}}-\d{{4}}|0\d-\d{{7}})[^\n]*)'
+            literal, hmo_pattern = contact_pattern(pattern)
+            if literal is not None and literal not in text_content:
+                continue
             
-            matches = re.findall(hmo_pattern, text_content, re.IGNORECASE | re.MULTILINE)
+            # Only the first match is used, so the rest of the page is not scanned
+            match = hmo_pattern.search(text_content)
             
-            if matches:
-                contact_line = matches[0].strip()
+            if match:
+                contact_line = match.group(1).strip()
                 
                 parsed_contact = self.parse_contact_line(contact_line, service_category)
                 if parsed_contact:
@@ -153,34 +231,19 @@ class HMOHTMLParser:
             "raw_contact_line": contact_line
         }
         
-        phone_patterns = [
-            r'\*(\d{4})\*?',
-            r'(\d{4})\*',    
-            r'(1-\d{3}-\d{2}-\d{2}-\d{2})', 
-            r'(1-\d{3}-\d{4})',  
-            r'(0\d-\d{7})',   
-        ]
-        
         phones = []
-        for pattern in phone_patterns:
-            matches = re.findall(pattern, contact_line)
-            phones.extend(matches)
+        for literal, pattern in PHONE_PATTERNS:
+            if literal in contact_line:
+                phones.extend(pattern.findall(contact_line))
         
         if phones:
             contact_data["phones"] = phones
             contact_data["primary_phone"] = phones[0]
         
-        ext_patterns = [
-            r'שלוחה\s*(\d+)',
-            r'שלוחת\s*(\d+)', 
-            r'ext\.?\s*(\d+)',
-            r'תוסף\s*(\d+)'
-        ]
-        
         extensions = []
-        for pattern in ext_patterns:
-            matches = re.findall(pattern, contact_line)
-            extensions.extend(matches)
+        for literal, pattern in EXTENSION_PATTERNS:
+            if literal in contact_line:
+                extensions.extend(pattern.findall(contact_line))
         
         if extensions:
             contact_data["extensions"] = extensions
@@ -242,18 +305,26 @@ class HMOHTMLParser:
             return ' '.join([p.get_text(strip=True) for p in paragraphs[:2]])
         return ""
     
+    @staticmethod
+    def read_html_file(file_path: str) -> str:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    
     def parse_html_file(self, file_path: str) -> Dict:
         """Parse single HTML file"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            soup = BeautifulSoup(file.read(), 'html.parser')
+        return self.parse_html(self.read_html_file(file_path), os.path.basename(file_path))
+    
+    def parse_html(self, html: str, filename: str) -> Dict:
+        """Parse the content of a single HTML file"""
+        soup = BeautifulSoup(html, self.features)
         
         title = soup.find('h2')
-        title_text = title.get_text(strip=True) if title else os.path.basename(file_path)
+        title_text = title.get_text(strip=True) if title else filename
         
         description = self.extract_general_description(soup)
         
         return {
-            "filename": os.path.basename(file_path),
+            "filename": filename,
             "title": title_text,
             "description": description,
             "benefits": self.extract_table_data(soup),
@@ -261,19 +332,39 @@ class HMOHTMLParser:
             "treatment_descriptions": self.extract_treatment_descriptions(soup)
         }
     
-    def parse_all_files(self, html_folder: str) -> Dict:
+    def parse_many(self, items: List[Tuple[str, str]], workers: int = 1) -> List[Dict]:
+        """
+        Parse many (html, filename) pairs, spread over a process pool when workers > 1.
+        
+        Results are returned in input order, so merging them is deterministic
+        whatever the number of workers.
+        """
+        if workers <= 1 or len(items) < 2:
+            return [self.parse_html(html, filename) for html, filename in items]
+        
+        chunksize = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.features,)) as pool:
+            return list(pool.map(_parse_in_worker, items, chunksize=chunksize))
+    
+    def parse_all_files(self, html_folder: str, workers: int = 1) -> Dict:
         """Parse all HTML files in folder with combined structure"""
         
+        html_files = sorted(glob.glob(f"{html_folder}/*.html"))
+        items = [(self.read_html_file(file_path), os.path.basename(file_path)) for file_path in html_files]
+        
+        return self.combine_documents(self.parse_many(items, workers))
+    
+    def combine_documents(self, documents: List[Dict]) -> Dict:
+        """Merge per-file parse results, in the given order, into the combined structure"""
+        
         all_data = {
             "benefits": {},
             "descriptions": {},
             "metadata": []
         }
         
-        html_files = glob.glob(f"{html_folder}/*.html")
-        
-        for file_path in html_files:
-            doc_data = self.parse_html_file(file_path)
+        for doc_data in documents:
             
             doc_title = doc_data["title"]
             
@@ -311,16 +402,124 @@ class HMOHTMLParser:
         
         return all_data
     
+    @staticmethod
+    def manifest_path(output_file: str) -> str:
+        """Per-file manifest kept next to the output file"""
+        return f"{os.path.splitext(output_file)[0]}.files.pkl"
+    
+    def load_manifest(self, manifest_file: str) -> Dict:
+        """Per-file entries of a previous run, or nothing if missing or written by another parser version or backend"""
+        if not os.path.exists(manifest_file):
+            return {}
+        with open(manifest_file, 'rb') as f:
+            manifest = pickle.load(f)
+        if manifest.get("parser_version") != PARSER_VERSION or manifest.get("features") != self.features:
+            return {}
+        return manifest["files"]
+    
+    def save_manifest(self, files: Dict, manifest_file: str):
+        tmp_file = f"{manifest_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({"parser_version": PARSER_VERSION, "features": self.features, "files": files}, f)
+        os.replace(tmp_file, manifest_file)
+    
+    def parse_incremental(self, html_folder: str, output_file: str = "parsed_hmo_data.json",
+                          manifest_file: Optional[str] = None, workers: int = 1) -> Dict:
+        """
+        Re-parse only new or changed HTML files and update the combined JSON file.
+        
+        A manifest next to the output records the size, mtime, content hash and
+        parse result of every file. A file whose size and mtime did not change
+        is not read; a file that was touched but has the same content hash is
+        not parsed. Results of deleted files are dropped. The combined data is
+        rebuilt from the per-file results in file name order, so it is the same
+        as a full `parse_all_files` run, and the output is only rewritten when
+        something changed.
+        
+        Args:
+            html_folder (str): Folder with the HTML files.
+            output_file (str): Combined JSON file to update.
+            manifest_file (str): Manifest path (default: next to the output file).
+            workers (int): Processes used to parse the new or changed files.
+        
+        Returns:
+            Dict: Names of the parsed and removed files, the number of unchanged
+            files, whether the output was written and the elapsed seconds.
+        """
+        start = time.perf_counter()
+        manifest_file = manifest_file or self.manifest_path(output_file)
+        
+        previous = self.load_manifest(manifest_file)
+        files = {}
+        to_parse = []
+        manifest_changed = False
+        
+        for file_path in sorted(glob.glob(f"{html_folder}/*.html")):
+            filename = os.path.basename(file_path)
+            stat = os.stat(file_path)
+            entry = previous.get(filename)
+            
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                files[filename] = entry
+                continue
+            
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            content_hash = hashlib.sha256(content).hexdigest()
+            
+            files[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                               "sha256": content_hash, "data": entry["data"] if entry else None}
+            manifest_changed = True
+            
+            if not entry or entry["sha256"] != content_hash:
+                # Same newline handling as reading the file in text mode
+                html = content.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                to_parse.append((html, filename))
+        
+        parsed = [filename for _, filename in to_parse]
+        for filename, data in zip(parsed, self.parse_many(to_parse, workers)):
+            files[filename]["data"] = data
+        
+        removed = sorted(set(previous) - set(files))
+        
+        written = bool(parsed or removed) or not os.path.exists(output_file)
+        if written:
+            self.save_parsed_data(self.combine_documents([entry["data"] for entry in files.values()]), output_file)
+        if manifest_changed or removed:
+            self.save_manifest(files, manifest_file)
+        
+        return {
+            "parsed": parsed,
+            "removed": removed,
+            "unchanged": len(files) - len(parsed),
+            "written": written,
+            "seconds": time.perf_counter() - start
+        }
+    
     def save_parsed_data(self, data: Dict, output_file: str = "parsed_hmo_data.json"):
-        """Save parsed data to JSON file"""
-        with open(output_file, 'w', encoding='utf-8') as f:
+        """Save parsed data to JSON file (atomically, the API may reload it at any time)"""
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, output_file)
         print(f"Parsed data saved to {output_file}")
     
 if __name__ == "__main__":
-    parser = HMOHTMLParser()
+    arg_parser = argparse.ArgumentParser(description="Parse the HMO HTML pages into parsed_hmo_data.json")
+    arg_parser.add_argument("html_folder", nargs="?", default="phase2_data")
+    arg_parser.add_argument("--output", default="parsed_hmo_data.json")
+    arg_parser.add_argument("--full", action="store_true", help="re-parse every file instead of only the changed ones")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parser processes")
+    arg_parser.add_argument("--backend", default=HTML_PARSER_BACKEND, help="html.parser or lxml")
+    args = arg_parser.parse_args()
     
-    data = parser.parse_all_files("phase2_data")
+    parser = HMOHTMLParser(args.backend)
     
-    parser.save_parsed_data(data)
+    if args.full:
+        data = parser.parse_all_files(args.html_folder, workers=args.workers)
+        parser.save_parsed_data(data, args.output)
+    else:
+        result = parser.parse_incremental(args.html_folder, args.output, workers=args.workers)
+        print(f"Parsed {len(result['parsed'])} new or changed files, {result['unchanged']} unchanged, "
+              f"{len(result['removed'])} removed in {result['seconds']:.3f}s")
     
\ No newline at end of file
@@ -0,0 +1,423 @@
+import os
+import logging
+import numpy as np
+from typing import List, Dict, Tuple, Optional
+
+from EmbeddingIndex import normalize_rows
+from ParseHTML import HMOHTMLParser
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+TOP_K = 10
+SHARED_PARTITION = "shared"
+# Reciprocal rank fusion constant: a rank-r hit contributes 1 / (RRF_K + r)
+RRF_K = 60
+
+# "exact", "ivf" (NumPy inverted file) or "hnsw" (faiss, falls back to ivf when it is not installed).
+# Partitions smaller than ANN_MIN_ROWS are always searched exactly.
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "exact")
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "10000"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_POINTS_PER_LIST = 64
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+hmo_parser = HMOHTMLParser()
+KNOWN_TIERS = frozenset(hmo_parser.tier_mapping.values())
+
+
+# ─── Exact retrieval ──────────────────────────────────────────────────
+
+class VectorIndex:
+    """
+    Exact cosine-similarity search over a resident, pre-normalized matrix.
+
+    Rows are normalized once when the index is built, so scoring a query is a
+    single matrix-vector product and top-k selection uses `argpartition`
+    (O(N)) instead of a full sort.
+    """
+
+    def __init__(self, vectors, normalized: bool = False):
+        """
+        Args:
+            vectors: Matrix (or memmap) of document embeddings, one row per document.
+            normalized (bool): True if the rows are already L2-normalized float32,
+                in which case the matrix is used as-is without copying.
+        """
+        if normalized and getattr(vectors, "dtype", None) == np.float32:
+            self.vectors = vectors
+        else:
+            self.vectors = normalize_rows(vectors)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @staticmethod
+    def normalize_query(query_embedding) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Cosine similarity between the query and every row"""
+        return self.vectors @ self.normalize_query(query_embedding)
+
+    def search(self, query_embedding, k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the k most similar rows, best first.
+
+        Args:
+            query_embedding: The query vector (need not be normalized).
+            k (int): Number of results.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (row indices, similarity scores)
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        return top_k(self.scores(query_embedding), k)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k largest scores, sorted descending"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+
+    if k < scores.shape[0]:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(scores.shape[0])
+
+    order = candidates[np.argsort(scores[candidates])[::-1]]
+    return order, scores[order]
+
+
+
+def merge_results(results: List[Tuple[np.ndarray, np.ndarray]], k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge several (indices, scores) result lists into one global top-k"""
+    results = [r for r in results if len(r[0])]
+    if not results:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    indices = np.concatenate([r[0] for r in results])
+    scores = np.concatenate([r[1] for r in results])
+    order, merged_scores = top_k(scores, k)
+    return indices[order], merged_scores
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = TOP_K,
+                           c: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several ranked lists of document indices, best first.
+
+    Only ranks are used, so lists scored on different scales (cosine
+    similarity, BM25) can be combined without calibration.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (document indices, fused scores)
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, index in enumerate(np.asarray(ranking).tolist()):
+            fused[index] = fused.get(index, 0.0) + 1.0 / (c + rank + 1)
+
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    indices = np.fromiter(fused, dtype=np.int64, count=len(fused))
+    order, scores = top_k(np.fromiter(fused.values(), dtype=np.float32, count=len(fused)), k)
+    return indices[order], scores
+
+
+# ─── Approximate retrieval ──────────────────────────────────────────────────
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """Nearest centroid (highest cosine similarity) of every row"""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        assignment[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = IVF_TRAIN_ITERATIONS) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) rows"""
+    rng = np.random.default_rng(0)
+    sample_size = min(len(vectors), nlist * IVF_TRAIN_POINTS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = assign_lists(sample, centroids)
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        centroids[lists] = np.add.reduceat(sample[order], starts, axis=0)
+        # An empty list is re-seeded with a random sample row
+        empty = np.setdiff1d(np.arange(nlist), lists)
+        centroids[empty] = sample[rng.choice(sample_size, len(empty))]
+        centroids = normalize_rows(centroids)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are clustered around `nlist` centroids and a
+    query only scores the rows of its `nprobe` nearest clusters.
+
+    Rows are stored grouped by cluster, so every probed cluster is one
+    contiguous slice scored with a single matrix-vector product. This layout
+    is a resident copy, not a view on the memory-mapped index.
+    """
+
+    def __init__(self, vectors, normalized: bool = False, nlist: Optional[int] = None,
+                 nprobe: int = IVF_NPROBE, centroids: Optional[np.ndarray] = None,
+                 trained_rows: Optional[int] = None):
+        """
+        Args:
+            vectors: Matrix (or memmap) of document embeddings, one row per document.
+            normalized (bool): True if the rows are already L2-normalized float32.
+            nlist (int): Number of clusters (default: square root of the row count).
+            nprobe (int): Clusters scored per query; higher is slower and more exact.
+            centroids (np.ndarray): Centroids of a previous index to reuse
+                instead of training new ones.
+            trained_rows (int): Row count the reused centroids were trained on.
+        """
+        vectors = VectorIndex(vectors, normalized=normalized).vectors
+        if centroids is None:
+            centroids = train_centroids(vectors, nlist or max(1, int(np.sqrt(len(vectors)))))
+            trained_rows = len(vectors)
+        self.centroids = centroids
+        self.trained_rows = trained_rows or len(vectors)
+        self.nprobe = min(nprobe, len(centroids))
+
+        # Rows grouped by cluster; cluster c is list_vectors[offsets[c]:offsets[c + 1]]
+        assignment = assign_lists(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.list_vectors = np.ascontiguousarray(vectors[order])
+        self.list_ids = order.astype(np.int64)
+        self.offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+    def __len__(self) -> int:
+        return len(self.list_ids)
+
+    def search(self, query_embedding, k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k rows, best first: (row indices, similarity scores)"""
+        query = VectorIndex.normalize_query(query_embedding)
+        probed, _ = top_k(self.centroids @ query, self.nprobe)
+
+        ids, scores = [], []
+        for cluster in probed:
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            ids.append(self.list_ids[start:end])
+            scores.append(self.list_vectors[start:end] @ query)
+
+        order, best = top_k(np.concatenate(scores), k)
+        return np.concatenate(ids)[order], best
+
+
+def load_faiss():
+    """faiss if it is installed, else None (imported on demand, it is slow to import)"""
+    try:
+        import faiss
+        return faiss
+    except ImportError:
+        return None
+
+
+class HNSWIndex:
+    """Graph-based (HNSW) inner-product index on unit vectors, backed by faiss"""
+
+    def __init__(self, vectors, normalized: bool = False, m: int = HNSW_M, ef_search: int = HNSW_EF_SEARCH):
+        faiss = load_faiss()
+        vectors = VectorIndex(vectors, normalized=normalized).vectors
+        self.index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efSearch = ef_search
+        self.index.add(np.ascontiguousarray(vectors))
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def search(self, query_embedding, k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+        query = VectorIndex.normalize_query(query_embedding)[None, :]
+        scores, indices = self.index.search(query, min(k, len(self)))
+        found = indices[0] >= 0
+        return indices[0][found].astype(np.int64), scores[0][found]
+
+
+def make_vector_index(vectors, normalized: bool = False, backend: str = VECTOR_INDEX_BACKEND, previous=None):
+    """
+    Index of one partition, with the configured backend.
+
+    Args:
+        vectors: Matrix (or memmap) of document embeddings, one row per document.
+        normalized (bool): True if the rows are already L2-normalized float32.
+        backend (str): "exact", "ivf" or "hnsw".
+        previous: This partition's index in the previous generation. An IVF
+            index reuses its centroids while the partition has at most
+            doubled since they were trained, so a reload only assigns rows.
+
+    Returns:
+        An index exposing `search(query, k)` and `len()`.
+    """
+    if backend not in ("exact", "ivf", "hnsw"):
+        raise ValueError(f"Unknown vector index backend: {backend}")
+
+    if backend == "exact" or len(vectors) < ANN_MIN_ROWS:
+        return VectorIndex(vectors, normalized=normalized)
+
+    if backend == "hnsw":
+        if load_faiss() is not None:
+            return HNSWIndex(vectors, normalized=normalized)
+        logger.warning("faiss is not installed, using the NumPy IVF index instead of HNSW")
+        backend = "ivf"
+
+    if isinstance(previous, IVFIndex) and previous.centroids.shape[1] == vectors.shape[1] \
+            and len(vectors) <= 2 * previous.trained_rows:
+        return IVFIndex(vectors, normalized=normalized, centroids=previous.centroids,
+                        trained_rows=previous.trained_rows)
+    return IVFIndex(vectors, normalized=normalized)
+
+
+# ─── Metadata-partitioned retrieval ──────────────────────────────────────────────────
+
+def normalize_hmo(hmo_name: Optional[str]) -> str:
+    """Normalize an HMO name exactly like the HTML parser does"""
+    return hmo_parser.normalize_hmo_name((hmo_name or "").strip())
+
+
+def normalize_tier(tier: Optional[str]) -> Optional[str]:
+    """
+    Normalize a tier ("Gold", "gold", "זהב" -> "זהב"); None means any tier.
+
+    An unknown tier is logged and treated as any tier, so a typo does not
+    silently filter out every benefit chunk.
+    """
+    tier = (tier or "").strip()
+    if not tier:
+        return None
+    normalized = hmo_parser.normalize_tier(tier)
+    if normalized not in KNOWN_TIERS:
+        logger.warning(f"Unknown tier {tier!r}, not filtering on tier")
+        return None
+    return normalized
+
+
+def partition_key(doc: Dict) -> Tuple[str, str, Optional[str]]:
+    """
+    (owner, doc type, tier) of a document.
+
+    Benefit chunks belong to their HMO and tier; descriptions and service
+    pages are shared by every HMO and tier.
+    """
+    if doc.get("type") == "benefit":
+        return normalize_hmo(doc.get("hmo")), "benefit", normalize_tier(doc.get("tier"))
+    return SHARED_PARTITION, doc.get("type", ""), None
+
+
+def key_matches(key: Tuple[str, str, Optional[str]], hmo: str, tier: Optional[str],
+                doc_types: Optional[set]) -> bool:
+    """Whether a partition passes the filters (arguments already normalized)"""
+    owner, doc_type, key_tier = key
+    return owner in (SHARED_PARTITION, hmo) \
+        and (tier is None or key_tier is None or key_tier == tier) \
+        and (not doc_types or doc_type in doc_types)
+
+
+def partition_name(key: Tuple[str, str, Optional[str]]) -> str:
+    return "/".join(part for part in key if part)
+
+
+class PartitionedIndex:
+    """
+    One `VectorIndex` per (owner, doc type, tier) partition, see `partition_key`.
+
+    The metadata filters of a query (HMO, tier, doc types) select partitions
+    before any vector is scored, so a filtered query only scores the rows it
+    may return: other funds' and other tiers' benefit chunks never take a
+    top-k slot, and the search costs proportionally less.
+    """
+
+    def __init__(self, vectors, documents: List[Dict], normalized: bool = False,
+                 backend: str = VECTOR_INDEX_BACKEND, previous: Optional["PartitionedIndex"] = None):
+        """
+        Args:
+            vectors: Matrix (or memmap) of document embeddings, one row per document.
+            documents (List[Dict]): Document metadata, same order as the rows.
+            normalized (bool): True if the rows are already L2-normalized float32.
+            backend (str): Index of every partition, see `make_vector_index`.
+            previous (PartitionedIndex): The previous generation's index, whose
+                trained IVF centroids are reused.
+        """
+        self.documents = documents
+        self.backend = backend
+        self.partitions: Dict[Tuple[str, str, Optional[str]], Tuple[np.ndarray, VectorIndex]] = {}
+
+        groups: Dict[Tuple[str, str, Optional[str]], List[int]] = {}
+        for i, doc in enumerate(documents):
+            groups.setdefault(partition_key(doc), []).append(i)
+
+        copied = []
+        for key, rows in groups.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            # Contiguous partitions are slices, i.e. views on the (memory-mapped) matrix
+            if rows[-1] - rows[0] + 1 == len(rows):
+                sub_matrix = vectors[rows[0]:rows[-1] + 1]
+            else:
+                sub_matrix = vectors[rows]
+                copied.append(partition_name(key))
+            previous_index = previous.partitions[key][1] if previous and key in previous.partitions else None
+            self.partitions[key] = (rows, make_vector_index(sub_matrix, normalized, backend, previous_index))
+
+        if copied:
+            # Each worker then holds a private copy instead of sharing the mapped pages
+            logger.warning(f"{len(copied)} partitions are not contiguous in the index and were copied: "
+                           f"{', '.join(copied)}")
+        logger.info("Built partitioned index: " +
+                    ", ".join(f"{partition_name(key)}={len(rows)}" for key, (rows, _) in self.partitions.items()))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def stats(self) -> Dict:
+        return {partition_name(key): {"rows": len(rows), "index": type(index).__name__}
+                for key, (rows, index) in self.partitions.items()}
+
+    def matching_partitions(self, hmo_name: Optional[str] = None, tier: Optional[str] = None,
+                            doc_types: Optional[List[str]] = None) -> List[Tuple[str, str, Optional[str]]]:
+        """Keys of the partitions that pass the filters"""
+        hmo, tier = normalize_hmo(hmo_name), normalize_tier(tier)
+        doc_types = set(doc_types) if doc_types else None
+        return [key for key in self.partitions if key_matches(key, hmo, tier, doc_types)]
+
+    def search(self, query_embedding, hmo_name: Optional[str] = None, k: int = TOP_K,
+               tier: Optional[str] = None, doc_types: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k over the partitions that pass the filters.
+
+        Args:
+            query_embedding: The query vector (need not be normalized).
+            hmo_name (str): The user's HMO, in English or Hebrew; only shared
+                documents are searched when it is empty.
+            k (int): Number of results.
+            tier (str): The user's tier, in English or Hebrew; benefit chunks of
+                other tiers are skipped. None searches every tier.
+            doc_types (List[str]): Document types to search ("benefit",
+                "description", "metadata"). None searches every type.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (document indices, similarity scores), best first.
+        """
+        query = VectorIndex.normalize_query(query_embedding)
+        results = []
+        for key in self.matching_partitions(hmo_name, tier, doc_types):
+            rows, index = self.partitions[key]
+            local_indices, scores = index.search(query, k)
+            results.append((rows[local_indices], scores))
+
+        return merge_results(results, k)
@@ -0,0 +1,58 @@
+"""
+Production launcher: N uvicorn worker processes behind one port.
+
+Before any worker starts, the launcher:
+    - resolves the assistant id once (ASSISTANT_ID, or the registry file, or a
+      new assistant) and passes it to the workers through ASSISTANT_ID
+    - builds or converts the embedding index once, so the workers only
+      memory-map the same read-only files and share their pages
+
+Each worker warms up (loads the index, runs one search per partition) in its
+startup hook, which completes before uvicorn lets it accept connections.
+Per-worker startup time and RSS are logged and exposed on GET /metrics.
+
+Usage:
+    python Serve.py [--workers 4] [--host 127.0.0.1] [--port 8000]
+
+For development, `python FastAPI.py` still runs a single in-process worker.
+"""
+import os
+import time
+import asyncio
+import argparse
+import uvicorn
+
+
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    # Imported here, not at module level: worker processes re-import this
+    # module and must not run the app initialization twice
+    import FastAPI as api
+
+    api.init_services()
+    asyncio.run(api.load_data())
+    os.environ["ASSISTANT_ID"] = api.ASSISTANT_ID
+    api.logger.info(f"Launcher ready in {time.perf_counter() - start:.2f}s, "
+                    f"starting {args.workers} workers with assistant {api.ASSISTANT_ID}")
+
+    uvicorn.run(
+        "FastAPI:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="asyncio"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# ─── Initializtion ──────────────────────────────────────────────────
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+
+
+class Session:
+    """One conversation bound to a persistent assistant thread"""
+
+    def __init__(self, thread_id: Optional[str]):
+        self.thread_id = thread_id
+        self.last_used = time.time()
+        self.turns = 0
+        # Turns answered without the assistant, added to the thread before its next run
+        self.local_turns: List[Dict] = []
+        # Serializes turns of the same conversation: a thread accepts no new
+        # messages while one of its runs is active
+        self.lock = threading.Lock()
+
+
+# ─── Session store ──────────────────────────────────────────────────
+
+class SessionStore:
+    """
+    Bounded map from a client session id to its assistant thread.
+
+    Sessions idle for longer than `idle_ttl` expire, and the least recently
+    used session is evicted once `max_sessions` is reached. The remote thread
+    of an expired or evicted session is deleted through `delete_thread`.
+    """
+
+    def __init__(self, delete_thread: Callable[[str], None],
+                 max_sessions: int = SESSION_MAX, idle_ttl: float = SESSION_IDLE_TTL):
+        self.delete_thread = delete_thread
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return the live session, or None if it does not exist or expired"""
+        stale = []
+        with self.lock:
+            stale = self._expire()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self.sessions.move_to_end(session_id)
+                self.reused += 1
+
+        self._delete(stale)
+        return session
+
+    def reserve(self, session_id: str) -> Tuple[Session, bool]:
+        """
+        Return the live session, or register a new one with its lock already held.
+
+        The new session has no thread yet: the caller creates it and sets
+        `thread_id`, or drops the session with `remove` if that fails. Since the
+        lock is taken before the session is visible, a concurrent turn of the
+        same conversation waits for the thread instead of creating a second one.
+
+        Returns:
+            Tuple[Session, bool]: The session, and whether it was just created.
+        """
+        stale = []
+        with self.lock:
+            stale = self._expire()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self.sessions.move_to_end(session_id)
+                self.reused += 1
+                created = False
+            else:
+                session = Session(None)
+                session.lock.acquire()
+                self.sessions[session_id] = session
+                self.created += 1
+                created = True
+                while len(self.sessions) > self.max_sessions:
+                    _, oldest = self.sessions.popitem(last=False)
+                    stale.append(oldest.thread_id)
+                    self.evicted += 1
+
+        self._delete(stale)
+        return session, created
+
+    def remove(self, session_id: str, session: Optional[Session] = None):
+        """Drop the session, or only `session` if given and it is still the registered one"""
+        with self.lock:
+            current = self.sessions.get(session_id)
+            if current is None or (session is not None and current is not session):
+                return
+            del self.sessions[session_id]
+        self._delete([current.thread_id])
+
+    def _expire(self) -> List[str]:
+        """Drop idle sessions (caller holds the lock) and return their thread ids"""
+        now = time.time()
+        stale = []
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            self.sessions.popitem(last=False)
+            stale.append(session.thread_id)
+            self.expired += 1
+        return stale
+
+    def _delete(self, thread_ids: List[Optional[str]]):
+        for thread_id in thread_ids:
+            # A session whose thread is still being created has none to delete
+            if thread_id is not None:
+                self.delete_thread(thread_id)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "active": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "reused": self.reused,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }